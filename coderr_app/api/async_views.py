@@ -0,0 +1,85 @@
+"""
+``async def`` handlers for DRF views.
+
+DRF 3.15 dispatches synchronously, so under ASGI every request is run
+through Django's sync-to-async thread adapter. ``AsyncDispatchMixin`` makes
+the view itself a coroutine: handlers declared with ``async def`` run on the
+event loop and use the async ORM, while sync handlers (writes, OPTIONS) keep
+DRF's regular dispatch and run in a worker thread as before.
+"""
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.utils.decorators import classonlymethod
+from rest_framework import exceptions
+
+from coderr_app.timing import span
+
+
+def serving_async(request):
+    """
+    True under ASGI. Streaming responses must then get an async iterator:
+    Django reads a sync one completely into a list before sending a byte.
+    """
+    return isinstance(getattr(request, '_request', request), ASGIRequest)
+
+
+async def iterate_in_thread(iterator, thread_sensitive=True):
+    """
+    Async generator over a sync ``iterator`` that may use the ORM, one
+    ``sync_to_async`` hop per item. Iterators that only do file I/O can pass
+    ``thread_sensitive=False`` to run outside the thread the ORM calls share.
+    """
+    next_item = sync_to_async(next, thread_sensitive=thread_sensitive)
+    while (item := await next_item(iterator, None)) is not None:
+        yield item
+
+
+class AsyncDispatchMixin:
+
+    @classonlymethod
+    def as_view(cls, *args, **kwargs):
+        return markcoroutinefunction(super().as_view(*args, **kwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        method = request.method.lower()
+        handler = getattr(self, method, None) if method in self.http_method_names else None
+        if not iscoroutinefunction(handler):
+            return await sync_to_async(super().dispatch)(request, *args, **kwargs)
+
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await self.authenticate(request)
+            self.initial(request, *args, **kwargs)
+            response = await handler(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+    async def authenticate(self, request):
+        """
+        Resolve ``request.user`` before ``initial()`` runs, awaiting
+        ``aauthenticate()`` where an authenticator provides it and running
+        the others in a worker thread.
+        """
+        with span('auth'):
+            for authenticator in request.authenticators:
+                try:
+                    if hasattr(authenticator, 'aauthenticate'):
+                        user_auth_tuple = await authenticator.aauthenticate(request)
+                    else:
+                        user_auth_tuple = await sync_to_async(authenticator.authenticate)(request)
+                except exceptions.APIException:
+                    request._not_authenticated()
+                    raise
+                if user_auth_tuple is not None:
+                    request._authenticator = authenticator
+                    request.user, request.auth = user_auth_tuple
+                    return
+            request._not_authenticated()
@@ -0,0 +1,199 @@
+"""
+Compiled read-only serialization for list responses.
+
+A ``CompiledSerializer`` is built once per request from the bound DRF
+serializer (so ``?fields=`` and the request context still apply) and turns
+``values()`` rows into the same dicts that serializer would return, without
+model instances, field binding or attribute lookups per row. Plain model
+fields reuse the DRF field's ``to_representation()``, so the rendered JSON is
+byte-for-byte the same; ``SerializerMethodField``s get a ``compile_<name>()``
+counterpart. Serializers with fields that cannot be compiled fall back to
+DRF. ``COMPILED_LIST_SERIALIZERS = False`` turns the mode off.
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.urls import reverse
+from rest_framework import serializers
+from rest_framework.relations import PrimaryKeyRelatedField
+from rest_framework.response import Response
+
+from coderr_app.models import BusinessRatingStats, OfferDetails
+from coderr_app.timing import span
+
+URL_SENTINEL = 987654321
+
+
+class CompiledSerializer:
+
+    def __init__(self, serializer):
+        self.serializer = serializer
+        self.context = serializer.context
+        self.model = serializer.Meta.model
+        self.columns = []
+        self.builders = []
+
+    @classmethod
+    def compile(cls, serializer):
+        """Return the compiled serializer, or None if one of the fields has no compiled form."""
+        compiled = cls(serializer)
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            compiler = getattr(compiled, f'compile_{name}', None)
+            result = compiler() if compiler else compiled.compile_field(field)
+            if result is None:
+                return None
+            columns, build = result
+            compiled.columns.extend(column for column in columns if column not in compiled.columns)
+            compiled.builders.append((name, build))
+        return compiled
+
+    def compile_field(self, field):
+        if field.source == '*' or len(field.source_attrs) != 1 or isinstance(field, serializers.BaseSerializer):
+            return None
+        column = field.source
+        if isinstance(field, PrimaryKeyRelatedField):
+            if field.pk_field is not None:
+                return None
+            return [column], lambda row: row[column]
+        if isinstance(field, serializers.FileField):
+            return [column], self.file_builder(column, field)
+
+        to_representation = field.to_representation
+
+        def build(row):
+            value = row[column]
+            return None if value is None else to_representation(value)
+        return [column], build
+
+    def file_builder(self, column, field):
+        """``FileField.to_representation()`` for a stored file name instead of a FieldFile."""
+        storage = self.model._meta.get_field(column).storage
+        request = self.context.get('request')
+        use_url = getattr(field, 'use_url', True)
+
+        def build(row):
+            name = row[column]
+            if not name:
+                return None
+            if not use_url:
+                return name
+            url = storage.url(name)
+            return request.build_absolute_uri(url) if request is not None else url
+        return build
+
+    def prepare(self, queryset, extra_columns=()):
+        """The rows to serialize: only the needed columns, as dicts."""
+        columns = self.columns + [column for column in extra_columns if column not in self.columns]
+        return queryset.prefetch_related(None).values(*columns)
+
+    def load_related(self, rows):
+        """Fetch whatever the builders need besides the rows themselves."""
+
+    async def aload_related(self, rows):
+        pass
+
+    def to_representation(self, rows):
+        return [{name: build(row) for name, build in self.builders} for row in rows]
+
+    def serialize(self, rows):
+        with span('serialize'):
+            self.load_related(rows)
+            return self.to_representation(rows)
+
+    async def aserialize(self, rows):
+        with span('serialize'):
+            await self.aload_related(rows)
+            return self.to_representation(rows)
+
+
+class CompiledOfferSerializer(CompiledSerializer):
+    """``OfferSerializer`` as rendered by the list action."""
+
+    def __init__(self, serializer):
+        super().__init__(serializer)
+        self.detail_ids = {}
+
+    def compile_details(self):
+        # one reverse() per request instead of one per detail
+        prefix, _, suffix = reverse('offerdetails-detail', args=[URL_SENTINEL]).replace('/api', '').partition(str(URL_SENTINEL))
+
+        def build(row):
+            return [{'id': detail_id, 'url': f'{prefix}{detail_id}{suffix}'} for detail_id in self.detail_ids.get(row['id'], [])]
+        return ['id'], build
+
+    def compile_user_details(self):
+        columns = ['user__first_name', 'user__last_name', 'user__username']
+        stats_fields = ['review_count', 'rating_sum', *(f'rating_{bucket}' for bucket in BusinessRatingStats.BUCKETS)]
+        include_rating = self.context.get('include_rating')
+        if include_rating:
+            columns += [f'user__rating_stats__{field}' for field in stats_fields]
+
+        def build(row):
+            details = {
+                'first_name': row['user__first_name'],
+                'last_name': row['user__last_name'],
+                'username': row['user__username'],
+            }
+            if include_rating:
+                stats = BusinessRatingStats(**{field: row[f'user__rating_stats__{field}'] or 0 for field in stats_fields})
+                details['rating_stats'] = stats.summary()
+            return details
+        return columns, build
+
+    def compile_min_price(self):
+        return ['min_price'], lambda row: float(row['min_price']) if row['min_price'] is not None else 0.00
+
+    def compile_min_delivery_time(self):
+        return ['min_delivery_time'], lambda row: row['min_delivery_time'] if row['min_delivery_time'] is not None else 0
+
+    def details_query(self, rows):
+        # the same order the offer_details prefetch returns them in
+        offer_ids = [row['id'] for row in rows]
+        return OfferDetails.objects.filter(offer__in=offer_ids).order_by('offer_id', 'id').values_list('offer_id', 'id')
+
+    def group_details(self, pairs):
+        detail_ids = defaultdict(list)
+        for offer_id, detail_id in pairs:
+            detail_ids[offer_id].append(detail_id)
+        self.detail_ids = detail_ids
+
+    def needs_details(self, rows):
+        return rows and any(name == 'details' for name, _ in self.builders)
+
+    def load_related(self, rows):
+        if self.needs_details(rows):
+            self.group_details(self.details_query(rows))
+
+    async def aload_related(self, rows):
+        if self.needs_details(rows):
+            self.group_details([pair async for pair in self.details_query(rows)])
+
+
+class CompiledListMixin:
+    """
+    View mixin: serve the list action through ``compiled_serializer_class``
+    when the serializer can be compiled.
+    """
+    compiled_serializer_class = CompiledSerializer
+
+    def get_compiled_serializer(self):
+        if not settings.COMPILED_LIST_SERIALIZERS or self.request.method != 'GET':
+            return None
+        return self.compiled_serializer_class.compile(self.get_serializer())
+
+    def prepare_compiled(self, compiled, queryset):
+        ordering = getattr(self.paginator, 'ordering', None) or ()
+        return compiled.prepare(queryset, [field.lstrip('-') for field in ordering])
+
+    def list(self, request, *args, **kwargs):
+        compiled = self.get_compiled_serializer()
+        if compiled is None:
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.prepare_compiled(compiled, self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(compiled.serialize(page))
+        return Response(compiled.serialize(list(queryset)))
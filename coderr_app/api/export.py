@@ -0,0 +1,162 @@
+"""
+Streaming order export.
+
+Rows are read as ``values_list`` tuples through ``QuerySet.iterator()`` and
+encoded one chunk at a time, so memory use does not depend on the number of
+orders being exported. Under ASGI the chunks are produced by an async
+generator that fetches each one through ``sync_to_async``.
+"""
+import csv
+import io
+import json
+from datetime import datetime, time, timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import ValidationError
+
+from coderr_app.models import Order
+
+from .async_views import iterate_in_thread
+
+EXPORT_FIELDS = [
+    'id', 'customer_user', 'business_user', 'title', 'revisions', 'delivery_time_in_days', 'price',
+    'features', 'offer_type', 'status', 'created_at', 'updated_at', 'offer_detail',
+]
+EXPORT_COLUMNS = [
+    'id', 'customer_user_id', 'business_user_id', 'title', 'revisions', 'delivery_time_in_days', 'price',
+    'features', 'offer_type', 'status', 'created_at', 'updated_at', 'offer_detail_id',
+]
+EXPORT_FORMATS = {
+    'csv': ('text/csv; charset=utf-8', 'orders.csv'),
+    'ndjson': ('application/x-ndjson', 'orders.ndjson'),
+}
+
+PRICE_INDEX = EXPORT_FIELDS.index('price')
+FEATURES_INDEX = EXPORT_FIELDS.index('features')
+DATETIME_INDEXES = (EXPORT_FIELDS.index('created_at'), EXPORT_FIELDS.index('updated_at'))
+
+
+def _parse_bound(name, value, end):
+    """
+    Parse a ``created_after`` / ``created_before`` value. A plain date covers
+    the whole day, so as an upper bound it means "before the next day".
+    """
+    try:
+        day = parse_date(value)
+        if day is not None:
+            parsed = datetime.combine(day + timedelta(days=1) if end else day, time.min)
+            exclusive = end
+        else:
+            parsed = parse_datetime(value)
+            if parsed is None:
+                raise ValueError
+            exclusive = False
+    except ValueError:
+        raise ValidationError({name: "Ungültiges Datum, erwartet wird YYYY-MM-DD oder ein ISO-Zeitstempel."})
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed, exclusive
+
+
+def filter_export(queryset, params):
+    """Apply the ``status``, ``created_after`` and ``created_before`` query parameters."""
+    statuses = [value for value in params.get('status', '').split(',') if value]
+    invalid = [value for value in statuses if value not in Order.STATUSES]
+    if invalid:
+        raise ValidationError({"status": f"Ungültiger Status: {', '.join(invalid)}."})
+    if statuses:
+        queryset = queryset.filter(status__in=statuses)
+
+    if params.get('created_after'):
+        lower, _ = _parse_bound('created_after', params['created_after'], end=False)
+        queryset = queryset.filter(created_at__gte=lower)
+    if params.get('created_before'):
+        upper, exclusive = _parse_bound('created_before', params['created_before'], end=True)
+        queryset = queryset.filter(**{'created_at__lt' if exclusive else 'created_at__lte': upper})
+    return queryset
+
+
+def _format_datetime(value):
+    value = timezone.localtime(value) if timezone.is_aware(value) else value
+    formatted = value.isoformat()
+    return formatted[:-6] + 'Z' if formatted.endswith('+00:00') else formatted
+
+
+def _prepare(row):
+    """Bring a values_list row into the representation OrderSerializer produces."""
+    row = list(row)
+    row[PRICE_INDEX] = f"{row[PRICE_INDEX]:.2f}"
+    for index in DATETIME_INDEXES:
+        row[index] = _format_datetime(row[index])
+    return row
+
+
+def _chunks(rows, size):
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _csv_header():
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(EXPORT_COLUMNS)
+    return buffer.getvalue()
+
+
+def _csv_chunk(chunk):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in chunk:
+        row = _prepare(row)
+        row[FEATURES_INDEX] = json.dumps(row[FEATURES_INDEX], ensure_ascii=False)
+        writer.writerow(row)
+    return buffer.getvalue()
+
+
+def _ndjson_chunk(chunk):
+    return ''.join(
+        json.dumps(dict(zip(EXPORT_FIELDS, _prepare(row))), ensure_ascii=False) + '\n'
+        for row in chunk
+    )
+
+
+def _lines(chunks, export_format):
+    if export_format == 'csv':
+        yield _csv_header()
+    encode = _csv_chunk if export_format == 'csv' else _ndjson_chunk
+    for chunk in chunks:
+        yield encode(chunk)
+
+
+async def _alines(chunks, export_format):
+    if export_format == 'csv':
+        yield _csv_header()
+    encode = _csv_chunk if export_format == 'csv' else _ndjson_chunk
+    async for chunk in chunks:
+        yield encode(chunk)
+
+
+def stream_orders(queryset, export_format, chunk_size=None, asynchronous=False):
+    """
+    Return a StreamingHttpResponse with the orders of ``queryset`` as CSV or
+    NDJSON; ``asynchronous`` (under ASGI) streams from an async iterator.
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValidationError({"output": f"Ungültiges Format, erlaubt sind: {', '.join(EXPORT_FORMATS)}."})
+    chunk_size = chunk_size or settings.ORDER_EXPORT_CHUNK_SIZE
+    rows = queryset.order_by('id').values_list(*EXPORT_COLUMNS)
+
+    content_type, filename = EXPORT_FORMATS[export_format]
+    chunks = _chunks(rows.iterator(chunk_size=chunk_size), chunk_size)
+    # not QuerySet.aiterator(): in Django 5.1 it runs values_list() queries on the event loop
+    lines = _alines(iterate_in_thread(chunks), export_format) if asynchronous else _lines(chunks, export_format)
+    response = StreamingHttpResponse(lines, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response['Cache-Control'] = 'no-store'
+    return response
@@ -0,0 +1,54 @@
+import django_filters
+from rest_framework import filters
+
+from coderr_app import search
+from coderr_app.models import Offer
+
+
+class OfferFilter(django_filters.FilterSet):
+    """
+    Offer filters. Lookups that can be answered from the stored detail summary
+    use the indexed Offer columns; the rest still join OfferDetails but return
+    each offer only once.
+    """
+    # a plain number: a model choice filter would look the user up on every request
+    user = django_filters.NumberFilter(field_name='user')
+    offer_details__price__gte = django_filters.NumberFilter(field_name='offer_details__price', lookup_expr='gte', distinct=True)
+    offer_details__delivery_time_in_days = django_filters.NumberFilter(field_name='offer_details__delivery_time_in_days', distinct=True)
+    offer_details__delivery_time_in_days__lte = django_filters.NumberFilter(field_name='min_delivery_time', lookup_expr='lte')
+    offer_details__delivery_time_in_days__gte = django_filters.NumberFilter(field_name='offer_details__delivery_time_in_days', lookup_expr='gte', distinct=True)
+
+    class Meta:
+        model = Offer
+        fields = {
+            'updated_at': ['gte'],
+        }
+
+
+class OfferSearchFilter(filters.SearchFilter):
+    """``?search=`` answered from the FTS5 index when the database supports it."""
+
+    def filter_queryset(self, request, queryset, view):
+        search_terms = self.get_search_terms(request)
+        if not search_terms or not search.is_available():
+            return super().filter_queryset(request, queryset, view)
+
+        match_query = search.build_match_query(search_terms)
+        if not match_query:
+            return queryset
+        return search.filter_offers(queryset, match_query)
+
+
+class OfferOrderingFilter(filters.OrderingFilter):
+    """Adds ``ordering=relevance`` (BM25 rank of the current search) to the regular ordering fields."""
+    relevance_param = 'relevance'
+
+    def remove_invalid_fields(self, queryset, fields, view, request):
+        valid = []
+        for term in fields:
+            if term.lstrip('-') == self.relevance_param:
+                if 'search_rank' in queryset.query.extra_select:
+                    valid.append('search_rank' if not term.startswith('-') else '-search_rank')
+            else:
+                valid.extend(super().remove_invalid_fields(queryset, [term], view, request))
+        return valid
@@ -0,0 +1,317 @@
+"""
+Streaming catalogue import: business users with their profiles and offers.
+
+A source is read one record at a time (JSONL: one business per line with its
+``offers``; CSV: one row per offer, consecutive rows of the same username
+form one business), validated with the registration, profile and offer
+serializer rules and inserted with ``bulk_create()`` in batches, one
+transaction per batch. Only the current batch is held in memory. After each
+batch the importer reports the source position up to which everything is
+committed, so an interrupted import continues from there.
+"""
+import csv
+import io
+import json
+
+from django.conf import settings
+from django.contrib.auth.hashers import identify_hasher, make_password
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.http import StreamingHttpResponse
+from django.utils.functional import cached_property
+from rest_framework import serializers
+
+from coderr_app import metrics
+from coderr_app.models import Offer, OfferDetails, PlatformStats
+from user_auth_app.api.serializers import RegistrationSerializer, UserProfileSerializer
+from user_auth_app.models import UserProfile
+
+from .async_views import iterate_in_thread
+from .serializers import OfferDetailsSerializer, OfferSerializer, sync_offers
+
+IMPORT_FORMATS = ('jsonl', 'csv')
+PROFILE_FIELDS = ['first_name', 'last_name', 'location', 'tel', 'description', 'working_hours']
+DETAIL_FIELDS = ['title', 'revisions', 'delivery_time_in_days', 'price', 'features']
+OFFER_TYPES = ['basic', 'standard', 'premium']
+
+
+class ImportAccountSerializer(RegistrationSerializer):
+    """
+    The registration rules for an imported account. Uniqueness is checked
+    per batch instead of per row, and the password is optional: without
+    ``password`` or ``password_hash`` the account gets an unusable password.
+    """
+    password = serializers.CharField(write_only=True, required=False, min_length=6)
+    repeated_password = None
+    password_hash = serializers.CharField(write_only=True, required=False)
+    type = serializers.ChoiceField(choices=UserProfile.USER_TYPES, default='business')
+
+    def validate_username(self, value):
+        return value
+
+    def validate_email(self, value):
+        return value
+
+    def validate_password_hash(self, value):
+        try:
+            identify_hasher(value)
+        except ValueError:
+            raise serializers.ValidationError("Unbekanntes Passwort-Hash-Format.")
+        return value
+
+    def validate(self, data):
+        return data
+
+
+def detect_format(name):
+    extension = (name or '').rsplit('.', 1)[-1].lower()
+    return {'jsonl': 'jsonl', 'ndjson': 'jsonl', 'csv': 'csv'}.get(extension)
+
+
+def read_jsonl(stream, start=0):
+    """Yield ``(position, record)``; position counts the source lines consumed so far."""
+    for position, line in enumerate(stream, 1):
+        if position <= start or not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as exc:
+            record = {'_error': f"Ungültiges JSON: {exc}"}
+        yield position, record
+
+
+def csv_offer(row):
+    """The offer of a CSV row, shaped like a POST /offers/ body, or None for a profile-only row."""
+    if not row.get('offer_title'):
+        return None
+    details = []
+    for offer_type in OFFER_TYPES:
+        detail = {'offer_type': offer_type}
+        for field in DETAIL_FIELDS:
+            value = row.get(f'{offer_type}_{field}')
+            if value not in (None, ''):
+                detail[field] = value
+        # features as the order export writes them (a JSON list) or separated by "|"
+        features = detail.get('features', '')
+        try:
+            detail['features'] = json.loads(features)
+        except ValueError:
+            detail['features'] = [feature.strip() for feature in features.split('|') if feature.strip()]
+        details.append(detail)
+    return {'title': row['offer_title'], 'description': row.get('offer_description', ''), 'details': details}
+
+
+def read_csv(stream, start=0):
+    """Yield ``(position, record)`` per business; position counts the data rows consumed so far."""
+    record, username = None, None
+    for position, row in enumerate(csv.DictReader(stream), 1):
+        if position <= start:
+            continue
+        if record is not None and row.get('username') != username:
+            yield position - 1, record
+            record = None
+        if record is None:
+            username = row.get('username')
+            record = {key: value for key, value in row.items() if key and not key.startswith(('offer_', *OFFER_TYPES))}
+            record['offers'] = []
+        offer = csv_offer(row)
+        if offer is not None:
+            record['offers'].append(offer)
+    if record is not None:
+        yield position, record
+
+
+def read_records(source, import_format, start=0):
+    """``source`` is a binary file object; rows before ``start`` are skipped without being validated."""
+    stream = io.TextIOWrapper(source, encoding='utf-8-sig', newline='')
+    reader = read_jsonl if import_format == 'jsonl' else read_csv
+    return reader(stream, start)
+
+
+class ImportOfferSerializer(OfferSerializer):
+    """``OfferSerializer`` whose nested detail list serializer is built once and reused."""
+
+    @cached_property
+    def detail_list(self):
+        return OfferDetailsSerializer(many=True)
+
+    def validate_detail_list(self, details_data):
+        try:
+            return self.detail_list.run_validation(details_data)
+        except serializers.ValidationError as exc:
+            raise serializers.ValidationError({"details": exc.detail})
+
+
+class RecordValidator:
+    """
+    Validates records with one serializer instance per kind. DRF builds a
+    serializer's fields on first use, which costs more than validating a
+    row, so the instances are reused instead of created per record.
+    """
+
+    def __init__(self):
+        self.account = ImportAccountSerializer()
+        self.profile = UserProfileSerializer(partial=True)
+        self.offer = ImportOfferSerializer()
+
+    def run(self, serializer, data):
+        serializer.initial_data = data
+        return serializer.run_validation(data)
+
+    def validate(self, record):
+        """Return ``(account, profile, offers)`` validated data or raise ValidationError."""
+        if not isinstance(record, dict):
+            raise serializers.ValidationError({"detail": "Jeder Datensatz muss ein Objekt sein."})
+        if '_error' in record:
+            raise serializers.ValidationError({"detail": record['_error']})
+
+        account = self.run(self.account, record)
+        profile = self.run(self.profile, {field: record[field] for field in PROFILE_FIELDS if record.get(field) is not None})
+
+        offers = record.get('offers') or []
+        if not isinstance(offers, list):
+            raise serializers.ValidationError({"offers": "offers muss eine Liste sein."})
+        if offers and account['type'] != 'business':
+            raise serializers.ValidationError({"offers": "Nur Business-Nutzer können Angebote haben."})
+        validated_offers = []
+        for index, offer in enumerate(offers):
+            try:
+                validated_offers.append(self.run(self.offer, offer))
+            except serializers.ValidationError as exc:
+                raise serializers.ValidationError({"offers": {index: exc.detail}})
+        return account, profile, validated_offers
+
+
+class CatalogImporter:
+    """Validates and inserts records batch by batch; ``run()`` yields one progress dict per batch."""
+
+    def __init__(self, batch_size=None):
+        self.batch_size = max(1, batch_size or settings.CATALOG_IMPORT_BATCH_SIZE)
+        self.totals = {'users': 0, 'offers': 0, 'rejected': 0}
+        self.validator = RecordValidator()
+
+    def run(self, records):
+        batch, errors, position = [], [], None
+        for position, record in records:
+            try:
+                batch.append((position, *self.validator.validate(record)))
+            except serializers.ValidationError as exc:
+                username = record.get('username') if isinstance(record, dict) else None
+                errors.append({'position': position, 'username': username, 'errors': serializers.as_serializer_error(exc)})
+            if len(batch) + len(errors) >= self.batch_size:
+                yield self.flush(batch, errors, position)
+                batch, errors = [], []
+        if batch or errors:
+            yield self.flush(batch, errors, position)
+
+    def flush(self, batch, errors, position):
+        batch = self.drop_duplicates(batch, errors)
+        try:
+            users, offers = self.insert(batch)
+        except IntegrityError:
+            # a concurrent writer took a username or email: insert one by one to isolate it
+            users, offers = 0, 0
+            for item in batch:
+                try:
+                    created_users, created_offers = self.insert([item])
+                except IntegrityError as exc:
+                    errors.append({'position': item[0], 'username': item[1]['username'], 'errors': {'detail': [str(exc)]}})
+                else:
+                    users += created_users
+                    offers += created_offers
+        self.totals['users'] += users
+        self.totals['offers'] += offers
+        self.totals['rejected'] += len(errors)
+        errors.sort(key=lambda error: error['position'])
+        return {'position': position, 'users': users, 'offers': offers, 'errors': errors}
+
+    def drop_duplicates(self, batch, errors):
+        """Reject accounts whose username or email is taken, in the database or earlier in the batch."""
+        usernames = [account['username'] for _, account, _, _ in batch]
+        emails = [account['email'] for _, account, _, _ in batch]
+        taken_usernames = set(User.objects.filter(username__in=usernames).values_list('username', flat=True))
+        taken_emails = set(User.objects.filter(email__in=emails).values_list('email', flat=True))
+        taken_emails |= set(UserProfile.objects.filter(email__in=emails).values_list('email', flat=True))
+
+        kept = []
+        for item in batch:
+            position, account = item[0], item[1]
+            problems = {}
+            if account['username'] in taken_usernames:
+                problems['username'] = ["Dieser Benutzername ist bereits vergeben."]
+            if account['email'] in taken_emails:
+                problems['email'] = ["Diese E-Mail-Adresse wird bereits verwendet."]
+            if problems:
+                errors.append({'position': position, 'username': account['username'], 'errors': problems})
+                continue
+            taken_usernames.add(account['username'])
+            taken_emails.add(account['email'])
+            kept.append(item)
+        return kept
+
+    def insert(self, batch):
+        if not batch:
+            return 0, 0
+        with transaction.atomic():
+            users = User.objects.bulk_create([
+                User(
+                    username=account['username'], email=account['email'],
+                    first_name=profile.get('user', {}).get('first_name', ''),
+                    last_name=profile.get('user', {}).get('last_name', ''),
+                    password=self.password(account),
+                )
+                for _, account, profile, _ in batch
+            ])
+            UserProfile.objects.bulk_create([
+                UserProfile(
+                    user=user, type=account['type'], name=account['username'], email=account['email'],
+                    **{field: value for field, value in profile.items() if field != 'user'},
+                )
+                for user, (_, account, profile, _) in zip(users, batch)
+            ])
+            offer_rows = [
+                (Offer(user=user, **{key: value for key, value in data.items() if key != 'offer_details'}), data['offer_details'])
+                for user, (_, _, _, offers) in zip(users, batch)
+                for data in offers
+            ]
+            offers = Offer.objects.bulk_create([offer for offer, _ in offer_rows])
+            OfferDetails.objects.bulk_create([
+                OfferDetails(offer=offer, **detail) for offer, details in offer_rows for detail in details
+            ])
+            if offers:
+                sync_offers([offer.pk for offer in offers])
+            PlatformStats.apply(
+                business_profile_count=sum(1 for _, account, _, _ in batch if account['type'] == 'business'),
+                offer_count=len(offers),
+            )
+            metrics.inc_on_commit(metrics.OFFERS_CREATED, len(offers))
+        return len(users), len(offers)
+
+    def password(self, account):
+        if account.get('password_hash'):
+            return account['password_hash']
+        # None gives an unusable password; hashing real ones is what makes imports slow
+        return make_password(account.get('password'))
+
+
+def _progress_lines(importer, records):
+    for progress in importer.run(records):
+        yield json.dumps(progress, ensure_ascii=False) + '\n'
+    yield json.dumps({'done': True, **importer.totals}) + '\n'
+
+
+def stream_import(source, import_format, start=0, batch_size=None, asynchronous=False):
+    """
+    Import while the response is streamed: one NDJSON line per committed
+    batch, then a summary line. A client that loses the connection sends the
+    file again with ``resume_from`` set to the last ``position`` it received.
+    ``asynchronous`` (under ASGI) runs each batch through ``sync_to_async`` so
+    its line is sent before the next batch starts.
+    """
+    importer = CatalogImporter(batch_size)
+    lines = _progress_lines(importer, read_records(source, import_format, start))
+    if asynchronous:
+        lines = iterate_in_thread(lines)
+    response = StreamingHttpResponse(lines, content_type='application/x-ndjson')
+    response['Cache-Control'] = 'no-store'
+    return response
@@ -1,7 +1,240 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import json
+from types import SimpleNamespace
+
+from django.core.paginator import InvalidPage
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 
 class CustomPageNumberPagination(PageNumberPagination):
-    page_size = 6  
-    page_size_query_param = 'page_size'  
-    max_page_size = 100
\ No newline at end of file
+    page_size = 6
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """Async counterpart of paginate_queryset(): COUNT and page are read with the async ORM."""
+        self.request = request
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        paginator = self.django_paginator_class(queryset, page_size)
+        paginator.count = await queryset.acount()
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            msg = self.invalid_page_message.format(page_number=page_number, message=str(exc))
+            raise NotFound(msg)
+
+        self.page.object_list = [obj async for obj in self.page.object_list]
+        if paginator.num_pages > 1 and self.template is not None:
+            self.display_page_controls = True
+        return list(self.page)
+
+
+class KeysetPagination(BasePagination):
+    """
+    Opt-in keyset (cursor) pagination over a fixed ordering.
+
+    Activated with ``?pagination=cursor`` or ``?cursor=<token>``. Pages are
+    fetched with a ``WHERE`` on the last seen ordering values instead of
+    ``OFFSET``/``COUNT(*)``, so every page costs the same at any depth.
+    The order is always ``ordering``; ``?ordering=`` is rejected. Without
+    the opt-in the request is handed to ``fallback_class`` or, if there is
+    none, left unpaginated.
+
+    The cursor is only stable if the ``ordering`` columns of a row never
+    change: a row whose key is rewritten between two page fetches moves
+    across the cursor and is skipped or returned twice. Reviews never change
+    ``updated_at``; models that do use a subclass with an immutable key.
+    """
+    page_size = 6
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    mode_query_param = 'pagination'
+    estimate_query_param = 'estimate_total'
+    ordering = ('-updated_at', '-id')
+    estimate_cap = 1000
+    fallback_class = None
+    invalid_cursor_message = 'Ungültiger Cursor.'
+    ordering_not_supported_message = 'Die Sortierung kann mit pagination=cursor nicht geändert werden.'
+
+    def __init__(self):
+        self.fallback = self.fallback_class() if self.fallback_class else None
+        self.use_keyset = False
+
+    def is_requested(self, request):
+        return (
+            request.query_params.get(self.mode_query_param) == 'cursor'
+            or self.cursor_query_param in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.use_keyset = self.is_requested(request)
+        if not self.use_keyset:
+            if self.fallback is None:
+                return None
+            return self.fallback.paginate_queryset(queryset, request, view)
+
+        page_queryset, position, reverse = self.prepare(queryset, request)
+        results = list(page_queryset[:self.page_size + 1])
+        estimated_total = self.estimate_queryset(queryset).count() if self.wants_estimate(request) else None
+        return self.finish(results, position, reverse, estimated_total)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """Async counterpart of paginate_queryset()."""
+        self.use_keyset = self.is_requested(request)
+        if not self.use_keyset:
+            if self.fallback is None:
+                return None
+            return await self.fallback.apaginate_queryset(queryset, request, view)
+
+        page_queryset, position, reverse = self.prepare(queryset, request)
+        results = [obj async for obj in page_queryset[:self.page_size + 1]]
+        estimated_total = await self.estimate_queryset(queryset).acount() if self.wants_estimate(request) else None
+        return self.finish(results, position, reverse, estimated_total)
+
+    def prepare(self, queryset, request):
+        """Order and restrict the queryset to the rows after the requested cursor."""
+        if request.query_params.get(api_settings.ORDERING_PARAM):
+            raise ValidationError({api_settings.ORDERING_PARAM: [self.ordering_not_supported_message]})
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.model = queryset.model
+        position, reverse = self.decode_cursor(request)
+
+        ordering = self.ordering if not reverse else tuple(self.invert(field) for field in self.ordering)
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self.build_predicate(ordering, position))
+        return queryset, position, reverse
+
+    def finish(self, results, position, reverse, estimated_total):
+        """Trim the look-ahead row and remember the cursors of the fetched page."""
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+
+        if reverse:
+            self.has_next, self.has_previous = position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+
+        self.next_position = self.get_position(results[-1]) if results else position
+        self.previous_position = self.get_position(results[0]) if results else position
+        self.estimated_total = estimated_total
+        self.page = results
+        return results
+
+    def get_paginated_response(self, data):
+        if not self.use_keyset:
+            return self.fallback.get_paginated_response(data)
+
+        next_cursor = self.encode_cursor(self.next_position, reverse=False) if self.has_next else None
+        previous_cursor = self.encode_cursor(self.previous_position, reverse=True) if self.has_previous else None
+        payload = {
+            'next': self.get_link(next_cursor),
+            'previous': self.get_link(previous_cursor),
+            'next_cursor': next_cursor,
+            'previous_cursor': previous_cursor,
+        }
+        if self.estimated_total is not None:
+            payload['estimated_total'] = min(self.estimated_total, self.estimate_cap)
+            payload['estimated_total_capped'] = self.estimated_total > self.estimate_cap
+        payload['results'] = data
+        return Response(payload)
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def wants_estimate(self, request):
+        return request.query_params.get(self.estimate_query_param, '').lower() in ('1', 'true', 'yes')
+
+    def estimate_queryset(self, queryset):
+        """
+        The rows the request may list, counted up to one past ``estimate_cap``:
+        the count stays cheap and covers only what the user could page through.
+        """
+        return queryset.order_by()[:self.estimate_cap + 1]
+
+    @staticmethod
+    def invert(field):
+        return field[1:] if field.startswith('-') else f"-{field}"
+
+    def build_predicate(self, ordering, position):
+        """Expand ``(a, b) > (x, y)`` into ``a > x OR (a = x AND b > y)`` for the given directions."""
+        predicate = Q()
+        equal = Q()
+        for field, value in zip(ordering, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            predicate |= equal & Q(**{f"{name}__{lookup}": value})
+            equal &= Q(**{name: value})
+        return predicate
+
+    def get_position(self, instance):
+        if isinstance(instance, dict):
+            # a values() row, see coderr_app.api.compiled
+            instance = SimpleNamespace(**instance)
+        return [
+            self.model._meta.get_field(field.lstrip('-')).value_to_string(instance)
+            for field in self.ordering
+        ]
+
+    def encode_cursor(self, position, reverse):
+        raw = json.dumps({'p': position, 'r': int(reverse)}, separators=(',', ':'))
+        return base64.urlsafe_b64encode(raw.encode('ascii')).decode('ascii')
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            data = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('ascii'))
+            raw_position = data['p']
+            if len(raw_position) != len(self.ordering):
+                raise ValueError
+            position = [
+                self.model._meta.get_field(field.lstrip('-')).to_python(value)
+                for field, value in zip(self.ordering, raw_position)
+            ]
+            return position, bool(data.get('r'))
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_link(self, cursor):
+        if cursor is None:
+            return None
+        url = remove_query_param(self.base_url, self.mode_query_param)
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+
+class OfferPagination(KeysetPagination):
+    """
+    Page numbers by default, keyset pages on request.
+
+    Keeps ``-updated_at`` so both modes list the offers in the same order; an
+    offer edited while a client is paging moves to the front and is not seen
+    again by that walk.
+    """
+    fallback_class = CustomPageNumberPagination
+
+
+class OrderKeysetPagination(KeysetPagination):
+    """Orders by creation: every status change bumps ``updated_at``."""
+    ordering = ('-created_at', '-id')
@@ -1,12 +1,18 @@
 from rest_framework import serializers
-from coderr_app.models import Offer, OfferDetails, Order, Review
-from django.contrib.auth.models import User
-from django.db.models import Min
-from django.conf import settings
+from coderr_app import search
+from coderr_app.cache import bump_catalogue_version
+from coderr_app.models import BusinessRatingStats, Offer, OfferDetails, Order, Review
+from django.db import transaction
 from django.urls import reverse
-from rest_framework import status
-from rest_framework.response import Response
 from rest_framework.exceptions import ValidationError
+from .sparse import SparseFieldsetMixin
+
+
+def sync_offers(offer_ids):
+    """Update the detail summary and the search index after details were written in bulk (no signals)."""
+    Offer.objects.filter(pk__in=offer_ids).refresh_summary()
+    search.index_offers(offer_ids)
+    bump_catalogue_version()
 
 
 class OfferDetailsSerializer(serializers.ModelSerializer):
@@ -28,7 +34,7 @@ class OfferDetailsGETSerializer(serializers.ModelSerializer):
         return url.replace('/api', '')  
     
 
-class OfferSerializer(serializers.ModelSerializer):
+class OfferSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     details = serializers.SerializerMethodField()
     user_details = serializers.SerializerMethodField()
     min_price = serializers.SerializerMethodField()
@@ -39,68 +45,123 @@ class OfferSerializer(serializers.ModelSerializer):
         model = Offer
         fields = ['id', 'user', 'title', 'image', 'description', 'created_at', 'updated_at', 'details', 'min_price', 'min_delivery_time', 'user_details']
         extra_kwargs = {"user": {"read_only": True}}
+        sparse_sources = {
+            'details': ['offer_details'],
+            'user_details': ['user__first_name', 'user__last_name', 'user__username'],
+            'min_price': ['min_price'],
+            'min_delivery_time': ['min_delivery_time'],
+        }
 
     def to_representation(self, instance):
         """Dynamisch anpassen, ob user_details oder nur user-ID angezeigt wird."""
         data = super().to_representation(instance)
         request = self.context.get("request")
+        if "user_details" not in self.fields:
+            return data
         if request and request.parser_context["view"].action == "list":
             data["user_details"] = {
                 "first_name": instance.user.first_name,
                 "last_name": instance.user.last_name,
                 "username": instance.user.username
             }
+            if self.context.get("include_rating"):
+                data["user_details"]["rating_stats"] = BusinessRatingStats.for_user(instance.user).summary()
         else:
             data.pop("user_details", None)
         return data
 
 
-    def create(self, validated_data):
-        """Custom create method to ensure basic, standard, and premium details exist."""
-        details_data = self.initial_data.get('details', [])  
-        user = self.context["request"].user  
-        validated_data["user"] = user  
+    def validate(self, attrs):
+        """Validate the nested details and hand them to create()/update() as offer_details."""
+        if self.instance is None:
+            attrs['offer_details'] = self.validate_details(self.initial_data.get('details', []))
+        elif self.initial_data.get('details') is not None:
+            attrs['offer_details'] = self.validate_detail_updates(self.instance, self.initial_data['details'])
+        return attrs
+
+    def validate_detail_updates(self, instance, details_data):
+        """Match each detail update to an existing detail by offer_type and validate its fields."""
+        if not isinstance(details_data, list) or not all(isinstance(detail, dict) for detail in details_data):
+            raise ValidationError({"details": "Details must be a list of objects."})
 
+        existing_details = {detail.offer_type: detail for detail in instance.offer_details.all()}
+        updates = []
+        for detail_data in details_data:
+            offer_type = detail_data.get("offer_type")
+            if offer_type not in existing_details:
+                raise ValidationError({"detail": f"Offer type '{offer_type}' existiert nicht für dieses Angebot."})
+            detail_serializer = OfferDetailsSerializer(existing_details[offer_type], data=detail_data, partial=True)
+            if not detail_serializer.is_valid():
+                raise ValidationError({"details": detail_serializer.errors})
+            updates.append((existing_details[offer_type], detail_serializer.validated_data))
+        return updates
+
+    def validate_details(self, details_data):
+        """Ensure basic, standard, and premium details exist and each detail is valid."""
         required_types = {"basic", "standard", "premium"}
-        existing_types = {detail.get("offer_type") for detail in details_data}
+
+        if not isinstance(details_data, list) or not all(isinstance(detail, dict) for detail in details_data):
+            raise ValidationError({"details": "Details must be a list of objects."})
 
         for detail in details_data:
             if "offer_type" not in detail:
                 raise ValidationError({"details": "Each offer detail must include an 'offer_type' field."})
 
+        existing_types = {detail.get("offer_type") for detail in details_data}
         if not required_types.issubset(existing_types):
             raise ValidationError(
                 {"details": "Offers must include 'basic', 'standard', and 'premium' offer types."}
             )
 
-        offer = Offer.objects.create(**validated_data)
+        return self.validate_detail_list(details_data)
 
-        for detail_data in details_data:
-            OfferDetails.objects.create(offer=offer, **detail_data)
+    def validate_detail_list(self, details_data):
+        detail_serializer = OfferDetailsSerializer(data=details_data, many=True)
+        if not detail_serializer.is_valid():
+            raise ValidationError({"details": detail_serializer.errors})
+        return detail_serializer.validated_data
+
+    def create(self, validated_data):
+        """Insert the offer and all of its details in one transaction and one batch."""
+        details_data = validated_data.pop('offer_details', [])
+        validated_data["user"] = self.context["request"].user
+
+        with transaction.atomic():
+            offer = Offer.objects.create(**validated_data)
+            OfferDetails.objects.bulk_create([OfferDetails(offer=offer, **detail_data) for detail_data in details_data])
+            sync_offers([offer.pk])
+            offer.refresh_from_db(fields=Offer.SUMMARY_FIELDS)
 
         return offer
 
 
     def update(self, instance, validated_data):
-        """Custom update method to allow partial updates and handle nested OfferDetails."""
+        """
+        Apply offer fields and detail changes in one transaction: one batched UPDATE
+        for the changed details, the summary recomputed from the detail rows in
+        the database, one UPDATE of the changed offer columns. The in-memory
+        instance (and its prefetched details) is the response source; the caller
+        reads it inside the same transaction.
+        """
+        detail_updates = validated_data.pop('offer_details', [])
+
+        changed_details = []
+        changed_fields = set()
+        for detail_instance, detail_data in detail_updates:
+            for attr, value in detail_data.items():
+                setattr(detail_instance, attr, value)
+                changed_fields.add(attr)
+            changed_details.append(detail_instance)
 
-        details_data = validated_data.pop('offer_details', None)  
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
-        instance.save()
 
-        if details_data is not None:
-            existing_details = {detail.offer_type: detail for detail in instance.offer_details.all()}  
-
-            for detail_data in details_data:
-                offer_type = detail_data.get("offer_type")
-                if offer_type in existing_details:
-                    detail_instance = existing_details[offer_type]
-                    for attr, value in detail_data.items():
-                        setattr(detail_instance, attr, value)
-                    detail_instance.save()
-                else:
-                    OfferDetails.objects.create(offer=instance, **detail_data)  
+        # no savepoint of its own: OfferViewset.update already runs in a transaction
+        with transaction.atomic(savepoint=False):
+            if changed_details:
+                OfferDetails.objects.bulk_update(changed_details, sorted(changed_fields))
+                instance.refresh_summary()
+            instance.save(update_fields=[*validated_data, 'updated_at'])
 
         return instance
     
@@ -123,22 +184,13 @@ class OfferSerializer(serializers.ModelSerializer):
         }
 
     def get_min_price(self, obj):
-        min_price = obj.offer_details.aggregate(min_price=Min('price'))['min_price']
-        return float(min_price) if min_price is not None else 0.00
+        return float(obj.min_price) if obj.min_price is not None else 0.00
 
     def get_min_delivery_time(self, obj):
-        min_time = obj.offer_details.aggregate(min_time=Min('delivery_time_in_days'))['min_time']
-        return min_time if min_time is not None else 0
-    
-    def get_image(self, obj):
-        """Ensure image URL includes MEDIA_URL"""
-        if obj.image:
-             request = self.context.get('request')  
-             return request.build_absolute_uri(obj.image.url)  
-        return None
-    
+        return obj.min_delivery_time if obj.min_delivery_time is not None else 0
+
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     customer_user = serializers.PrimaryKeyRelatedField(read_only=True)
     business_user = serializers.PrimaryKeyRelatedField(read_only=True)
     title = serializers.CharField(read_only=True)
@@ -206,9 +258,8 @@ class UpdateOrderStatusSerializer(serializers.ModelSerializer):
         fields = ['status']
 
     def validate_status(self, value):
-        valid_statuses = ['in_progress', 'completed', 'cancelled']
-        if value not in valid_statuses:
-            raise serializers.ValidationError(f"Ungültiger Status. Erlaubte Werte: {', '.join(valid_statuses)}")
+        if value not in Order.STATUSES:
+            raise serializers.ValidationError(f"Ungültiger Status. Erlaubte Werte: {', '.join(Order.STATUSES)}")
         return value
 
     def update(self, instance, validated_data):
@@ -220,7 +271,7 @@ class UpdateOrderStatusSerializer(serializers.ModelSerializer):
         return OrderSerializer(instance).data
 
 
-class ReviewSerializer(serializers.ModelSerializer):
+class ReviewSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     reviewer = serializers.PrimaryKeyRelatedField(read_only=True)
     
     class Meta:
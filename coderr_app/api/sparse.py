@@ -0,0 +1,156 @@
+"""
+Sparse fieldsets: ``?fields=a,b`` renders only the listed fields of a GET
+response, ``?omit=a,b`` all but the listed ones.
+
+``SparseFieldsetMixin`` drops the other fields from a serializer, and
+``SparseQuerysetMixin`` narrows the view's queryset to what the remaining
+fields read: ``only()`` on their columns, ``select_related()`` and
+``prefetch_related()`` for just the relations they follow. Fields whose
+source cannot be derived (``SerializerMethodField``) name their lookups in
+``Meta.sparse_sources``; without one the queryset is left untouched.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework.exceptions import ValidationError
+
+FIELDS_PARAM = 'fields'
+OMIT_PARAM = 'omit'
+SPARSE_METHODS = ('GET', 'HEAD')
+
+
+def parse_field_list(value):
+    return [name.strip() for name in (value or '').split(',') if name.strip()]
+
+
+def is_sparse_request(request):
+    if request is None or request.method not in SPARSE_METHODS:
+        return False
+    params = request.query_params
+    return bool(parse_field_list(params.get(FIELDS_PARAM)) or parse_field_list(params.get(OMIT_PARAM)))
+
+
+def selected_fields(request, available):
+    """The field names the request asks for, in serializer order, or None if it does not restrict them."""
+    if not is_sparse_request(request):
+        return None
+    wanted = parse_field_list(request.query_params.get(FIELDS_PARAM))
+    omitted = parse_field_list(request.query_params.get(OMIT_PARAM))
+    unknown = [name for name in wanted + omitted if name not in available]
+    if unknown:
+        raise ValidationError({"fields": f"Unbekannte Felder: {', '.join(unknown)}."})
+    return [name for name in available if (not wanted or name in wanted) and name not in omitted]
+
+
+class SparseFieldsetMixin:
+    """Serializer mixin: keep only the fields selected with ``?fields=`` / ``?omit=``."""
+
+    def get_fields(self):
+        fields = super().get_fields()
+        selected = selected_fields(self.context.get('request'), fields)
+        if selected is None:
+            return fields
+        return {name: fields[name] for name in selected}
+
+
+def field_lookups(serializer):
+    """ORM lookups read by the serializer's fields, or None if one of them is unknown."""
+    sources = getattr(serializer.Meta, 'sparse_sources', {})
+    lookups = []
+    for name, field in serializer.fields.items():
+        if name in sources:
+            lookups.extend(sources[name])
+        elif field.source == '*':
+            return None
+        else:
+            lookups.append('__'.join(field.source_attrs))
+    return lookups
+
+
+def resolve_lookup(model, lookup):
+    """
+    Classify a lookup as ``('column', lookup)``, ``('one', path)`` (a to-one
+    relation loaded as a whole) or ``('many', path)`` (a to-many relation).
+    Returns None for attributes that are not model fields.
+    """
+    parts = lookup.split('__')
+    for index, part in enumerate(parts):
+        try:
+            field = model._meta.get_field(part)
+        except FieldDoesNotExist:
+            return None
+        path = '__'.join(parts[:index + 1])
+        if field.one_to_many or field.many_to_many:
+            return 'many', path
+        if not field.is_relation:
+            return 'column', path
+        if index == len(parts) - 1:
+            return ('column', path) if field.concrete else ('one', path)
+        model = field.related_model
+    return None
+
+
+def select_related_paths(tree, prefix=''):
+    paths = []
+    for name, children in tree.items():
+        path = f'{prefix}{name}'
+        paths.append(path)
+        paths.extend(select_related_paths(children, f'{path}__'))
+    return paths
+
+
+def related_model(model, path):
+    for part in path.split('__'):
+        model = model._meta.get_field(part).related_model
+    return model
+
+
+def sparse_queryset(queryset, serializer, extra_lookups=()):
+    """Restrict ``queryset`` to the columns and relations the serializer's fields read."""
+    lookups = field_lookups(serializer)
+    if lookups is None or queryset.query.select_related is True:
+        return queryset
+
+    model = queryset.model
+    columns, to_one, to_many = {model._meta.pk.name}, set(), set()
+    for lookup in [*lookups, *extra_lookups]:
+        resolved = resolve_lookup(model, lookup)
+        if resolved is None:
+            return queryset
+        kind, path = resolved
+        parents = path.split('__')[:-1]
+        to_one.update('__'.join(parents[:end]) for end in range(1, len(parents) + 1))
+        {'column': columns, 'one': to_one, 'many': to_many}[kind].add(path)
+
+    # relations the view selects below a needed one (e.g. the user's rating stats) stay selected
+    for path in select_related_paths(queryset.query.select_related or {}):
+        if path.rpartition('__')[0] in to_one:
+            to_one.add(path)
+    for path in to_one:
+        if not any(column.startswith(f'{path}__') for column in columns):
+            columns.update(f'{path}__{field.name}' for field in related_model(model, path)._meta.concrete_fields)
+
+    prefetches = [
+        lookup for lookup in queryset._prefetch_related_lookups
+        if (lookup.prefetch_through if isinstance(lookup, Prefetch) else lookup).split('__')[0] in to_many
+    ]
+    prefetched = {(lookup.prefetch_through if isinstance(lookup, Prefetch) else lookup) for lookup in prefetches}
+    prefetches += sorted(to_many - prefetched)
+
+    queryset = queryset.select_related(None).prefetch_related(None).prefetch_related(*prefetches)
+    if to_one:
+        queryset = queryset.select_related(*sorted(to_one))
+    return queryset.only(*sorted(columns))
+
+
+class SparseQuerysetMixin:
+    """
+    View mixin: for ``?fields=`` / ``?omit=`` requests, load only what the
+    selected fields need. The paginator's ordering columns are always kept.
+    """
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if not is_sparse_request(self.request):
+            return queryset
+        ordering = getattr(self.paginator, 'ordering', None) or ()
+        return sparse_queryset(queryset, self.get_serializer(), [field.lstrip('-') for field in ordering])
@@ -1,43 +1,51 @@
+import json
+
 from rest_framework import viewsets, filters, status, permissions
+from rest_framework.decorators import action
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
-from coderr_app.models import Offer, OfferDetails, Order, Review
-from user_auth_app.models import UserProfile
-from .serializers import OfferSerializer, OfferDetailsSerializer, OrderSerializer, CreateOrderSerializer, UpdateOrderStatusSerializer, ReviewSerializer
-from rest_framework.permissions import IsAuthenticated, AllowAny
-from .permissions import IsBusinessOwnerOrAdmin, IsCustomerOrAdmin, IsReviewerOrAdmin
-from .pagination import CustomPageNumberPagination  
+from coderr_app import metrics
+from coderr_app.cache import aget_catalogue_version, get_offer_list_cache, offer_list_cache_key
+from coderr_app.models import Offer, OfferDetails, Order, OrderStatusCount, PlatformStats, Review
+from .serializers import sync_offers, OfferSerializer, OfferDetailsSerializer, OrderSerializer, CreateOrderSerializer, UpdateOrderStatusSerializer, ReviewSerializer
+from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
+from rest_framework.parsers import MultiPartParser
+from .permissions import IsCustomerOrAdmin, IsReviewerOrAdmin
+from .pagination import CustomPageNumberPagination, KeysetPagination, OfferPagination, OrderKeysetPagination
+from .async_views import AsyncDispatchMixin, serving_async
+from .export import filter_export, stream_orders
+from .importer import IMPORT_FORMATS, detect_format, stream_import
+from .conditional import make_etag, not_modified_response, set_validators
+from .sparse import SparseQuerysetMixin
+from .compiled import CompiledListMixin, CompiledOfferSerializer
+from .filters import OfferFilter, OfferOrderingFilter, OfferSearchFilter
 from rest_framework.views import APIView
-from django.shortcuts import get_object_or_404
+from django.shortcuts import aget_object_or_404, get_object_or_404
+from django.http import HttpResponse
 from django.contrib.auth.models import User
-from django.db.models import Avg
-from django.db.models import Min, Q
-from rest_framework.exceptions import PermissionDenied, AuthenticationFailed
+from django.db.models import Q, aprefetch_related_objects
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from rest_framework.exceptions import PermissionDenied, AuthenticationFailed, ValidationError
 from rest_framework import serializers
-from rest_framework.exceptions import ValidationError
-from rest_framework.exceptions import NotFound
 
 
-class OfferViewset(viewsets.ModelViewSet):
+class OfferViewset(AsyncDispatchMixin, SparseQuerysetMixin, CompiledListMixin, viewsets.ModelViewSet):
     queryset = Offer.objects.all()
     serializer_class = OfferSerializer
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    compiled_serializer_class = CompiledOfferSerializer
+    filter_backends = [DjangoFilterBackend, OfferSearchFilter, OfferOrderingFilter]
     permission_classes = [AllowAny]
-    pagination_class = CustomPageNumberPagination
-
-    filterset_fields = {
-        'user': ['exact'], 
-        'updated_at': ['gte'],
-        'offer_details__price': ['gte'],  
-        'offer_details__delivery_time_in_days': ['exact', 'lte', 'gte']
-    }
+    pagination_class = OfferPagination
+
+    filterset_class = OfferFilter
     search_fields = ['title', 'description']
-    ordering_fields = ['updated_at']
+    ordering_fields = ['updated_at', 'min_price', 'min_delivery_time', 'relevance']
 
     def get_queryset(self):
-        queryset = Offer.objects.annotate(
-            min_price=Min('offer_details__price')
-        )
+        queryset = Offer.objects.select_related('user').prefetch_related('offer_details')
+        if self.action == 'list' and self.includes_rating():
+            queryset = queryset.select_related('user__rating_stats')
         creator_id = self.request.query_params.get('creator_id')
         max_delivery_time = self.request.query_params.get('max_delivery_time')
         min_price = self.request.query_params.get('min_price')
@@ -50,7 +58,7 @@ class OfferViewset(viewsets.ModelViewSet):
                 max_delivery_time = int(max_delivery_time)
             except ValueError:
                 raise ValidationError({"error": "max_delivery_time muss eine Ganzzahl sein."})
-            queryset = queryset.filter(offer_details__delivery_time_in_days__lte=max_delivery_time)
+            queryset = queryset.filter(min_delivery_time__lte=max_delivery_time)
 
         if min_price:
             try:
@@ -62,72 +70,174 @@ class OfferViewset(viewsets.ModelViewSet):
         return queryset
     
     def update(self, request, *args, **kwargs):
-        """Override to check authentication, permissions, and required offer types before updating."""
+        """
+        Check authentication and ownership, then read and update the offer and
+        its details in one transaction (which takes the write lock up front, see
+        ``transaction_mode``), so no concurrent write lands between the read and
+        the save. The response is built from the updated in-memory instance.
+        """
 
         if not request.user.is_authenticated:
             raise AuthenticationFailed({"detail": "Authentifizierung erforderlich."})  # 401
 
-        instance = get_object_or_404(Offer, pk=kwargs.get("pk"))  
+        with transaction.atomic():
+            queryset = Offer.objects.select_related('user').prefetch_related('offer_details')
+            instance = get_object_or_404(queryset, pk=kwargs.get("pk"))
 
-        if instance.user != request.user:
-            raise PermissionDenied({"detail": "Du hast keine Berechtigung, dieses Angebot zu bearbeiten."})  # 403
+            if instance.user_id != request.user.pk:
+                raise PermissionDenied({"detail": "Du hast keine Berechtigung, dieses Angebot zu bearbeiten."})  # 403
 
-        user_profile = getattr(request.user, "profile", None)
-        if not user_profile or user_profile.type != "business":
-            raise PermissionDenied({"detail": "Nur Business-Nutzer dürfen ihre Angebote bearbeiten."})  # 403
+            user_profile = getattr(request.user, "profile", None)
+            if not user_profile or user_profile.type != "business":
+                raise PermissionDenied({"detail": "Nur Business-Nutzer dürfen ihre Angebote bearbeiten."})  # 403
 
-        details_data = request.data.get('details', [])
-
-        if details_data is not None:
-            existing_details = {detail.offer_type: detail for detail in instance.offer_details.all()}
-            for detail_data in details_data:
-                offer_type = detail_data.get("offer_type")
-                if offer_type in existing_details:
-                    detail_instance = existing_details[offer_type]
-                    for attr, value in detail_data.items():
-                        setattr(detail_instance, attr, value)
-                    detail_instance.save()
-                else:
-                    raise ValidationError({"detail": f"Offer type '{offer_type}' existiert nicht für dieses Angebot."})
-
-        serializer = self.get_serializer(instance, data=request.data, partial=True)
-        serializer.is_valid(raise_exception=True)
-        self.perform_update(serializer)
+            serializer = self.get_serializer(instance, data=request.data, partial=True)
+            serializer.is_valid(raise_exception=True)
+            serializer.save()
 
-        updated_instance = self.get_queryset().get(pk=instance.pk)
-        response_serializer = self.get_serializer(updated_instance)
+        return Response(serializer.data, status=status.HTTP_200_OK)
 
-        return Response(response_serializer.data, status=status.HTTP_200_OK)
 
+    async def list(self, request, *args, **kwargs):
+        """Serve identical list requests from the offer list cache until the catalogue changes."""
+        renderer = request.accepted_renderer
+        if renderer.format != 'json':
+            return await self.list_page(request)
 
+        offer_list_cache = get_offer_list_cache()
+        key = offer_list_cache_key(request, self.get_list_cache_defaults(request), await aget_catalogue_version())
+        content = await offer_list_cache.aget(key)
+        if content is not None:
+            return HttpResponse(content, content_type=renderer.media_type, headers={'X-Cache': 'HIT'})
 
+        response = await self.list_page(request)
+        response['X-Cache'] = 'MISS'
+        if response.status_code == status.HTTP_200_OK:
+            response.add_post_render_callback(lambda rendered: offer_list_cache.set(key, rendered.content))
+        return response
 
-    def retrieve(self, request, *args, **kwargs):
+    async def list_page(self, request):
+        queryset = self.filter_queryset(self.get_queryset())
+        compiled = self.get_compiled_serializer()
+        if compiled is None:
+            page = await self.paginator.apaginate_queryset(queryset, request, view=self)
+            return self.get_paginated_response(self.get_serializer(page, many=True).data)
+
+        page = await self.paginator.apaginate_queryset(self.prepare_compiled(compiled, queryset), request, view=self)
+        return self.get_paginated_response(await compiled.aserialize(page))
+
+    def includes_rating(self):
+        """``?include_rating=true`` adds the business user's rating stats to the list's user_details."""
+        return self.request.query_params.get('include_rating', '').lower() in ('1', 'true', 'yes')
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['include_rating'] = self.action == 'list' and self.includes_rating()
+        return context
+
+    def get_list_cache_defaults(self, request):
+        if self.paginator.is_requested(request):
+            return {'page_size': self.paginator.page_size}
+        return {'page': 1, 'page_size': CustomPageNumberPagination.page_size}
+
+    async def retrieve(self, request, *args, **kwargs):
+        """
+        Answer conditional requests from the offer row alone; details are only
+        loaded for a 200. ETag only: detail writes change the summary columns
+        but not updated_at, so a Last-Modified would miss them.
+        """
         if not self.request.user.is_authenticated:
             raise AuthenticationFailed({"detail": "Authentifizierung erforderlich."})
-        instance = get_object_or_404(Offer, pk=kwargs.get("pk"))
+        instance = await aget_object_or_404(Offer.objects.select_related('user'), pk=kwargs.get("pk"))
+
+        etag = make_etag('offer', instance.pk, instance.updated_at.isoformat(), instance.min_price, instance.min_delivery_time, instance.detail_count)
+        not_modified = not_modified_response(request, etag)
+        if not_modified is not None:
+            return not_modified
+
         serializer = self.get_serializer(instance)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        if 'details' in serializer.fields:
+            await aprefetch_related_objects([instance], 'offer_details')
+        return set_validators(Response(serializer.data, status=status.HTTP_200_OK), etag)
     
 
-    def perform_create(self, serializer):
+    def check_create_permission(self):
         if not self.request.user.is_authenticated:
             raise AuthenticationFailed({"detail": "Authentifizierung erforderlich."}) #401
         user_profile = getattr(self.request.user, "profile", None)
         if not user_profile or user_profile.type != "business":
             raise PermissionDenied({"detail": "Nur Business-Nutzer dürfen Angebote erstellen."}) #403
+
+    def create(self, request, *args, **kwargs):
+        self.check_create_permission()
+        return super().create(request, *args, **kwargs)
+
+    def perform_create(self, serializer):
+        self.check_create_permission()
         serializer.save(user=self.request.user)
 
-    def perform_update(self, serializer):
-        instance = self.get_object()
-        if not self.request.user.is_authenticated:
-            raise AuthenticationFailed({"detail": "Authentifizierung erforderlich."})  # 401
-        if instance.user != self.request.user:
-            raise PermissionDenied({"detail": "Du hast keine Berechtigung, dieses Angebot zu bearbeiten."})  # 403
-        user_profile = getattr(self.request.user, "profile", None)
-        if not user_profile or user_profile.type != "business":
-            raise PermissionDenied({"detail": "Nur Business-Nutzer dürfen ihre Angebote bearbeiten."})  # 403
-        serializer.save()
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk_create(self, request):
+        """
+        Create many offers at once. Every item is validated first; valid items are
+        inserted in chunks of ``chunk_size``, each chunk in its own transaction.
+        Invalid items and failed chunks are reported per index.
+        """
+        self.check_create_permission()
+
+        items = request.data
+        if not isinstance(items, list) or not items:
+            raise ValidationError({"detail": "Erwartet wird eine nicht-leere Liste von Angeboten."})
+        if len(items) > settings.OFFER_BULK_MAX_ITEMS:
+            raise ValidationError({"detail": f"Maximal {settings.OFFER_BULK_MAX_ITEMS} Angebote pro Anfrage."})
+        try:
+            chunk_size = int(request.query_params.get('chunk_size', settings.OFFER_BULK_CHUNK_SIZE))
+        except ValueError:
+            raise ValidationError({"chunk_size": "chunk_size muss eine Ganzzahl sein."})
+        chunk_size = max(1, min(chunk_size, settings.OFFER_BULK_MAX_ITEMS))
+
+        errors = []
+        valid = []
+        for index, item in enumerate(items):
+            serializer = self.get_serializer(data=item)
+            if serializer.is_valid():
+                valid.append((index, serializer.validated_data))
+            else:
+                errors.append({"index": index, "errors": serializer.errors})
+
+        created = []
+        for start in range(0, len(valid), chunk_size):
+            chunk = valid[start:start + chunk_size]
+            try:
+                created.extend(self.insert_offer_chunk(chunk))
+            except DatabaseError as exc:
+                errors.extend({"index": index, "errors": {"detail": str(exc)}} for index, _ in chunk)
+
+        errors.sort(key=lambda error: error["index"])
+        if not errors:
+            response_status = status.HTTP_201_CREATED
+        elif created:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_400_BAD_REQUEST
+        return Response({"created": created, "errors": errors}, status=response_status)
+
+    def insert_offer_chunk(self, chunk):
+        with transaction.atomic():
+            offers = Offer.objects.bulk_create([
+                Offer(user=self.request.user, **{key: value for key, value in data.items() if key != 'offer_details'})
+                for _, data in chunk
+            ])
+            OfferDetails.objects.bulk_create([
+                OfferDetails(offer=offer, **detail_data)
+                for offer, (_, data) in zip(offers, chunk)
+                for detail_data in data['offer_details']
+            ])
+            offer_ids = [offer.pk for offer in offers]
+            sync_offers(offer_ids)
+            PlatformStats.apply(offer_count=len(offers))
+            metrics.inc_on_commit(metrics.OFFERS_CREATED, len(offers))
+        return [{"index": index, "id": offer.pk} for offer, (index, _) in zip(offers, chunk)]
 
     def handle_exception(self, exc):
         response = super().handle_exception(exc)
@@ -150,19 +260,29 @@ class OfferViewset(viewsets.ModelViewSet):
         return super().destroy(request, *args, **kwargs)
 
 
-class OfferDetailsViewSet(viewsets.ModelViewSet):
+class OfferDetailsViewSet(AsyncDispatchMixin, viewsets.ModelViewSet):
     queryset = OfferDetails.objects.all()
     serializer_class = OfferDetailsSerializer
 
-    def retrieve(self, request, *args, **kwargs):
+    async def retrieve(self, request, *args, **kwargs):
         if not request.user.is_authenticated:
             return Response({"detail": "Benutzer ist nicht authentifiziert."}, status=status.HTTP_401_UNAUTHORIZED)  # 401
         pk = kwargs.get("pk")
         if pk is None or not str(pk).isdigit():  
             return Response({"detail": "Ungültige oder fehlende ID."}, status=status.HTTP_400_BAD_REQUEST)  # 400
-        offer_detail = get_object_or_404(OfferDetails, pk=kwargs.get("pk"))
+        offer_detail = await aget_object_or_404(OfferDetails, pk=kwargs.get("pk"))
+
+        # ETag only: detail writes do not touch offer.updated_at, and the detail has no timestamp of its own
+        etag = make_etag(
+            'offerdetails', offer_detail.pk, offer_detail.offer_id, offer_detail.title, offer_detail.revisions,
+            offer_detail.delivery_time_in_days, offer_detail.price, json.dumps(offer_detail.features, sort_keys=True), offer_detail.offer_type
+        )
+        not_modified = not_modified_response(request, etag)
+        if not_modified is not None:
+            return not_modified
+
         serializer = self.get_serializer(offer_detail)
-        return Response(serializer.data, status=status.HTTP_200_OK)  # 200 OK
+        return set_validators(Response(serializer.data, status=status.HTTP_200_OK), etag)  # 200 OK
 
     def handle_exception(self, exc):
         response = super().handle_exception(exc)
@@ -171,9 +291,10 @@ class OfferDetailsViewSet(viewsets.ModelViewSet):
         return response
 
 
-class OrderViewSet(viewsets.ModelViewSet):
+class OrderViewSet(SparseQuerysetMixin, CompiledListMixin, viewsets.ModelViewSet):
     queryset = Order.objects.all()
     permission_classes = [IsAuthenticated]
+    pagination_class = OrderKeysetPagination
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
 
     def get_queryset(self):
@@ -198,6 +319,15 @@ class OrderViewSet(viewsets.ModelViewSet):
         kwargs['context'] = self.get_serializer_context()
         return super().get_serializer(*args, **kwargs)
 
+    @action(detail=False, methods=['get'], url_path='export')
+    def export(self, request):
+        """
+        Stream the user's complete order history as CSV (default) or NDJSON (``?output=ndjson``),
+        optionally filtered by ``status`` and ``created_after`` / ``created_before``.
+        """
+        queryset = filter_export(self.get_queryset(), request.query_params)
+        return stream_orders(queryset, request.query_params.get('output', 'csv'), asynchronous=serving_async(request))
+
 
     def perform_create(self, serializer):
         """ Ensure only customers can create orders and assign the customer user """
@@ -270,41 +400,69 @@ class OrderViewSet(viewsets.ModelViewSet):
             return Response({"detail": "Interner Serverfehler"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)  # 500
         return response
     
-class OrderCountView(APIView):
+async def aget_order_status_count(business_user_id, order_status):
+    """Read one counter; only look the user up when there is none, to keep the 404 for unknown users."""
+    count = await OrderStatusCount.objects.filter(
+        business_user_id=business_user_id, status=order_status
+    ).values_list('count', flat=True).afirst()
+    if count is None:
+        await aget_object_or_404(User, id=business_user_id)
+        count = 0
+    return count
+
+
+class OrderCountView(AsyncDispatchMixin, APIView):
     permission_classes = [IsAuthenticated]
-    def get(self, request, business_user_id): 
-        business_user = get_object_or_404(User, id=business_user_id)
-        order_count = Order.objects.filter(business_user=business_user, status='in_progress').count()
+    async def get(self, request, business_user_id): 
+        order_count = await aget_order_status_count(business_user_id, 'in_progress')
         return Response({"order_count": order_count}, status=status.HTTP_200_OK)
     
-class CompletedOrderCountView(APIView):
+class CompletedOrderCountView(AsyncDispatchMixin, APIView):
     permission_classes = [IsAuthenticated]
-    def get(self, request, business_user_id):
-        business_user = get_object_or_404(User, id=business_user_id)
-        completed_order_count = Order.objects.filter(business_user=business_user, status='completed').count()
+    async def get(self, request, business_user_id):
+        completed_order_count = await aget_order_status_count(business_user_id, 'completed')
         return Response({"completed_order_count": completed_order_count}, status=status.HTTP_200_OK)
+
+
+class OrderCountsView(AsyncDispatchMixin, APIView):
+    """Order counts per status for up to MAX_BUSINESS_USERS business users in one response."""
+    permission_classes = [IsAuthenticated]
+    MAX_BUSINESS_USERS = 500
+
+    async def get(self, request):
+        raw_ids = request.query_params.get('business_user_ids', '')
+        try:
+            business_user_ids = list(dict.fromkeys(int(value) for value in raw_ids.split(',') if value.strip()))
+        except ValueError:
+            raise ValidationError({"business_user_ids": "business_user_ids muss eine kommagetrennte Liste von Ganzzahlen sein."})
+        if not business_user_ids:
+            raise ValidationError({"business_user_ids": "Mindestens eine ID ist erforderlich."})
+        if len(business_user_ids) > self.MAX_BUSINESS_USERS:
+            raise ValidationError({"business_user_ids": f"Maximal {self.MAX_BUSINESS_USERS} IDs pro Anfrage."})
+
+        counts = await OrderStatusCount.afor_business_users(business_user_ids)
+        return Response({str(user_id): value for user_id, value in counts.items()}, status=status.HTTP_200_OK)
     
 
-class BaseInfoViewset(APIView):
-    def get(self, request):
-        review_count = Review.objects.count()
-        average_rating = Review.objects.aggregate(avg_rating=Avg('rating'))['avg_rating']
+class BaseInfoViewset(AsyncDispatchMixin, APIView):
+    async def get(self, request):
+        stats = await PlatformStats.acached()
+        average_rating = stats.average_rating
         average_rating = round(average_rating, 1) if average_rating is not None else 0.0
-        business_profile_count = UserProfile.objects.filter(type = 'business').count()
-        offer_count = Offer.objects.count()
 
         return Response({
-            "review_count": review_count,
+            "review_count": stats.review_count,
             "average_rating": average_rating,
-            "business_profile_count": business_profile_count,
-            "offer_count": offer_count
+            "business_profile_count": stats.business_profile_count,
+            "offer_count": stats.offer_count
         }, status=status.HTTP_200_OK)
 
 
-class ReviewViewSet(viewsets.ModelViewSet):
+class ReviewViewSet(SparseQuerysetMixin, CompiledListMixin, viewsets.ModelViewSet):
     queryset = Review.objects.all()
     serializer_class = ReviewSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
 
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['business_user', 'reviewer'] 
@@ -323,12 +481,22 @@ class ReviewViewSet(viewsets.ModelViewSet):
         request._full_data = {key: value for key, value in mutable_data.items() if key in allowed_fields}
         return super().partial_update(request, *args, **kwargs)
     
+    @transaction.atomic
     def perform_create(self, serializer):
         business_user = serializer.validated_data['business_user']
         if Review.objects.filter(reviewer=self.request.user, business_user=business_user).exists():
             raise serializers.ValidationError({"detail": "Du hast bereits eine Bewertung für diesen Geschäftsbenutzer abgegeben."})
         serializer.save(reviewer=self.request.user)
 
+    @transaction.atomic
+    def perform_update(self, serializer):
+        """The review and the rating stats its signals update are written together."""
+        serializer.save()
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        instance.delete()
+
     def get_queryset(self):
         queryset = super().get_queryset()
         business_user_id = self.request.query_params.get('business_user_id')
@@ -342,3 +510,28 @@ class ReviewViewSet(viewsets.ModelViewSet):
     
     
     
+
+
+class CatalogImportView(APIView):
+    """
+    Staff only: import businesses with their profiles and offers from an
+    uploaded JSONL or CSV ``file`` (see ``manage.py import_catalog``). The
+    progress is streamed back as NDJSON; ``resume_from`` skips records that
+    an earlier, interrupted upload already committed.
+    """
+    permission_classes = [IsAdminUser]
+    parser_classes = [MultiPartParser]
+
+    def post(self, request):
+        upload = request.FILES.get('file')
+        if upload is None:
+            raise ValidationError({"file": "Eine Datei ist erforderlich."})
+        import_format = request.data.get('format') or detect_format(upload.name)
+        if import_format not in IMPORT_FORMATS:
+            raise ValidationError({"format": f"Ungültiges Format, erlaubt sind: {', '.join(IMPORT_FORMATS)}."})
+        try:
+            start = int(request.data.get('resume_from') or 0)
+            batch_size = int(request.data['batch_size']) if request.data.get('batch_size') else None
+        except ValueError:
+            raise ValidationError({"detail": "resume_from und batch_size müssen Ganzzahlen sein."})
+        return stream_import(upload.file, import_format, start, batch_size, asynchronous=serving_async(request))
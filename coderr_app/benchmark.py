@@ -0,0 +1,185 @@
+"""
+Deterministic synthetic data for the benchmark and load-test commands.
+
+``seed_dataset()`` bulk-inserts business and customer users with profiles
+and tokens, offers with their three details, orders across all statuses
+and reviews. bulk_create() sends no signals, so the denormalized data
+(offer summary, search index, order and rating counters, base-info stats,
+offer list cache version) is brought up to date afterwards. The same
+arguments always produce the same rows.
+"""
+import random
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db.models import Count, Q
+from rest_framework.authtoken.models import Token
+
+from user_auth_app.models import UserProfile
+
+from . import search
+from .cache import bump_catalogue_version
+from .models import BusinessRatingStats, Offer, OfferDetails, Order, OrderStatusCount, PlatformStats, Review
+
+BENCH_PASSWORD = 'bench-password'
+CITIES = ['Berlin', 'Hamburg', 'München', 'Köln', 'Frankfurt', 'Stuttgart', 'Leipzig', 'Dresden']
+SERVICES = ['Logo Design', 'Webseite', 'Visitenkarte', 'Flyer', 'Fotografie', 'Übersetzung', 'Social Media', 'Texte']
+ADJECTIVES = ['Modernes', 'Klassisches', 'Schnelles', 'Individuelles', 'Professionelles', 'Kreatives']
+DETAIL_TYPES = [('basic', 1, 7, 1.0), ('standard', 3, 5, 2.0), ('premium', 5, 3, 3.5)]
+ORDER_STATUS_WEIGHTS = [('in_progress', 5), ('completed', 4), ('cancelled', 1)]
+
+
+class Dataset:
+    """Ids of the seeded rows, used to build the benchmark requests."""
+
+    def __init__(self):
+        self.business_ids = []
+        self.customer_ids = []
+        self.usernames = {}
+        self.tokens = {}
+        self.offer_ids = []
+        self.offer_owner = {}
+        self.detail_ids = []
+        self.free_detail_ids = []
+        self.order_ids = []
+        self.order_parties = {}
+        self.order_status = {}
+        self.review_ids = []
+        self.review_reviewer = {}
+        self.free_review_pairs = []
+
+    def auth(self, user_id):
+        return f"Token {self.tokens[user_id]}"
+
+    def take_free_details(self, count):
+        """Offer details nobody has ordered yet (an order takes its detail's id)."""
+        taken, self.free_detail_ids = self.free_detail_ids[:count], self.free_detail_ids[count:]
+        return taken
+
+    def take_review_pairs(self, count):
+        """(customer, business) pairs without a review yet."""
+        taken, self.free_review_pairs = self.free_review_pairs[:count], self.free_review_pairs[count:]
+        return taken
+
+    def summary(self):
+        return {
+            'business_users': len(self.business_ids),
+            'customer_users': len(self.customer_ids),
+            'offers': len(self.offer_ids),
+            'offer_details': len(self.detail_ids),
+            'orders': len(self.order_ids),
+            'reviews': len(self.review_ids),
+        }
+
+
+def seed_dataset(business=20, customers=50, offers_per_business=5, orders=150, reviews=150, seed=42, prefix='bench'):
+    rng = random.Random(seed)
+    dataset = Dataset()
+    # one hash for everybody: hashing is deliberately slow
+    password = make_password(BENCH_PASSWORD)
+
+    users = User.objects.bulk_create(
+        [User(username=f'{prefix}_business_{i}', first_name=f'Anbieter {i}', last_name=rng.choice(CITIES), password=password)
+         for i in range(business)]
+        + [User(username=f'{prefix}_customer_{i}', first_name=f'Kunde {i}', password=password) for i in range(customers)]
+    )
+    business_users, customer_users = users[:business], users[business:]
+    dataset.business_ids = [user.pk for user in business_users]
+    dataset.customer_ids = [user.pk for user in customer_users]
+    dataset.usernames = {user.pk: user.username for user in users}
+    UserProfile.objects.bulk_create([
+        UserProfile(
+            user=user, type=user_type, name=user.username, email=f'{user.username}@bench.example.com',
+            location=rng.choice(CITIES), tel=f'030{rng.randrange(10 ** 7):07d}',
+            description=f"{rng.choice(ADJECTIVES)} Angebot rund um {rng.choice(SERVICES)}.",
+        )
+        for user_type, group in (('business', business_users), ('customer', customer_users))
+        for user in group
+    ])
+    tokens = Token.objects.bulk_create([Token(user=user, key=f'{rng.getrandbits(160):040x}') for user in users])
+    dataset.tokens = {token.user_id: token.key for token in tokens}
+
+    offers = Offer.objects.bulk_create([
+        Offer(
+            user=user, title=f"{rng.choice(ADJECTIVES)} {rng.choice(SERVICES)} {i}",
+            description=f"{rng.choice(SERVICES)} und {rng.choice(SERVICES)} aus {rng.choice(CITIES)}.",
+        )
+        for user in business_users
+        for i in range(offers_per_business)
+    ])
+    dataset.offer_ids = [offer.pk for offer in offers]
+    dataset.offer_owner = {offer.pk: offer.user_id for offer in offers}
+    details = OfferDetails.objects.bulk_create([
+        OfferDetails(
+            offer=offer, title=f"{offer_type.title()} Paket", revisions=revisions, delivery_time_in_days=days,
+            price=round(rng.randint(20, 200) * factor, 2), offer_type=offer_type,
+            features=rng.sample(SERVICES, k=rng.randint(1, 3)),
+        )
+        for offer in offers
+        for offer_type, revisions, days, factor in DETAIL_TYPES
+    ])
+    dataset.detail_ids = [detail.pk for detail in details]
+
+    ordered = rng.sample(details, k=min(orders, len(details)))
+    statuses, weights = zip(*ORDER_STATUS_WEIGHTS)
+    seeded_orders = Order.objects.bulk_create([
+        Order(
+            id=detail.pk, customer_user_id=rng.choice(dataset.customer_ids), business_user_id=detail.offer.user_id,
+            offer_detail=detail, title=detail.offer.title, revisions=detail.revisions,
+            delivery_time_in_days=detail.delivery_time_in_days, price=detail.price, features=detail.features,
+            offer_type=detail.offer_type, status=rng.choices(statuses, weights)[0],
+        )
+        for detail in ordered
+    ])
+    dataset.order_ids = [order.pk for order in seeded_orders]
+    dataset.order_parties = {order.pk: (order.customer_user_id, order.business_user_id) for order in seeded_orders}
+    dataset.order_status = {order.pk: order.status for order in seeded_orders}
+    ordered_ids = set(dataset.order_ids)
+    dataset.free_detail_ids = [detail_id for detail_id in dataset.detail_ids if detail_id not in ordered_ids]
+
+    pairs = [(customer_id, business_id) for customer_id in dataset.customer_ids for business_id in dataset.business_ids]
+    rng.shuffle(pairs)
+    reviewed, dataset.free_review_pairs = pairs[:reviews], pairs[reviews:]
+    seeded_reviews = Review.objects.bulk_create([
+        Review(business_user_id=business_id, reviewer_id=customer_id, rating=rng.choice([2, 3, 3.5, 4, 4, 4.5, 5, 5]),
+               description=f"{rng.choice(ADJECTIVES)} Arbeit, gerne wieder.")
+        for customer_id, business_id in reviewed
+    ])
+    dataset.review_ids = [review.pk for review in seeded_reviews]
+    dataset.review_reviewer = {review.pk: review.reviewer_id for review in seeded_reviews}
+
+    sync_denormalized(dataset, seeded_reviews)
+    return dataset
+
+
+def sync_denormalized(dataset, seeded_reviews):
+    """Do what the model signals would have done for the bulk-inserted rows."""
+    Offer.objects.filter(pk__in=dataset.offer_ids).refresh_summary()
+    search.index_offers(dataset.offer_ids)
+    counts = (
+        Order.objects.filter(business_user_id__in=dataset.business_ids).order_by()
+        .values('business_user_id', 'status').annotate(count=Count('id'))
+    )
+    OrderStatusCount.objects.bulk_create([OrderStatusCount(**row) for row in counts])
+    BusinessRatingStats.objects.bulk_create([
+        BusinessRatingStats(business_user_id=user_id, **values)
+        for user_id, values in BusinessRatingStats.compute(dataset.business_ids).items()
+    ])
+    PlatformStats.apply(
+        review_count=len(seeded_reviews), rating_sum=sum(review.rating for review in seeded_reviews),
+        business_profile_count=len(dataset.business_ids), offer_count=len(dataset.offer_ids),
+    )
+    bump_catalogue_version()
+
+
+def delete_dataset(prefix='bench'):
+    """
+    Remove everything seeded with ``prefix`` and whatever was created for those
+    users since. Reviews and orders go first so that their signals still find
+    the counter rows they adjust.
+    """
+    users = User.objects.filter(username__startswith=f'{prefix}_')
+    Review.objects.filter(Q(reviewer__in=users) | Q(business_user__in=users)).delete()
+    Order.objects.filter(Q(customer_user__in=users) | Q(business_user__in=users)).delete()
+    Offer.objects.filter(user__in=users).delete()
+    users.delete()
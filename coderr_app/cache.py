@@ -0,0 +1,192 @@
+"""
+Response caching for the public offer list.
+
+``BoundedLRUCache`` is a Django cache backend bounded by entry count and by
+total byte size, with hit/miss counters. Entries are keyed by the offer
+catalogue version (a database row, so every worker process sees the same
+one), which every committed Offer/OfferDetails write bumps, so stale
+responses are never deleted one by one; they simply stop being addressed
+and age out of the LRU.
+"""
+import hashlib
+import json
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.db import transaction
+
+OFFER_LIST_CACHE_ALIAS = 'offer_list'
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+class _Store:
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+
+class BoundedLRUCache(BaseCache):
+    """
+    In-process LRU cache limited by ``MAX_ENTRIES`` and ``MAX_SIZE`` (bytes of
+    pickled values). Like LocMemCache, every instance with the same LOCATION
+    shares one store, so all threads of a process see the same entries.
+    """
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._max_size = int(options.get('MAX_SIZE', 64 * 1024 * 1024))
+        with _stores_lock:
+            self._store = _stores.setdefault(location, _Store())
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        with self._store.lock:
+            if self._get_live(key) is not None:
+                return False
+            self._set(key, value, timeout)
+            return True
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        with self._store.lock:
+            entry = self._get_live(key)
+            if entry is None:
+                self._store.misses += 1
+                return default
+            self._store.entries.move_to_end(key)
+            self._store.hits += 1
+            return pickle.loads(entry[1])
+
+    # the store lives in process memory, so the async API needs no worker thread
+    async def aget(self, key, default=None, version=None):
+        return self.get(key, default, version)
+
+    async def aset(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set(key, value, timeout, version)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        with self._store.lock:
+            self._set(key, value, timeout)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        with self._store.lock:
+            entry = self._get_live(key)
+            if entry is None:
+                return False
+            self._store.entries[key] = (self.get_backend_timeout(timeout), entry[1])
+            return True
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        with self._store.lock:
+            return self._delete(key)
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        with self._store.lock:
+            return self._get_live(key) is not None
+
+    def clear(self):
+        with self._store.lock:
+            self._store.entries.clear()
+            self._store.size = 0
+            self._store.hits = 0
+            self._store.misses = 0
+
+    def stats(self):
+        with self._store.lock:
+            return {
+                'hits': self._store.hits,
+                'misses': self._store.misses,
+                'entries': len(self._store.entries),
+                'size': self._store.size,
+            }
+
+    def _get_live(self, key):
+        entry = self._store.entries.get(key)
+        if entry is not None and entry[0] is not None and entry[0] <= time.time():
+            self._delete(key)
+            return None
+        return entry
+
+    def _set(self, key, value, timeout):
+        pickled = pickle.dumps(value, self.pickle_protocol)
+        if len(pickled) > self._max_size:
+            return
+        self._delete(key)
+        self._store.entries[key] = (self.get_backend_timeout(timeout), pickled)
+        self._store.size += len(pickled)
+        while len(self._store.entries) > self._max_entries or self._store.size > self._max_size:
+            self._delete(next(iter(self._store.entries)))
+
+    def _delete(self, key):
+        entry = self._store.entries.pop(key, None)
+        if entry is None:
+            return False
+        self._store.size -= len(entry[1])
+        return True
+
+
+def get_catalogue_version():
+    from .models import CatalogueVersion
+
+    return CatalogueVersion.current()
+
+
+async def aget_catalogue_version():
+    from .models import CatalogueVersion
+
+    return await CatalogueVersion.acurrent()
+
+
+class _CatalogueBump:
+    """One pending bump per transaction; rolled-back transactions drop it with their other callbacks."""
+    done = False
+
+    def __call__(self):
+        from .models import CatalogueVersion
+
+        self.done = True
+        CatalogueVersion.bump()
+
+
+def bump_catalogue_version():
+    """
+    Bump once the surrounding transaction commits: bumped earlier, a reader
+    could cache the pre-commit rows under the new version. Several bumps in
+    one transaction are sent as one.
+    """
+    connection = transaction.get_connection()
+    if any(isinstance(func, _CatalogueBump) and not func.done for _, func, _ in connection.run_on_commit):
+        return
+    transaction.on_commit(_CatalogueBump())
+
+
+def get_offer_list_cache():
+    return caches[OFFER_LIST_CACHE_ALIAS]
+
+
+def offer_list_cache_key(request, defaults, version=None):
+    """Key for the list response: host, catalogue version and the sorted, defaulted query parameters."""
+    if version is None:
+        version = get_catalogue_version()
+    params = {key: [value for value in values if value != ''] for key, values in request.query_params.lists()}
+    params = {key: values for key, values in params.items() if values}
+    for key, value in defaults.items():
+        params.setdefault(key, [str(value)])
+    normalized = json.dumps([[key, params[key]] for key in sorted(params)])
+    raw = f"{request.scheme}://{request.get_host()}|{version}|{normalized}"
+    return f"offers:{hashlib.sha256(raw.encode('utf-8')).hexdigest()}"
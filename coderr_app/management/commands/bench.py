@@ -0,0 +1,350 @@
+import json
+import logging
+import platform
+import statistics
+import time
+
+import django
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from coderr_app.benchmark import BENCH_PASSWORD, seed_dataset
+from coderr_app.cache import get_offer_list_cache
+from coderr_app.models import Offer, OfferDetails, Order, Review
+from user_auth_app.api.authentication import identity_cache
+
+
+class Scenario:
+    """
+    One request, repeated. ``targets(count)`` returns a dict per iteration
+    (ids for the path, ``user``, payload values), so write scenarios never
+    hit the same row twice. ``cold`` clears all caches before every request.
+    """
+
+    def __init__(self, name, method, path, user=None, data=None, status=200, targets=None, cold=False, max_repeat=None):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.user = user
+        self.data = data
+        self.status = status
+        self.targets = targets
+        self.cold = cold
+        self.max_repeat = max_repeat
+
+    def iterations(self, count):
+        targets = self.targets(count) if self.targets else [{} for _ in range(count)]
+        if len(targets) < count:
+            raise CommandError(f"{self.name}: the dataset only has {len(targets)} targets for {count} iterations.")
+        return targets
+
+    def request(self, target, index):
+        user = target.get('user', self.user)
+        data = self.data(target, index) if callable(self.data) else self.data
+        return self.method, self.path.format(**target), user, data
+
+
+def offer_payload(title):
+    return {
+        'title': title, 'description': 'Bench',
+        'details': [
+            {'title': offer_type, 'revisions': 1, 'delivery_time_in_days': days, 'price': price,
+             'features': ['Logo Design'], 'offer_type': offer_type}
+            for offer_type, days, price in [('basic', 7, 100), ('standard', 5, 200), ('premium', 3, 300)]
+        ],
+    }
+
+
+def build_scenarios(ds):
+    business, customer = ds.business_ids[0], ds.customer_ids[0]
+    offer = next(pk for pk, owner in ds.offer_owner.items() if owner == business)
+    order = ds.order_ids[0]
+    order_customer, order_business = ds.order_parties[order]
+    review = ds.review_ids[0]
+    own_offers = [pk for pk, owner in ds.offer_owner.items() if owner == business]
+
+    def fresh_offers(count):
+        offers = Offer.objects.bulk_create([Offer(user_id=business, title=f"Bench delete {i}", description='Bench') for i in range(count)])
+        return [{'offer': offer.pk} for offer in offers]
+
+    def free_details(count):
+        return [{'detail': pk} for pk in ds.take_free_details(count)]
+
+    def fresh_orders(count):
+        targets = []
+        for detail in OfferDetails.objects.filter(pk__in=ds.take_free_details(count)).select_related('offer'):
+            order = Order.objects.create(
+                id=detail.pk, customer_user_id=customer, business_user_id=detail.offer.user_id, offer_detail=detail,
+                title=detail.offer.title, revisions=detail.revisions, delivery_time_in_days=detail.delivery_time_in_days,
+                price=detail.price, features=detail.features, offer_type=detail.offer_type,
+            )
+            targets.append({'order': order.pk, 'user': order.business_user_id})
+        return targets
+
+    def review_pairs(count):
+        return [{'user': reviewer, 'business': business_user} for reviewer, business_user in ds.take_review_pairs(count)]
+
+    def fresh_reviews(count):
+        reviews = [Review.objects.create(business_user_id=business_user, reviewer_id=reviewer, rating=4, description='Bench')
+                   for reviewer, business_user in ds.take_review_pairs(count)]
+        return [{'review': review.pk, 'user': review.reviewer_id} for review in reviews]
+
+    def bump(count):
+        return [{'own_offer': own_offers[i % len(own_offers)]} for i in range(count)]
+
+    return [
+        # coderr_app/api/urls.py
+        Scenario('offers.list.cold', 'get', '/api/offers/', cold=True),
+        Scenario('offers.list.cached', 'get', '/api/offers/'),
+        Scenario('offers.list.filtered', 'get', f'/api/offers/?creator_id={business}&min_price=50&max_delivery_time=7', cold=True),
+        Scenario('offers.list.search', 'get', '/api/offers/?search=logo', cold=True),
+        Scenario('offers.list.cursor', 'get', '/api/offers/?pagination=cursor&page_size=20', cold=True),
+        Scenario('offers.list.sparse', 'get', '/api/offers/?fields=id,title,min_price', cold=True),
+        Scenario('offers.retrieve', 'get', f'/api/offers/{offer}/', customer),
+        Scenario('offers.create', 'post', '/api/offers/', business, lambda target, i: offer_payload(f"Bench create {i}"), 201),
+        Scenario('offers.bulk', 'post', '/api/offers/bulk/', business,
+                 lambda target, i: [offer_payload(f"Bench bulk {i}.{n}") for n in range(10)], 201),
+        Scenario('offers.update', 'patch', '/api/offers/{own_offer}/', business,
+                 lambda target, i: {'title': f"Bench update {i}", 'details': [{'offer_type': 'basic', 'price': 100 + i}]},
+                 targets=bump),
+        Scenario('offers.delete', 'delete', '/api/offers/{offer}/', business, status=204, targets=fresh_offers),
+        Scenario('offerdetails.retrieve', 'get', f'/api/offerdetails/{ds.detail_ids[0]}/', customer),
+        Scenario('orders.list', 'get', '/api/orders/', business),
+        Scenario('orders.list.cursor', 'get', '/api/orders/?pagination=cursor&page_size=20', business),
+        Scenario('orders.retrieve', 'get', f'/api/orders/{order}/', order_customer),
+        Scenario('orders.export', 'get', '/api/orders/export/', business),
+        Scenario('orders.create', 'post', '/api/orders/', customer, lambda target, i: {'offer_detail_id': target['detail']},
+                 201, targets=free_details),
+        Scenario('orders.update', 'patch', f'/api/orders/{order}/', order_business,
+                 lambda target, i: {'status': ('completed', 'in_progress')[i % 2]}),
+        Scenario('orders.delete', 'delete', '/api/orders/{order}/', status=204, targets=fresh_orders),
+        Scenario('order-count', 'get', f'/api/order-count/{business}/', customer),
+        Scenario('completed-order-count', 'get', f'/api/completed-order-count/{business}/', customer),
+        Scenario('order-counts', 'get', f'/api/order-counts/?business_user_ids={",".join(map(str, ds.business_ids))}', customer),
+        Scenario('base-info', 'get', '/api/base-info/'),
+        Scenario('reviews.list', 'get', '/api/reviews/', customer),
+        Scenario('reviews.list.filtered', 'get', f'/api/reviews/?business_user_id={business}&ordering=-rating', customer),
+        Scenario('reviews.retrieve', 'get', f'/api/reviews/{review}/', customer),
+        Scenario('reviews.create', 'post', '/api/reviews/', None,
+                 lambda target, i: {'business_user': target['business'], 'rating': 4, 'description': 'Bench'}, 201,
+                 targets=review_pairs),
+        Scenario('reviews.update', 'patch', f'/api/reviews/{review}/', ds.review_reviewer[review],
+                 lambda target, i: {'rating': (3, 5)[i % 2], 'description': f"Bench {i}"}),
+        Scenario('reviews.delete', 'delete', '/api/reviews/{review}/', status=204, targets=fresh_reviews),
+        # user_auth_app/api/urls.py
+        Scenario('profile.retrieve', 'get', f'/api/profile/{business}/', customer),
+        Scenario('profile.update', 'patch', f'/api/profile/{customer}/', customer, lambda target, i: {'location': f"Bench {i}"}),
+        Scenario('profiles.business', 'get', '/api/profiles/business/', customer),
+        Scenario('profiles.business.filtered', 'get', '/api/profiles/business/?location=ber', customer),
+        Scenario('profiles.customer', 'get', '/api/profiles/customer/', business),
+        # password hashing dominates these, a few rounds are enough
+        Scenario('login', 'post', '/api/login/', None,
+                 lambda target, i: {'username': 'bench_customer_0', 'password': BENCH_PASSWORD}, max_repeat=10),
+        Scenario('registration', 'post', '/api/registration/', None,
+                 lambda target, i: {'username': f'bench_new_{i}', 'email': f'bench_new_{i}@bench.example.com',
+                                    'password': BENCH_PASSWORD, 'repeated_password': BENCH_PASSWORD, 'type': 'customer'},
+                 201, max_repeat=10),
+    ]
+
+
+def summarize(samples, queries, sizes):
+    quantiles = statistics.quantiles(samples, n=100, method='inclusive') if len(samples) > 1 else samples * 99
+    return {
+        'p50_ms': round(quantiles[49], 3),
+        'p95_ms': round(quantiles[94], 3),
+        'p99_ms': round(quantiles[98], 3),
+        'mean_ms': round(statistics.mean(samples), 3),
+        'queries': statistics.median_low(queries),
+        'bytes': statistics.median_low(sizes),
+        'samples': len(samples),
+    }
+
+
+def change(old, new):
+    if not old:
+        return 0.0 if not new else float('inf')
+    return (new - old) / old * 100
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a synthetic dataset with bulk inserts, drive every endpoint of coderr_app and user_auth_app "
+        "through the test client and report p50/p95/p99 latency, query count and response bytes per scenario. "
+        "--output writes the results as JSON, --compare diffs them against a stored baseline. "
+        "All seeded and written rows are rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--business', type=int, default=20, help="Business users to seed.")
+        parser.add_argument('--customers', type=int, default=50, help="Customer users to seed.")
+        parser.add_argument('--offers-per-business', type=int, default=5)
+        parser.add_argument('--orders', type=int, default=150, help="Orders to seed (at most one per offer detail).")
+        parser.add_argument('--reviews', type=int, default=150)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--repeat', type=int, default=30, help="Measured requests per scenario.")
+        parser.add_argument('--warmup', type=int, default=3, help="Unmeasured requests per scenario.")
+        parser.add_argument('--only', action='append', default=[], help="Run scenarios whose name starts with this (repeatable).")
+        parser.add_argument('--list', action='store_true', help="List the scenarios and exit.")
+        parser.add_argument('--output', help="Write the results as JSON to this file.")
+        parser.add_argument('--compare', metavar='BASELINE', help="Diff the results against this JSON file.")
+        parser.add_argument('--current', metavar='RESULTS', help="With --compare: diff this results file instead of running.")
+        parser.add_argument('--threshold', type=float, default=10.0, help="p95 change in percent reported as regression.")
+        parser.add_argument('--fail-on-regression', action='store_true', help="Exit with an error if --compare finds a regression.")
+
+    def handle(self, *args, **options):
+        if options['current']:
+            if not options['compare']:
+                raise CommandError("--current needs --compare.")
+            results = self.load(options['current'])
+        else:
+            results = self.run(options)
+            if results is None:
+                return
+            self.report(results)
+            if options['output']:
+                with open(options['output'], 'w', encoding='utf-8') as file:
+                    json.dump(results, file, indent=2)
+                self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}."))
+
+        if options['compare']:
+            regressions = self.compare(self.load(options['compare']), results, options['threshold'])
+            if regressions and options['fail_on_regression']:
+                raise CommandError(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+
+    def load(self, path):
+        try:
+            with open(path, encoding='utf-8') as file:
+                return json.load(file)
+        except (OSError, ValueError) as exc:
+            raise CommandError(f"Cannot read {path}: {exc}")
+
+    def run(self, options):
+        with transaction.atomic():
+            dataset = seed_dataset(
+                business=options['business'], customers=options['customers'],
+                offers_per_business=options['offers_per_business'], orders=options['orders'],
+                reviews=options['reviews'], seed=options['seed'],
+            )
+            scenarios = [
+                scenario for scenario in build_scenarios(dataset)
+                if not options['only'] or any(scenario.name.startswith(prefix) for prefix in options['only'])
+            ]
+            if options['list']:
+                for scenario in scenarios:
+                    self.stdout.write(f"{scenario.name:<30}{scenario.method.upper():<8}{scenario.path}")
+                transaction.set_rollback(True)
+                return None
+
+            client = APIClient(SERVER_NAME='localhost')
+            self.clear_caches()
+            measured = {}
+            # the slow-request log (login hashes a password) would interleave with the report
+            timing_logger = logging.getLogger('coderr_app.timing')
+            level = timing_logger.level
+            timing_logger.setLevel(logging.ERROR)
+            try:
+                for scenario in scenarios:
+                    repeat = min(options['repeat'], scenario.max_repeat or options['repeat'])
+                    measured[scenario.name] = self.measure(client, dataset, scenario, options['warmup'], repeat)
+            finally:
+                timing_logger.setLevel(level)
+            transaction.set_rollback(True)
+
+        self.clear_caches()
+        return {
+            'meta': {
+                'created_at': timezone.now().isoformat(),
+                'dataset': dataset.summary(),
+                'seed': options['seed'],
+                'repeat': options['repeat'],
+                'warmup': options['warmup'],
+                'database': connection.vendor,
+                'python': platform.python_version(),
+                'django': django.get_version(),
+            },
+            'scenarios': measured,
+        }
+
+    def clear_caches(self):
+        cache.clear()
+        get_offer_list_cache().clear()
+        identity_cache.clear()
+
+    def measure(self, client, dataset, scenario, warmup, repeat):
+        samples, queries, sizes, errors = [], [], [], 0
+        status_code = None
+        for index, target in enumerate(scenario.iterations(warmup + repeat)):
+            method, path, user, data = scenario.request(target, index)
+            if user is None:
+                client.credentials()
+            else:
+                client.credentials(HTTP_AUTHORIZATION=dataset.auth(user))
+            if scenario.cold:
+                self.clear_caches()
+
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = getattr(client, method)(path, data, format='json')
+                # streamed bodies are produced while they are read
+                body = b''.join(response.streaming_content) if response.streaming else response.content
+                elapsed = (time.perf_counter() - started) * 1000
+
+            status_code = response.status_code
+            if status_code != scenario.status:
+                errors += 1
+            if index >= warmup:
+                samples.append(elapsed)
+                queries.append(len(captured.captured_queries))
+                sizes.append(len(body))
+
+        result = summarize(samples, queries, sizes)
+        result.update(method=scenario.method.upper(), path=scenario.path, status=status_code, errors=errors)
+        return result
+
+    def report(self, results):
+        self.stdout.write(f"Dataset: {', '.join(f'{value} {name}' for name, value in results['meta']['dataset'].items())}")
+        self.stdout.write(f"{'scenario':<30}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'queries':>9}{'bytes':>9}{'errors':>8}")
+        for name, result in results['scenarios'].items():
+            line = (
+                f"{name:<30}{result['p50_ms']:>9.2f}{result['p95_ms']:>9.2f}{result['p99_ms']:>9.2f}"
+                f"{result['queries']:>9}{result['bytes']:>9}{result['errors']:>8}"
+            )
+            self.stdout.write(self.style.ERROR(line) if result['errors'] else line)
+
+    def compare(self, baseline, results, threshold):
+        """Print the change per scenario; return the names of the regressed ones."""
+        old, new = baseline['scenarios'], results['scenarios']
+        regressions = []
+        self.stdout.write(f"\nCompared with the baseline from {baseline['meta'].get('created_at', '?')} (threshold {threshold:g}%):")
+        self.stdout.write(f"{'scenario':<30}{'p50':>10}{'p95':>10}{'p99':>10}{'queries':>10}{'bytes':>10}  verdict")
+        for name in new:
+            if name not in old:
+                self.stdout.write(f"{name:<30}{'':>50}  new")
+                continue
+            before, after = old[name], new[name]
+            p95_change = change(before['p95_ms'], after['p95_ms'])
+            more_queries = after['queries'] - before['queries']
+            if p95_change > threshold or more_queries > 0 or after['errors'] > before['errors']:
+                verdict = 'REGRESSION'
+                regressions.append(name)
+            elif p95_change < -threshold or more_queries < 0:
+                verdict = 'improved'
+            else:
+                verdict = ''
+            line = (
+                f"{name:<30}{change(before['p50_ms'], after['p50_ms']):>+9.1f}%{p95_change:>+9.1f}%"
+                f"{change(before['p99_ms'], after['p99_ms']):>+9.1f}%{more_queries:>+10}{after['bytes'] - before['bytes']:>+10}  {verdict}"
+            )
+            if verdict == 'REGRESSION':
+                line = self.style.ERROR(line)
+            elif verdict:
+                line = self.style.SUCCESS(line)
+            self.stdout.write(line)
+        missing = [name for name in old if name not in new]
+        if missing:
+            self.stdout.write(f"Not measured this time: {', '.join(missing)}")
+        return regressions
@@ -0,0 +1,138 @@
+import asyncio
+import statistics
+import time
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from django.urls import include, path
+from rest_framework.authtoken.models import Token
+
+from coderr_app.api.views import BaseInfoViewset, CompletedOrderCountView, OfferDetailsViewSet, OfferViewset, OrderCountView
+from coderr_app.models import Offer, OfferDetails
+from user_auth_app.models import UserProfile
+
+VIEWS = [
+    ('offers', 'offers/', OfferViewset.as_view({'get': 'list'}), '?page_size=6'),
+    ('offer', 'offers/<int:pk>/', OfferViewset.as_view({'get': 'retrieve'}), ''),
+    ('offerdetail', 'offerdetails/<int:pk>/', OfferDetailsViewSet.as_view({'get': 'retrieve'}), ''),
+    ('base-info', 'base-info/', BaseInfoViewset.as_view(), ''),
+    ('order-count', 'order-count/<int:business_user_id>/', OrderCountView.as_view(), ''),
+    ('completed-order-count', 'completed-order-count/<int:business_user_id>/', CompletedOrderCountView.as_view(), ''),
+]
+
+
+def sync_adapter(view):
+    """The same handler behind a plain sync view, i.e. run through the thread adapter like before."""
+    def sync_view(request, *args, **kwargs):
+        return async_to_sync(view)(request, *args, **kwargs)
+    return sync_view
+
+
+class URLConf:
+    """The benchmarked routes first, then the real ones so that serializers can still reverse URLs."""
+
+    def __init__(self, wrap):
+        self.urlpatterns = [path(f'api/{route}', wrap(view)) for _, route, view, _ in VIEWS] + [
+            path('api/', include('coderr_app.api.urls')),
+            path('api/', include('user_auth_app.api.urls')),
+        ]
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive the read endpoints in-process through the ASGI application and compare concurrent "
+        "throughput of the native async views with the same views behind the sync adapter. "
+        "Seeded rows are deleted afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=400, help="Requests per endpoint and concurrency level.")
+        parser.add_argument('--concurrency', default='1,10,50')
+        parser.add_argument('--offers', type=int, default=200)
+
+    def handle(self, *args, **options):
+        business, token = self.seed(options['offers'])
+        try:
+            offer = Offer.objects.filter(user=business).first()
+            paths = {
+                'offers': '/api/offers/', 'offer': f'/api/offers/{offer.pk}/',
+                'offerdetail': f'/api/offerdetails/{OfferDetails.objects.filter(offer=offer).first().pk}/',
+                'base-info': '/api/base-info/', 'order-count': f'/api/order-count/{business.pk}/',
+                'completed-order-count': f'/api/completed-order-count/{business.pk}/',
+            }
+            headers = [(b'host', b'localhost'), (b'authorization', f'Token {token.key}'.encode())]
+            levels = [int(level) for level in options['concurrency'].split(',')]
+
+            self.stdout.write(f"{'endpoint':<24}{'conc':>6}{'sync req/s':>12}{'async req/s':>13}{'sync p95 ms':>13}{'async p95 ms':>14}")
+            for name, _, _, query in VIEWS:
+                for concurrency in levels:
+                    results = {}
+                    for mode, wrap in (('sync', sync_adapter), ('async', lambda view: view)):
+                        with override_settings(ROOT_URLCONF=URLConf(wrap)):
+                            app = get_asgi_application()
+                            results[mode] = asyncio.run(self.run(app, paths[name], query, headers, options['requests'], concurrency))
+                    self.stdout.write(
+                        f"{name:<24}{concurrency:>6}{results['sync'][0]:>12.0f}{results['async'][0]:>13.0f}"
+                        f"{results['sync'][1]:>13.2f}{results['async'][1]:>14.2f}"
+                    )
+        finally:
+            User.objects.filter(pk=business.pk).delete()
+
+    def seed(self, count):
+        business = User.objects.create_user(username='bench_async_business', password='bench')
+        UserProfile.objects.create(user=business, type='business', name='bench', email='bench_async@example.com')
+        for i in range(count):
+            offer = Offer.objects.create(user=business, title=f"Bench offer {i}", description='Bench')
+            OfferDetails.objects.bulk_create([
+                OfferDetails(offer=offer, title=offer_type, revisions=1, delivery_time_in_days=days, price=price, features=['bench'], offer_type=offer_type)
+                for price, days, offer_type in [(100, 7, 'basic'), (200, 5, 'standard'), (300, 3, 'premium')]
+            ])
+        Offer.objects.filter(user=business).refresh_summary()
+        return business, Token.objects.create(user=business)
+
+    async def run(self, app, path, query, headers, total, concurrency):
+        latencies = []
+        remaining = iter(range(total))
+
+        async def worker():
+            for _ in remaining:
+                started = time.perf_counter()
+                status = await self.request(app, path, query, headers)
+                latencies.append((time.perf_counter() - started) * 1000)
+                if status != 200:
+                    raise RuntimeError(f"{path} answered {status}")
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        return total / elapsed, statistics.quantiles(latencies, n=20)[-1]
+
+    async def request(self, app, path, query, headers):
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+            'path': path, 'raw_path': path.encode(), 'query_string': query.lstrip('?').encode(), 'root_path': '',
+            'headers': headers, 'server': ('localhost', 80), 'client': ('127.0.0.1', 50000),
+        }
+        sent_body = False
+        disconnected = asyncio.Event()
+        status = None
+
+        async def receive():
+            nonlocal sent_body
+            if not sent_body:
+                sent_body = True
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            await disconnected.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+
+        await app(scope, receive, send)
+        disconnected.set()
+        return status
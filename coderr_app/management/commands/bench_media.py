@@ -0,0 +1,59 @@
+import os
+import shutil
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory, override_settings
+from django.views.static import serve
+
+from coderr_app.views import serve_media
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the media view with django.views.static.serve on temporary files: full downloads, "
+        "a 64 KiB range and a revalidation. Runs in-process, so sendfile offloading is not measured."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='16384,1048576,16777216', help="Comma-separated file sizes in bytes.")
+        parser.add_argument('--requests', type=int, default=50)
+
+    def handle(self, *args, **options):
+        media_root = tempfile.mkdtemp()
+        try:
+            with override_settings(MEDIA_ROOT=media_root):
+                self.run(media_root, [int(size) for size in options['sizes'].split(',')], options['requests'])
+        finally:
+            shutil.rmtree(media_root)
+
+    def run(self, media_root, sizes, count):
+        factory = RequestFactory()
+        views = [
+            ('static.serve', lambda request, path: serve(request, path, document_root=media_root)),
+            ('serve_media', serve_media),
+        ]
+        self.stdout.write(f"{'size':>10} {'view':<14}{'full MB/s':>12}{'range ms':>12}{'range bytes':>14}{'revalidate ms':>15}")
+        for size in sizes:
+            path = f'bench-{size}.bin'
+            with open(os.path.join(media_root, path), 'wb') as file:
+                file.write(os.urandom(size))
+            for name, view in views:
+                full_seconds, _, etag = self.measure(factory, view, path, count)
+                range_seconds, range_bytes, _ = self.measure(factory, view, path, count, HTTP_RANGE='bytes=0-65535')
+                revalidate_seconds, _, _ = self.measure(factory, view, path, count, HTTP_IF_NONE_MATCH=etag)
+                self.stdout.write(
+                    f"{size:>10} {name:<14}{size * count / full_seconds / 1024 / 1024:>12.1f}"
+                    f"{range_seconds / count * 1000:>12.3f}{range_bytes:>14}{revalidate_seconds / count * 1000:>15.3f}"
+                )
+
+    def measure(self, factory, view, path, count, **headers):
+        transferred = 0
+        started = time.perf_counter()
+        for _ in range(count):
+            response = view(factory.get(f'/media/{path}', **headers), path)
+            content = b''.join(response.streaming_content) if response.streaming else response.content
+            transferred = len(content)
+            response.close()
+        return time.perf_counter() - started, transferred, response.get('ETag', '')
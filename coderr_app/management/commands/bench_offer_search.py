@@ -0,0 +1,91 @@
+import random
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+
+from coderr_app import search
+from coderr_app.models import Offer, OfferDetails
+
+WORDS = [
+    'logo', 'design', 'website', 'landing', 'page', 'shop', 'wordpress', 'django', 'react', 'android',
+    'ios', 'app', 'backend', 'api', 'seo', 'marketing', 'video', 'animation', 'illustration', 'branding',
+    'database', 'migration', 'hosting', 'security', 'audit', 'testing', 'automation', 'script', 'python', 'data',
+]
+SEARCH_TERMS = ['logo', 'desi', 'django api', 'security audit', 'xyz']
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare ?search= via SearchFilter (LIKE) with the FTS5 index on a synthetic catalogue. "
+        "All seeded rows are rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--offers', type=int, default=1_000_000)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        if not search.is_available():
+            raise CommandError("The offer search index requires SQLite with FTS5.")
+
+        with transaction.atomic():
+            self.seed(options['offers'], options['batch_size'], random.Random(options['seed']))
+            started = time.perf_counter()
+            search.rebuild_index()
+            self.stdout.write(f"Built FTS index in {time.perf_counter() - started:.1f}s")
+
+            # FTS also matches detail titles and features, so it can find more rows than LIKE
+            self.stdout.write(f"{'term':<16}{'LIKE rows':>10}{'FTS rows':>10}{'LIKE ms':>12}{'FTS ms':>12}")
+            for term in SEARCH_TERMS:
+                like_count, like_ms = self.measure(lambda: self.like_page(term), options['repeat'])
+                fts_count, fts_ms = self.measure(lambda: self.fts_page(term), options['repeat'])
+                self.stdout.write(f"{term:<16}{like_count:>10}{fts_count:>10}{like_ms:>12.2f}{fts_ms:>12.2f}")
+
+            transaction.set_rollback(True)
+
+    def seed(self, count, batch_size, rng):
+        started = time.perf_counter()
+        user = User.objects.create_user(username='bench_search_business', password='bench')
+        for start in range(0, count, batch_size):
+            size = min(batch_size, count - start)
+            offers = Offer.objects.bulk_create([
+                Offer(
+                    user=user,
+                    title=' '.join(rng.choices(WORDS, k=3)).title(),
+                    description=' '.join(rng.choices(WORDS, k=12)),
+                )
+                for _ in range(size)
+            ])
+            OfferDetails.objects.bulk_create([
+                OfferDetails(offer=offer, title=offer_type.title(), features=rng.choices(WORDS, k=2), offer_type=offer_type)
+                for offer in offers
+                for offer_type in ('basic', 'standard', 'premium')
+            ])
+        self.stdout.write(f"Seeded {count} offers in {time.perf_counter() - started:.1f}s")
+
+    def like_page(self, term):
+        queryset = Offer.objects.all()
+        for word in term.split():
+            queryset = queryset.filter(Q(title__icontains=word) | Q(description__icontains=word))
+        count = queryset.count()
+        list(queryset.order_by('-updated_at')[:6])
+        return count
+
+    def fts_page(self, term):
+        queryset = search.filter_offers(Offer.objects.all(), search.build_match_query([term]))
+        count = queryset.count()
+        list(queryset.order_by('search_rank')[:6])
+        return count
+
+    def measure(self, func, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = func()
+            timings.append((time.perf_counter() - started) * 1000)
+        return result, sorted(timings)[len(timings) // 2]
@@ -0,0 +1,64 @@
+import random
+import resource
+import time
+import tracemalloc
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from coderr_app.api.export import stream_orders
+from coderr_app.models import Offer, OfferDetails, Order
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream a synthetic order history through the order export and report the time, the bytes "
+        "written and the peak memory. All seeded rows are rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=1_000_000)
+        parser.add_argument('--output', choices=['csv', 'ndjson'], default='csv')
+        parser.add_argument('--chunk-size', type=int, default=None)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            business = self.seed(options['orders'], options['batch_size'], random.Random(options['seed']))
+
+            rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            tracemalloc.start()
+            started = time.perf_counter()
+            response = stream_orders(Order.objects.filter(business_user=business), options['output'], options['chunk_size'])
+            written = sum(len(part) for part in response.streaming_content)
+            elapsed = time.perf_counter() - started
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+            self.stdout.write(f"Exported {options['orders']} orders as {options['output']} in {elapsed:.1f}s ({written / 1024 / 1024:.1f} MiB)")
+            self.stdout.write(f"Peak traced Python memory during export: {peak / 1024 / 1024:.1f} MiB")
+            # ru_maxrss is reported in KiB on Linux
+            self.stdout.write(f"Peak RSS: {rss_before / 1024:.1f} MiB before export, {rss_after / 1024:.1f} MiB after")
+
+            transaction.set_rollback(True)
+
+    def seed(self, count, batch_size, rng):
+        started = time.perf_counter()
+        business = User.objects.create_user(username='bench_export_business', password='bench')
+        customer = User.objects.create_user(username='bench_export_customer', password='bench')
+        offer = Offer.objects.create(user=business, title='Bench', description='Bench')
+        detail = OfferDetails.objects.create(offer=offer, title='Basic', revisions=1, delivery_time_in_days=5, price=100, features=['bench'], offer_type='basic')
+        for start in range(0, count, batch_size):
+            Order.objects.bulk_create([
+                Order(
+                    customer_user=customer, business_user=business, offer_detail=detail, title=f"Order {start + i}",
+                    revisions=rng.randint(0, 5), delivery_time_in_days=rng.randint(1, 30), price=rng.randint(10, 5000),
+                    features=['Logo Design', 'Visitenkarte'], offer_type='basic', status=rng.choice(Order.STATUSES),
+                )
+                for i in range(min(batch_size, count - start))
+            ])
+        self.stdout.write(f"Seeded {count} orders in {time.perf_counter() - started:.1f}s")
+        return business
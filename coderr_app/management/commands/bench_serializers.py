@@ -0,0 +1,113 @@
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import override_settings
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+
+from coderr_app.api.views import OfferViewset, OrderViewSet, ReviewViewSet
+from coderr_app.cache import get_offer_list_cache
+from coderr_app.models import Offer, OfferDetails, Order, Review
+from user_auth_app.models import UserProfile
+
+ENDPOINTS = [
+    ('offers', OfferViewset, '/api/offers/'),
+    ('orders', OrderViewSet, '/api/orders/'),
+    ('reviews', ReviewViewSet, '/api/reviews/'),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the per-row cost of the DRF list serializers with the compiled values() serializers, "
+        "serialization alone and end to end. All seeded rows are rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100, help="Offers, orders and reviews to seed (= rows per page).")
+        parser.add_argument('--repeat', type=int, default=30)
+
+    def handle(self, *args, **options):
+        rows, repeat = options['rows'], options['repeat']
+        with transaction.atomic():
+            customer = self.seed(rows)
+
+            self.stdout.write("Serialization only (rows already fetched), µs per row:")
+            self.stdout.write(f"{'endpoint':<10}{'DRF':>10}{'compiled':>10}{'speedup':>9}")
+            for name, viewset, path in ENDPOINTS:
+                drf, compiled = self.serialize_only(viewset, path, customer, rows, repeat)
+                self.stdout.write(f"{name:<10}{drf:>10.1f}{compiled:>10.1f}{drf / compiled:>8.1f}x")
+
+            self.stdout.write(f"\nEnd to end, GET ?page_size={rows} (cursor pages for orders and reviews), µs per row:")
+            self.stdout.write(f"{'endpoint':<10}{'DRF':>10}{'compiled':>10}{'speedup':>9}")
+            client = APIClient(SERVER_NAME='localhost')
+            client.force_authenticate(customer)
+            for name, _, path in ENDPOINTS:
+                params = {'page_size': rows} if name == 'offers' else {'pagination': 'cursor', 'page_size': rows}
+                drf, compiled = (self.end_to_end(client, path, params, rows, repeat, mode) for mode in (False, True))
+                self.stdout.write(f"{name:<10}{drf:>10.1f}{compiled:>10.1f}{drf / compiled:>8.1f}x")
+
+            transaction.set_rollback(True)
+
+    def make_view(self, viewset, path, user):
+        request = APIRequestFactory().get(path, SERVER_NAME='localhost')
+        force_authenticate(request, user)
+        view = viewset(action_map={'get': 'list'}, format_kwarg=None, args=(), kwargs={}, headers={})
+        view.request = view.initialize_request(request)
+        view.request.user  # authenticate outside the timed part
+        return view
+
+    def serialize_only(self, viewset, path, user, rows, repeat):
+        view = self.make_view(viewset, path, user)
+        queryset = view.filter_queryset(view.get_queryset())
+        instances = list(queryset[:rows])
+        compiled = view.get_compiled_serializer()
+        values = list(view.prepare_compiled(compiled, queryset)[:rows])
+        compiled.load_related(values)
+        if compiled.to_representation(values) != view.get_serializer(instances, many=True).data:
+            raise RuntimeError(f"{path}: compiled output differs")
+
+        drf = self.per_row(lambda: view.get_serializer(instances, many=True).data, len(instances), repeat)
+        fast = self.per_row(lambda: compiled.to_representation(values), len(values), repeat)
+        return drf, fast
+
+    def end_to_end(self, client, path, params, rows, repeat, compiled):
+        def request():
+            get_offer_list_cache().clear()
+            response = client.get(path, params)
+            if response.status_code != 200:
+                raise RuntimeError(f"{path} answered {response.status_code}")
+
+        with override_settings(COMPILED_LIST_SERIALIZERS=compiled):
+            return self.per_row(request, rows, repeat)
+
+    def per_row(self, run, rows, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            run()
+            timings.append((time.perf_counter() - started) * 1_000_000 / rows)
+        return statistics.median(timings)
+
+    def seed(self, count):
+        business = User.objects.create_user(username='bench_serializer_business', password='bench', first_name='Bench')
+        UserProfile.objects.create(user=business, type='business', name='bench', email='bench_serializer_business@example.com')
+        customer = User.objects.create_user(username='bench_serializer_customer', password='bench')
+        UserProfile.objects.create(user=customer, type='customer', name='bench', email='bench_serializer_customer@example.com')
+        for i in range(count):
+            offer = Offer.objects.create(user=business, title=f"Bench offer {i}", description='Bench')
+            details = OfferDetails.objects.bulk_create([
+                OfferDetails(offer=offer, title=offer_type, revisions=1, delivery_time_in_days=days, price=price,
+                             features=['Logo Design', 'Visitenkarte'], offer_type=offer_type)
+                for price, days, offer_type in [(100, 7, 'basic'), (200, 5, 'standard'), (300, 3, 'premium')]
+            ])
+            Order.objects.create(
+                customer_user=customer, business_user=business, offer_detail=details[0], title=offer.title, revisions=1,
+                delivery_time_in_days=7, price=100, features=details[0].features, offer_type='basic'
+            )
+            reviewer = User.objects.create_user(username=f'bench_serializer_reviewer_{i}', password='bench')
+            Review.objects.create(business_user=business, reviewer=reviewer, rating=4, description='Bench review')
+        Offer.objects.filter(user=business).refresh_summary()
+        return customer
@@ -0,0 +1,83 @@
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from coderr_app.cache import get_offer_list_cache
+from coderr_app.models import Offer, OfferDetails, Order, Review
+from user_auth_app.models import UserProfile
+
+SCENARIOS = [
+    ('offers', '/api/offers/?page_size=100', 'fields=id,title,min_price,min_delivery_time'),
+    ('orders', '/api/orders/?pagination=cursor&page_size=100', 'fields=id,status,price,updated_at'),
+    ('reviews', '/api/reviews/?pagination=cursor&page_size=100', 'omit=description'),
+    ('business profiles', '/api/profiles/business/?page_size=100', 'fields=user,location'),
+]
+LONG_TEXT = "Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 4
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare payload size, query count and latency of the list endpoints with and without "
+        "?fields= / ?omit=. All seeded rows are rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100, help="Offers, orders, reviews and business profiles to seed.")
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            customer = self.seed(options['rows'])
+            client = APIClient(SERVER_NAME='localhost')
+            client.force_authenticate(customer)
+
+            self.stdout.write(f"{'endpoint':<20}{'variant':<44}{'bytes':>9}{'queries':>9}{'mean ms':>9}{'p95 ms':>9}")
+            for name, url, sparse in SCENARIOS:
+                for variant, path in (('full', url), (sparse, f"{url}&{sparse}")):
+                    size, queries, latencies = self.measure(client, path, options['repeat'])
+                    self.stdout.write(
+                        f"{name:<20}{variant:<44}{size:>9}{queries:>9}"
+                        f"{statistics.mean(latencies):>9.2f}{statistics.quantiles(latencies, n=20)[-1]:>9.2f}"
+                    )
+
+            transaction.set_rollback(True)
+
+    def measure(self, client, path, repeat):
+        latencies = []
+        for _ in range(repeat):
+            get_offer_list_cache().clear()
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = client.get(path)
+                latencies.append((time.perf_counter() - started) * 1000)
+            if response.status_code != 200:
+                raise RuntimeError(f"{path} answered {response.status_code}")
+        return len(response.content), len(captured.captured_queries), latencies
+
+    def seed(self, count):
+        customer = User.objects.create_user(username='bench_sparse_customer', password='bench')
+        UserProfile.objects.create(user=customer, type='customer', name='bench', email='bench_sparse_customer@example.com')
+        for i in range(count):
+            business = User.objects.create_user(username=f'bench_sparse_business_{i}', password='bench', first_name='Bench')
+            UserProfile.objects.create(
+                user=business, type='business', name=f'Bench {i}', location='Berlin', tel='0301234567',
+                description=LONG_TEXT, email=f'bench_sparse_{i}@example.com'
+            )
+            offer = Offer.objects.create(user=business, title=f"Bench offer {i}", description=LONG_TEXT[:255])
+            details = OfferDetails.objects.bulk_create([
+                OfferDetails(offer=offer, title=offer_type, revisions=1, delivery_time_in_days=days, price=price,
+                             features=['Logo Design', 'Visitenkarte', 'Briefpapier'], offer_type=offer_type)
+                for price, days, offer_type in [(100, 7, 'basic'), (200, 5, 'standard'), (300, 3, 'premium')]
+            ])
+            Order.objects.create(
+                customer_user=customer, business_user=business, offer_detail=details[0], title=offer.title, revisions=1,
+                delivery_time_in_days=7, price=100, features=details[0].features, offer_type='basic'
+            )
+            Review.objects.create(business_user=business, reviewer=customer, rating=4, description=LONG_TEXT)
+        Offer.objects.filter(user__username__startswith='bench_sparse_').refresh_summary()
+        return customer
@@ -0,0 +1,78 @@
+import json
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from coderr_app.api.importer import IMPORT_FORMATS, CatalogImporter, detect_format, read_records
+
+
+class Command(BaseCommand):
+    help = (
+        "Import business users with their profiles and offers from a JSONL or CSV file, validated with the "
+        "API's serializer rules and bulk-inserted in batches. Progress is checkpointed after every batch; "
+        "running the command again continues where it stopped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=IMPORT_FORMATS, help="Default: from the file extension.")
+        parser.add_argument('--batch-size', type=int, help="Businesses per transaction (default CATALOG_IMPORT_BATCH_SIZE).")
+        parser.add_argument('--checkpoint', help="Checkpoint file (default: <path>.checkpoint).")
+        parser.add_argument('--restart', action='store_true', help="Ignore an existing checkpoint and start from the top.")
+        parser.add_argument('--errors', help="Append rejected records to this JSONL file instead of printing them.")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        import_format = options['format'] or detect_format(path)
+        if import_format is None:
+            raise CommandError("Cannot tell the format from the file name; pass --format jsonl or --format csv.")
+        checkpoint_path = options['checkpoint'] or f'{path}.checkpoint'
+        checkpoint = self.load_checkpoint(checkpoint_path, path, options['restart'])
+        if checkpoint['position']:
+            self.stdout.write(f"Resuming after record {checkpoint['position']}.")
+
+        importer = CatalogImporter(options['batch_size'])
+        errors_file = open(options['errors'], 'a', encoding='utf-8') if options['errors'] else None
+        try:
+            with open(path, 'rb') as source:
+                for progress in importer.run(read_records(source, import_format, checkpoint['position'])):
+                    for error in progress['errors']:
+                        if errors_file:
+                            errors_file.write(json.dumps(error, ensure_ascii=False) + '\n')
+                        else:
+                            self.stdout.write(self.style.WARNING(f"Record {error['position']} ({error['username']}): {error['errors']}"))
+                    totals = checkpoint['totals']
+                    totals['users'] += progress['users']
+                    totals['offers'] += progress['offers']
+                    totals['rejected'] += len(progress['errors'])
+                    checkpoint['position'] = progress['position']
+                    self.save_checkpoint(checkpoint_path, checkpoint)
+                    self.stdout.write(
+                        f"Up to record {progress['position']}: {progress['users']} users, "
+                        f"{progress['offers']} offers, {len(progress['errors'])} rejected."
+                    )
+        finally:
+            if errors_file:
+                errors_file.close()
+
+        totals = checkpoint['totals']
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {totals['users']} users and {totals['offers']} offers, rejected {totals['rejected']} records."
+        ))
+
+    def load_checkpoint(self, checkpoint_path, path, restart):
+        fresh = {'source': os.path.abspath(path), 'position': 0, 'totals': {'users': 0, 'offers': 0, 'rejected': 0}}
+        if restart or not os.path.exists(checkpoint_path):
+            return fresh
+        with open(checkpoint_path, encoding='utf-8') as file:
+            checkpoint = json.load(file)
+        if checkpoint.get('source') != fresh['source']:
+            raise CommandError(f"{checkpoint_path} belongs to {checkpoint.get('source')}; use --restart or another --checkpoint.")
+        return checkpoint
+
+    def save_checkpoint(self, checkpoint_path, checkpoint):
+        # written next to the target and renamed, so a crash never leaves half a file
+        temporary = f'{checkpoint_path}.tmp'
+        with open(temporary, 'w', encoding='utf-8') as file:
+            json.dump(checkpoint, file)
+        os.replace(temporary, checkpoint_path)
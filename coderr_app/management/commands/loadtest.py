@@ -0,0 +1,479 @@
+import asyncio
+import contextvars
+import json
+import logging
+import multiprocessing
+import random
+import statistics
+import sys
+import time
+from collections import Counter, defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.signals import got_request_exception
+from django.db import DatabaseError, connections, transaction
+from django.db.backends.signals import connection_created
+
+from coderr_app.benchmark import BENCH_PASSWORD, delete_dataset, seed_dataset
+
+PREFIX = 'loadtest'
+LOCKED = 'database is locked'
+DEFAULT_MIX = 'browse=50,login=5,order=20,complete=15,review=10'
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+OFFER_PAGE_SIZE = 12
+
+# database errors raised while the current request was handled
+request_errors = contextvars.ContextVar('loadtest_request_errors', default=None)
+
+
+def note_error(exc):
+    errors = request_errors.get()
+    if errors is not None:
+        errors.append(str(exc))
+
+
+def record_database_errors(execute, sql, params, many, context):
+    try:
+        return execute(sql, params, many, context)
+    except DatabaseError as exc:
+        note_error(exc)
+        raise
+
+
+def watch_connection(sender, connection, **kwargs):
+    connection.execute_wrappers.append(record_database_errors)
+
+
+def watch_uncaught(sender, **kwargs):
+    # errors raised outside a query, e.g. on COMMIT, reach Django's 500 handler
+    exc = sys.exc_info()[1]
+    if exc is not None:
+        note_error(exc)
+
+
+async def asgi_request(app, method, path, headers, body=b''):
+    """One request against the ASGI application, without a server; returns (status, body)."""
+    path, _, query = path.partition('?')
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': method, 'scheme': 'http',
+        'path': path, 'raw_path': path.encode(), 'query_string': query.encode(), 'root_path': '',
+        'headers': headers, 'server': ('localhost', 80), 'client': ('127.0.0.1', 50000),
+    }
+    sent_body = False
+    disconnected = asyncio.Event()
+    status, chunks = None, []
+
+    async def receive():
+        nonlocal sent_body
+        if not sent_body:
+            sent_body = True
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+        await disconnected.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+        elif message['type'] == 'http.response.body':
+            chunks.append(message.get('body', b''))
+
+    await app(scope, receive, send)
+    disconnected.set()
+    return status, b''.join(chunks)
+
+
+class Client:
+    """Sends the journeys' requests and records (start, step, status, ms, error) for each."""
+
+    def __init__(self, app, dataset, started):
+        self.app = app
+        self.dataset = dataset
+        self.started = started
+        self.records = []
+        self.journeys = []
+
+    async def call(self, step, method, path, user=None, data=None, expect=200):
+        headers = [(b'host', b'localhost')]
+        body = b''
+        if data is not None:
+            body = json.dumps(data).encode()
+            headers += [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())]
+        if user is not None:
+            headers.append((b'authorization', self.dataset.auth(user).encode()))
+
+        errors = []
+        token = request_errors.set(errors)
+        begin = time.monotonic()
+        try:
+            status, content = await asgi_request(self.app, method, path, headers, body)
+        finally:
+            request_errors.reset(token)
+        elapsed = (time.monotonic() - begin) * 1000
+
+        error = None
+        if status != expect:
+            error = LOCKED if any(LOCKED in message for message in errors) else f'HTTP {status}'
+        self.records.append((begin - self.started, step, status, elapsed, error))
+        return status, content
+
+
+class Pools:
+    """
+    The rows one worker's journeys use up: offer details nobody ordered yet
+    (an order takes its detail's id), open orders and unreviewed
+    (customer, business) pairs. Each process gets its own slice.
+    """
+
+    def __init__(self, dataset, index, processes):
+        self.dataset = dataset
+        self.offer_ids = list(dataset.offer_ids)
+        self.detail_ids = list(dataset.detail_ids)
+        self.free_details = dataset.free_detail_ids[index::processes]
+        self.open_orders = [
+            (pk, dataset.order_parties[pk][1]) for pk in dataset.order_ids[index::processes]
+            if dataset.order_status[pk] == 'in_progress'
+        ]
+        self.review_pairs = dataset.free_review_pairs[index::processes]
+        self.reviews = [(pk, dataset.review_reviewer[pk]) for pk in dataset.review_ids[index::processes]]
+
+
+def offer_payload(title):
+    return {
+        'title': title, 'description': 'Load test',
+        'details': [
+            {'title': offer_type, 'revisions': 1, 'delivery_time_in_days': days, 'price': price,
+             'features': ['Logo Design'], 'offer_type': offer_type}
+            for offer_type, days, price in [('basic', 7, 100), ('standard', 5, 200), ('premium', 3, 300)]
+        ],
+    }
+
+
+async def browse(client, pools, rng):
+    customer = rng.choice(pools.dataset.customer_ids)
+    pages = max(1, len(pools.offer_ids) // OFFER_PAGE_SIZE)
+    await client.call('browse.offer_list', 'GET', f'/api/offers/?page_size={OFFER_PAGE_SIZE}&page={rng.randint(1, pages)}', customer)
+    await client.call('browse.offer', 'GET', f'/api/offers/{rng.choice(pools.offer_ids)}/', customer)
+    await client.call('browse.offer_detail', 'GET', f'/api/offerdetails/{rng.choice(pools.detail_ids)}/', customer)
+
+
+async def login(client, pools, rng):
+    user = rng.choice(pools.dataset.customer_ids + pools.dataset.business_ids)
+    await client.call('login', 'POST', '/api/login/', data={'username': pools.dataset.usernames[user], 'password': BENCH_PASSWORD})
+
+
+async def publish_offer(client, pools, rng):
+    """When every detail has been ordered, a business user publishes a new offer."""
+    business = rng.choice(pools.dataset.business_ids)
+    status, content = await client.call(
+        'order.publish_offer', 'POST', '/api/offers/', business, offer_payload(f"Load test {rng.getrandbits(32)}"), 201
+    )
+    if status == 201:
+        offer = json.loads(content)
+        pools.offer_ids.append(offer['id'])
+        pools.free_details.extend(detail['id'] for detail in offer['details'])
+
+
+async def place_order(client, pools, rng):
+    if not pools.free_details:
+        await publish_offer(client, pools, rng)
+        if not pools.free_details:
+            return
+    customer = rng.choice(pools.dataset.customer_ids)
+    detail = pools.free_details.pop(rng.randrange(len(pools.free_details)))
+    status, content = await client.call('order.create', 'POST', '/api/orders/', customer, {'offer_detail_id': detail}, 201)
+    if status == 201:
+        order = json.loads(content)
+        pools.open_orders.append((order['id'], order['business_user']))
+
+
+async def complete_order(client, pools, rng):
+    if not pools.open_orders:
+        await place_order(client, pools, rng)
+        if not pools.open_orders:
+            return
+    order, business = pools.open_orders.pop(rng.randrange(len(pools.open_orders)))
+    await client.call('complete.order_list', 'GET', '/api/orders/?pagination=cursor&page_size=20', business)
+    await client.call('complete.update', 'PATCH', f'/api/orders/{order}/', business, {'status': 'completed'})
+
+
+async def review(client, pools, rng):
+    if pools.review_pairs:
+        customer, business = pools.review_pairs.pop(rng.randrange(len(pools.review_pairs)))
+        await client.call('review.list', 'GET', f'/api/reviews/?business_user_id={business}', customer)
+        status, content = await client.call(
+            'review.create', 'POST', '/api/reviews/', customer,
+            {'business_user': business, 'rating': rng.choice([3, 4, 5]), 'description': 'Load test'}, 201
+        )
+        if status == 201:
+            pools.reviews.append((json.loads(content)['id'], customer))
+    elif pools.reviews:
+        pk, reviewer = rng.choice(pools.reviews)
+        await client.call('review.update', 'PATCH', f'/api/reviews/{pk}/', reviewer, {'rating': rng.choice([3, 4, 5])})
+
+
+JOURNEYS = {
+    'browse': browse,
+    'login': login,
+    'order': place_order,
+    'complete': complete_order,
+    'review': review,
+}
+
+
+def parse_mix(value):
+    mix = {}
+    for item in value.split(','):
+        name, _, weight = item.partition('=')
+        name = name.strip()
+        if name not in JOURNEYS:
+            raise CommandError(f"Unknown journey {name!r}; choose from {', '.join(JOURNEYS)}.")
+        try:
+            mix[name] = float(weight or 1)
+        except ValueError:
+            raise CommandError(f"Invalid weight for {name!r}: {weight!r}")
+    if not any(mix.values()):
+        raise CommandError("The journey mix needs at least one positive weight.")
+    return mix
+
+
+async def virtual_user(client, pools, mix, rng, start, deadline, think_time):
+    names, weights = list(mix), list(mix.values())
+    await asyncio.sleep(max(0.0, start - time.monotonic()))
+    while time.monotonic() < deadline:
+        name = rng.choices(names, weights)[0]
+        begin = time.monotonic()
+        await JOURNEYS[name](client, pools, rng)
+        client.journeys.append((name, (time.monotonic() - begin) * 1000))
+        if think_time:
+            await asyncio.sleep(rng.expovariate(1000 / think_time))
+
+
+async def drive(application, dataset, index, processes, options, started):
+    pools = Pools(dataset, index, processes)
+    client = Client(application, dataset, started)
+    mix = options['mix']
+    concurrency, ramp_up = options['concurrency'], options['ramp_up']
+    deadline = started + options['duration']
+    await asyncio.gather(*(
+        virtual_user(client, pools, mix, random.Random(f"{options['seed']}-{index}-{user}"),
+                     started + ramp_up * user / concurrency, deadline, options['think_time'])
+        for user in range(concurrency)
+    ))
+    return client.records, client.journeys
+
+
+def run_worker(dataset, index, processes, options, started):
+    # importing the application sets Django up, which configures logging
+    from coderr_backend.asgi import application
+
+    connection_created.connect(watch_connection)
+    got_request_exception.connect(watch_uncaught)
+    # failed requests are counted and latency is reported; a traceback per 500
+    # or a line per slow request would drown the report
+    loggers = [logging.getLogger('django.request'), logging.getLogger('coderr_app.timing')]
+    levels = [logger.level for logger in loggers]
+    for logger in loggers:
+        logger.setLevel(logging.CRITICAL)
+    try:
+        return asyncio.run(drive(application, dataset, index, processes, options, started))
+    finally:
+        for logger, level in zip(loggers, levels):
+            logger.setLevel(level)
+        connection_created.disconnect(watch_connection)
+        got_request_exception.disconnect(watch_uncaught)
+        connections.close_all()
+
+
+def worker_process(dataset, index, processes, options, started, pipe):
+    pipe.send(run_worker(dataset, index, processes, options, started))
+    pipe.close()
+
+
+def percentiles(samples):
+    if len(samples) == 1:
+        return samples * 3
+    quantiles = statistics.quantiles(samples, n=100, method='inclusive')
+    return quantiles[49], quantiles[94], quantiles[98]
+
+
+def histogram(samples):
+    counts = Counter()
+    for sample in samples:
+        counts[next((str(bound) for bound in LATENCY_BUCKETS_MS if sample <= bound), 'inf')] += 1
+    return {label: counts[label] for label in [*map(str, LATENCY_BUCKETS_MS), 'inf']}
+
+
+def latency_summary(samples):
+    p50, p95, p99 = percentiles(samples)
+    return {'p50_ms': round(p50, 3), 'p95_ms': round(p95, 3), 'p99_ms': round(p99, 3), 'max_ms': round(max(samples), 3)}
+
+
+def summarize(records, journeys, elapsed, interval):
+    errors = Counter(error for *_, error in records if error)
+    journey_samples = defaultdict(list)
+    for name, latency in journeys:
+        journey_samples[name].append(latency)
+    steps = defaultdict(list)
+    for _, step, _, latency, error in records:
+        steps[step].append((latency, error))
+    timeline = defaultdict(list)
+    for offset, _, _, latency, error in records:
+        timeline[int(max(offset, 0) // interval)].append((latency, error))
+
+    return {
+        'requests': len(records),
+        'throughput_rps': round(len(records) / elapsed, 1),
+        'journeys': len(journeys),
+        'journeys_per_second': round(len(journeys) / elapsed, 1),
+        'errors': dict(errors),
+        'error_rate': round(sum(errors.values()) / len(records), 5) if records else 0,
+        'steps': {
+            step: {
+                'requests': len(samples),
+                'rps': round(len(samples) / elapsed, 1),
+                'errors': sum(1 for _, error in samples if error),
+                'locked': sum(1 for _, error in samples if error == LOCKED),
+                **latency_summary([latency for latency, _ in samples]),
+            }
+            for step, samples in sorted(steps.items())
+        },
+        'journey_latency': {
+            name: {'count': len(samples), **latency_summary(samples)}
+            for name, samples in sorted(journey_samples.items())
+        },
+        'timeline': [
+            {
+                't': bucket * interval,
+                'requests': len(samples),
+                'rps': round(len(samples) / interval, 1),
+                'errors': sum(1 for _, error in samples if error),
+                'locked': sum(1 for _, error in samples if error == LOCKED),
+                **latency_summary([latency for latency, _ in samples]),
+                'histogram': histogram([latency for latency, _ in samples]),
+            }
+            for bucket, samples in sorted(timeline.items())
+        ],
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test the ASGI application from coderr_backend/asgi.py in-process, without a network: "
+        "virtual users run a weighted mix of journeys (browse offers, log in, place an order, complete it, "
+        "review) for --duration seconds. Reports throughput, error rates (including 'database is locked') "
+        "and latency percentiles and histograms per time interval. --processes N runs N workers against the "
+        "same database, like a multi-worker deployment. Seeded data is committed and deleted afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=20, help="Virtual users per process.")
+        parser.add_argument('--processes', type=int, default=1, help="Worker processes, each with --concurrency users.")
+        parser.add_argument('--duration', type=float, default=30, help="Seconds to run.")
+        parser.add_argument('--ramp-up', type=float, default=0, help="Seconds over which the virtual users start.")
+        parser.add_argument('--think-time', type=float, default=0, help="Mean pause between journeys in ms.")
+        parser.add_argument('--mix', default=DEFAULT_MIX, help=f"Journey weights (default {DEFAULT_MIX}).")
+        parser.add_argument('--interval', type=float, default=1, help="Seconds per timeline row.")
+        parser.add_argument('--business', type=int, default=50)
+        parser.add_argument('--customers', type=int, default=200)
+        parser.add_argument('--offers-per-business', type=int, default=10)
+        parser.add_argument('--orders', type=int, default=300)
+        parser.add_argument('--reviews', type=int, default=300)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', help="Write the results as JSON to this file.")
+
+    def handle(self, *args, **options):
+        options['mix'] = parse_mix(options['mix'])
+        if options['concurrency'] < 1 or options['processes'] < 1 or options['duration'] <= 0 or options['interval'] <= 0:
+            raise CommandError("--concurrency, --processes, --duration and --interval must be positive.")
+
+        delete_dataset(PREFIX)
+        with transaction.atomic():
+            dataset = seed_dataset(
+                business=options['business'], customers=options['customers'],
+                offers_per_business=options['offers_per_business'], orders=options['orders'],
+                reviews=options['reviews'], seed=options['seed'], prefix=PREFIX,
+            )
+        try:
+            records, journeys, elapsed = self.run(dataset, options)
+        finally:
+            delete_dataset(PREFIX)
+
+        results = summarize(records, journeys, elapsed, options['interval'])
+        results['meta'] = {
+            'concurrency': options['concurrency'], 'processes': options['processes'], 'duration': options['duration'],
+            'mix': options['mix'], 'dataset': dataset.summary(),
+        }
+        self.report(results, options)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(results, file, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}."))
+
+    def run(self, dataset, options):
+        processes = options['processes']
+        if processes == 1:
+            started = time.monotonic()
+            records, journeys = run_worker(dataset, 0, 1, options, started)
+            return records, journeys, time.monotonic() - started
+
+        # children open their own connections; CLOCK_MONOTONIC is shared, so offsets line up
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        started = time.monotonic() + 0.5
+        workers = []
+        for index in range(processes):
+            receiver, sender = context.Pipe(duplex=False)
+            process = context.Process(target=worker_process, args=(dataset, index, processes, options, started, sender))
+            process.start()
+            workers.append((process, receiver))
+        records, journeys = [], []
+        for process, receiver in workers:
+            try:
+                worker_records, worker_journeys = receiver.recv()
+            except EOFError:
+                raise CommandError(f"Worker process {process.pid} died (exit code {process.join() or process.exitcode}).")
+            records.extend(worker_records)
+            journeys.extend(worker_journeys)
+            process.join()
+        return records, journeys, time.monotonic() - started
+
+    def report(self, results, options):
+        meta = results['meta']
+        self.stdout.write(
+            f"{meta['processes']} process(es) x {meta['concurrency']} virtual users, {meta['duration']:g} s, "
+            f"mix {', '.join(f'{name}={weight:g}' for name, weight in meta['mix'].items())}"
+        )
+        self.stdout.write(
+            f"Throughput: {results['throughput_rps']} req/s, {results['journeys_per_second']} journeys/s, "
+            f"{results['requests']} requests"
+        )
+        errors = ', '.join(f"{kind}: {count}" for kind, count in sorted(results['errors'].items())) or 'none'
+        line = f"Errors: {sum(results['errors'].values())} ({results['error_rate']:.2%}) - {errors}"
+        self.stdout.write(self.style.ERROR(line) if results['errors'] else line)
+
+        self.stdout.write(f"\n{'step':<24}{'requests':>9}{'req/s':>8}{'errors':>8}{'locked':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+        for step, row in results['steps'].items():
+            self.stdout.write(
+                f"{step:<24}{row['requests']:>9}{row['rps']:>8.1f}{row['errors']:>8}{row['locked']:>8}"
+                f"{row['p50_ms']:>9.2f}{row['p95_ms']:>9.2f}{row['p99_ms']:>9.2f}{row['max_ms']:>9.1f}"
+            )
+
+        self.stdout.write(f"\n{'journey':<24}{'count':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+        for name, row in results['journey_latency'].items():
+            self.stdout.write(
+                f"{name:<24}{row['count']:>9}{row['p50_ms']:>9.2f}{row['p95_ms']:>9.2f}{row['p99_ms']:>9.2f}{row['max_ms']:>9.1f}"
+            )
+
+        labels = [f"<={bound}" for bound in LATENCY_BUCKETS_MS] + ['>5000']
+        self.stdout.write(f"\nOver time ({options['interval']:g} s rows); histogram columns are latency buckets in ms")
+        self.stdout.write(
+            f"{'t s':>6}{'req/s':>8}{'errors':>8}{'locked':>8}{'p50':>8}{'p95':>8}{'p99':>8}  "
+            + ''.join(f"{label:>7}" for label in labels)
+        )
+        for row in results['timeline']:
+            self.stdout.write(
+                f"{row['t']:>6g}{row['rps']:>8.0f}{row['errors']:>8}{row['locked']:>8}"
+                f"{row['p50_ms']:>8.1f}{row['p95_ms']:>8.1f}{row['p99_ms']:>8.1f}  "
+                + ''.join(f"{count:>7}" for count in row['histogram'].values())
+            )
@@ -0,0 +1,68 @@
+import hashlib
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from coderr_app.models import Offer
+from coderr_app.storage import BLOB_DIR, ContentAddressedStorage, blob_name
+from user_auth_app.models import UserProfile
+
+FILE_FIELDS = [(Offer, 'image'), (UserProfile, 'file')]
+
+
+class Command(BaseCommand):
+    help = (
+        "Move media files stored under their upload names into the content-addressed store, "
+        "point the rows at the shared blobs and report the bytes saved by deduplication."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Only hash the files and report, change nothing.")
+
+    def handle(self, *args, **options):
+        if not isinstance(default_storage, ContentAddressedStorage):
+            raise CommandError("The default storage is not coderr_app.storage.ContentAddressedStorage.")
+
+        legacy_sizes = {}
+        blob_sizes = {}
+        migrated = 0
+        with transaction.atomic():
+            for model, field_name in FILE_FIELDS:
+                rows = (
+                    model.objects.exclude(**{f'{field_name}__isnull': True})
+                    .exclude(**{field_name: ''})
+                    .exclude(**{f'{field_name}__startswith': f'{BLOB_DIR}/'})
+                    .values_list('pk', field_name)
+                )
+                for pk, name in rows.iterator():
+                    if not default_storage.exists(name):
+                        self.stdout.write(self.style.WARNING(f"{model.__name__} {pk}: {name} is missing, skipped."))
+                        continue
+                    with default_storage.open(name) as content:
+                        if options['dry_run']:
+                            new_name = blob_name(self.digest(content), name)
+                        else:
+                            new_name = default_storage.store(content, name)
+                    if not options['dry_run']:
+                        model.objects.filter(pk=pk).update(**{field_name: new_name})
+                    legacy_sizes.setdefault(name, default_storage.size(name))
+                    blob_sizes[new_name] = legacy_sizes[name]
+                    migrated += 1
+
+            if not options['dry_run']:
+                # the old files are only removed once every row points at its blob
+                for name in legacy_sizes:
+                    transaction.on_commit(lambda name=name: default_storage.delete(name))
+
+        legacy_bytes = sum(legacy_sizes.values())
+        blob_bytes = sum(blob_sizes.values())
+        prefix = "Would migrate" if options['dry_run'] else "Migrated"
+        self.stdout.write(f"{prefix} {migrated} references: {len(legacy_sizes)} files ({legacy_bytes} bytes) -> {len(blob_sizes)} blobs ({blob_bytes} bytes).")
+        self.stdout.write(self.style.SUCCESS(f"Bytes saved: {legacy_bytes - blob_bytes}"))
+
+    def digest(self, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        return digest.hexdigest()
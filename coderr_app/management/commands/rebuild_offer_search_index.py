@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from coderr_app import search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the FTS5 full-text index used by the offer search."
+
+    def handle(self, *args, **options):
+        if not search.is_available():
+            raise CommandError("The offer search index requires SQLite with FTS5.")
+        with transaction.atomic():
+            indexed = search.rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} offers."))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from coderr_app.models import Offer
+
+
+class Command(BaseCommand):
+    help = "Recompute min_price, min_delivery_time and detail_count for every offer."
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            updated = Offer.objects.all().refresh_summary()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt summary for {updated} offers."))
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from coderr_app.models import BusinessRatingStats
+
+
+class Command(BaseCommand):
+    help = "Recompute the per-business rating stats from the Review table and report any drift."
+
+    FIELDS = ['review_count', 'rating_sum'] + [f'rating_{bucket}' for bucket in BusinessRatingStats.BUCKETS]
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Only report drift, do not fix it.")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            stored = {stats.business_user_id: stats for stats in BusinessRatingStats.objects.select_for_update()}
+            expected = BusinessRatingStats.compute()
+            empty = dict.fromkeys(self.FIELDS, 0)
+
+            drifted = {}
+            for user_id in sorted(stored.keys() | expected.keys()):
+                stats = stored.get(user_id)
+                actual = expected.get(user_id, empty)
+                current = {field: getattr(stats, field) for field in self.FIELDS} if stats else empty
+                drift = {
+                    field: (current[field], value)
+                    for field, value in actual.items()
+                    if abs(current[field] - value) > 1e-9
+                }
+                if drift:
+                    drifted[user_id] = actual
+                    for field, (value_stored, value) in drift.items():
+                        self.stdout.write(self.style.WARNING(
+                            f"business user {user_id} {field}: stored {value_stored}, actual {value} (drift {value_stored - value:+})"
+                        ))
+
+            if not drifted:
+                self.stdout.write(self.style.SUCCESS("No drift."))
+                return
+            if options['dry_run']:
+                return
+
+            for user_id, values in drifted.items():
+                if user_id in stored:
+                    BusinessRatingStats.objects.filter(business_user_id=user_id).update(**values)
+                else:
+                    BusinessRatingStats.objects.create(business_user_id=user_id, **values)
+            self.stdout.write(self.style.SUCCESS(f"Stats of {len(drifted)} business user(s) reconciled."))
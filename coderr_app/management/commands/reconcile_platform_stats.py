@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from coderr_app.models import PlatformStats
+
+
+class Command(BaseCommand):
+    help = "Recompute the base-info platform stats from scratch and report any drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Only report drift, do not fix it.")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            stats = PlatformStats.objects.select_for_update().filter(pk=PlatformStats.SINGLETON_ID).first()
+            expected = PlatformStats.compute()
+            if stats is None:
+                self.stdout.write(self.style.WARNING("Stats row missing."))
+                if not options['dry_run']:
+                    PlatformStats.objects.create(pk=PlatformStats.SINGLETON_ID, **expected)
+                    PlatformStats.invalidate()
+                return
+
+            drift = {
+                field: (getattr(stats, field), value)
+                for field, value in expected.items()
+                if abs(getattr(stats, field) - value) > 1e-9
+            }
+            if not drift:
+                self.stdout.write(self.style.SUCCESS("No drift."))
+                return
+
+            for field, (stored, value) in drift.items():
+                self.stdout.write(self.style.WARNING(f"{field}: stored {stored}, actual {value} (drift {stored - value:+})"))
+            if not options['dry_run']:
+                PlatformStats.objects.filter(pk=stats.pk).update(**expected)
+                PlatformStats.invalidate()
+                self.stdout.write(self.style.SUCCESS("Stats reconciled."))
@@ -0,0 +1,342 @@
+"""
+Request and domain metrics shared by all worker processes.
+
+Every process owns one block of the memory-mapped ``METRICS_FILE`` and is
+the only writer of its block, so increments need no cross-process locking;
+``render()`` reads all blocks and sums the series, which is what ``/metrics``
+serves in the Prometheus text format. A block records its owner's pid. A
+new process takes over the block of a process that has exited, including
+its values, so counters never go backwards when a worker is replaced.
+
+A block is a directory of fixed-size entries: a JSON key ``[name, labels]``
+and a float64 value. The entry count is written after the entry, so readers
+only see complete entries. A file with another layout (a different
+``METRICS_MAX_PROCESSES``, say) is only started over once none of its
+owners is running any more: truncating a file that live processes have
+mapped would kill them with SIGBUS. Until then metrics stay off.
+"""
+import bisect
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+
+from django.conf import settings
+from django.db import transaction
+
+try:
+    import fcntl
+except ImportError:  # Windows: one process, nothing to coordinate
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'CODERRM1'
+HEADER_FORMAT = '8sqq'
+ENTRY_SIZE = 256
+KEY_SIZE = ENTRY_SIZE - 8
+BLOCK_ENTRIES = 2048
+BLOCK_SIZE = ENTRY_SIZE * (BLOCK_ENTRIES + 1)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REQUESTS = 'coderr_http_requests_total'
+REQUEST_DURATION = 'coderr_http_request_duration_seconds'
+QUERIES = 'coderr_db_queries_total'
+OFFERS_CREATED = 'coderr_offers_created_total'
+ORDERS_CREATED = 'coderr_orders_created_total'
+REVIEWS_CREATED = 'coderr_reviews_created_total'
+
+FAMILIES = {
+    REQUESTS: ('counter', "Requests by view/action, method and status."),
+    REQUEST_DURATION: ('histogram', "Request duration in seconds by view/action."),
+    QUERIES: ('counter', "Database queries by view/action."),
+    OFFERS_CREATED: ('counter', "Offers created (single, bulk and import)."),
+    ORDERS_CREATED: ('counter', "Orders created."),
+    REVIEWS_CREATED: ('counter', "Reviews created."),
+}
+
+
+class MetricsFileInUse(Exception):
+    """The file has another layout and processes that still write to it."""
+
+
+def process_alive(pid):
+    if os.name == 'nt':
+        # os.kill() would terminate it; blocks of exited processes are not reused there
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class MetricsFile:
+    """The shared file: a header entry followed by ``processes`` blocks."""
+
+    def __init__(self, path, processes):
+        self.path = path
+        self.processes = processes
+        size = ENTRY_SIZE + processes * BLOCK_SIZE
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        header = struct.pack(HEADER_FORMAT, MAGIC, BLOCK_ENTRIES, processes)
+        owners = []
+        with self.locked():
+            os.lseek(self.fd, 0, os.SEEK_SET)
+            existing = os.read(self.fd, len(header))
+            if existing != header:
+                owners = self.live_owners(existing)
+            if existing != header and not owners:
+                # new file or another layout: start over (the file is sparse until written)
+                os.ftruncate(self.fd, 0)
+                os.ftruncate(self.fd, size)
+                os.lseek(self.fd, 0, os.SEEK_SET)
+                os.write(self.fd, header)
+        if owners:
+            os.close(self.fd)
+            raise MetricsFileInUse(f"{path} has another layout and is in use by pids {owners}")
+        self.map = mmap.mmap(self.fd, size)
+
+    def locked(self):
+        return FileLock(self.fd)
+
+    def live_owners(self, header):
+        """Pids of other running processes that own a block under the layout ``header`` describes."""
+        if len(header) != struct.calcsize(HEADER_FORMAT):
+            return []
+        magic, entries, processes = struct.unpack(HEADER_FORMAT, header)
+        if magic != MAGIC:
+            return []
+        owners = []
+        for index in range(processes):
+            os.lseek(self.fd, ENTRY_SIZE + index * ENTRY_SIZE * (entries + 1), os.SEEK_SET)
+            owner = os.read(self.fd, 8)
+            pid = struct.unpack('q', owner)[0] if len(owner) == 8 else 0
+            if pid and pid != os.getpid() and process_alive(pid):
+                owners.append(pid)
+        return owners
+
+    def block_offset(self, index):
+        return ENTRY_SIZE + index * BLOCK_SIZE
+
+    def claim_block(self):
+        """Index of a block for this process: a fresh one or one whose owner has exited."""
+        pid = os.getpid()
+        with self.locked():
+            owners = [struct.unpack_from('q', self.map, self.block_offset(index))[0] for index in range(self.processes)]
+            candidates = [index for index, owner in enumerate(owners) if owner == pid]
+            candidates += [index for index, owner in enumerate(owners) if owner and owner != pid and not process_alive(owner)]
+            candidates += [index for index, owner in enumerate(owners) if not owner]
+            if not candidates:
+                return None
+            index = candidates[0]
+            struct.pack_into('q', self.map, self.block_offset(index), pid)
+            return index
+
+    def entries(self, index):
+        """``(key, value, offset)`` of every entry written to a block."""
+        start = self.block_offset(index)
+        count = struct.unpack_from('q', self.map, start + 8)[0]
+        for position in range(1, count + 1):
+            offset = start + position * ENTRY_SIZE
+            key = bytes(self.map[offset:offset + KEY_SIZE]).rstrip(b'\0').decode()
+            yield key, struct.unpack_from('d', self.map, offset + KEY_SIZE)[0], offset + KEY_SIZE
+
+    def totals(self):
+        totals = {}
+        for index in range(self.processes):
+            for key, value, _ in self.entries(index):
+                totals[key] = totals.get(key, 0.0) + value
+        return totals
+
+
+class FileLock:
+    def __init__(self, fd):
+        self.fd = fd
+
+    def __enter__(self):
+        if fcntl is not None:
+            fcntl.flock(self.fd, fcntl.LOCK_EX)
+
+    def __exit__(self, *exc_info):
+        if fcntl is not None:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+
+
+class MetricsRegistry:
+    """This process's writer; series are ``(name, labels)`` with labels as a tuple of pairs."""
+
+    def __init__(self, path, processes):
+        self.file = MetricsFile(path, processes)
+        self.lock = threading.Lock()
+        self.block = None
+        self.offsets = {}
+
+    def claim(self):
+        self.block = self.file.claim_block()
+        if self.block is None:
+            return
+        # a block taken over from an exited process keeps its series
+        for key, _, offset in self.file.entries(self.block):
+            name, labels = json.loads(key)
+            self.offsets[(name, tuple(map(tuple, labels)))] = offset
+
+    def offset(self, name, labels):
+        offset = self.offsets.get((name, labels))
+        if offset is not None:
+            return offset
+        start = self.file.block_offset(self.block)
+        count = struct.unpack_from('q', self.file.map, start + 8)[0]
+        key = json.dumps([name, labels], separators=(',', ':')).encode()
+        if count >= BLOCK_ENTRIES or len(key) > KEY_SIZE:
+            return None
+        entry = start + (count + 1) * ENTRY_SIZE
+        self.file.map[entry:entry + KEY_SIZE] = key.ljust(KEY_SIZE, b'\0')
+        struct.pack_into('d', self.file.map, entry + KEY_SIZE, 0.0)
+        struct.pack_into('q', self.file.map, start + 8, count + 1)
+        self.offsets[(name, labels)] = offset = entry + KEY_SIZE
+        return offset
+
+    def inc(self, name, amount=1, labels=()):
+        with self.lock:
+            if self.block is None:
+                self.claim()
+                if self.block is None:
+                    return
+            offset = self.offset(name, labels)
+            if offset is not None:
+                value = struct.unpack_from('d', self.file.map, offset)[0]
+                struct.pack_into('d', self.file.map, offset, value + amount)
+
+    def observe(self, name, value, labels=(), buckets=DURATION_BUCKETS):
+        # buckets are stored per interval and made cumulative by render()
+        index = bisect.bisect_left(buckets, value)
+        le = str(buckets[index]) if index < len(buckets) else '+Inf'
+        self.inc(f'{name}_bucket', labels=labels + (('le', le),))
+        self.inc(f'{name}_sum', value, labels)
+        self.inc(f'{name}_count', 1, labels)
+
+
+_registry = None
+_registry_lock = threading.Lock()
+_unavailable = set()
+
+
+def get_registry():
+    """This process's registry for ``METRICS_FILE``, or None if metrics are off."""
+    global _registry
+    path = settings.METRICS_FILE
+    if not path:
+        return None
+    registry = _registry
+    if registry is None or registry.file.path != path:
+        with _registry_lock:
+            if (path, settings.METRICS_MAX_PROCESSES) in _unavailable:
+                return None
+            if _registry is None or _registry.file.path != path:
+                try:
+                    _registry = MetricsRegistry(path, settings.METRICS_MAX_PROCESSES)
+                except MetricsFileInUse as error:
+                    logger.error("Metrics are off in this process: %s", error)
+                    _unavailable.add((path, settings.METRICS_MAX_PROCESSES))
+                    return None
+            registry = _registry
+    return registry
+
+
+def _forget_registry():
+    # a forked worker must claim its own block
+    global _registry
+    _registry = None
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_forget_registry)
+
+
+def inc(name, amount=1, **labels):
+    registry = get_registry()
+    if registry is not None:
+        registry.inc(name, amount, tuple(labels.items()))
+
+
+def inc_on_commit(name, amount=1, **labels):
+    """Count once the surrounding transaction commits; rolled-back writes are not counted."""
+    transaction.on_commit(lambda: inc(name, amount, **labels))
+
+
+def observe_request(view, method, status, duration, queries):
+    registry = get_registry()
+    if registry is None:
+        return
+    view = view or 'unmatched'
+    registry.inc(REQUESTS, labels=(('view', view), ('method', method), ('status', str(status))))
+    registry.observe(REQUEST_DURATION, duration, labels=(('view', view),))
+    if queries:
+        registry.inc(QUERIES, queries, labels=(('view', view),))
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (
+        (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in labels
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+def format_value(value):
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+def render():
+    """All series of all processes in the Prometheus text exposition format."""
+    registry = get_registry()
+    if registry is None:
+        return ''
+    samples = {}
+    for key, value in registry.file.totals().items():
+        name, labels = json.loads(key)
+        family = next((family for family in FAMILIES if name == family or name.startswith(f'{family}_')), name)
+        samples.setdefault(family, []).append((name, [tuple(label) for label in labels], value))
+
+    lines = []
+    for family, series in sorted(samples.items()):
+        kind, help_text = FAMILIES.get(family, ('untyped', ''))
+        lines += [f'# HELP {family} {help_text}', f'# TYPE {family} {kind}']
+        if kind == 'histogram':
+            lines += render_histogram(family, series)
+        else:
+            lines += [f'{name}{format_labels(labels)} {format_value(value)}' for name, labels, value in sorted(series)]
+    return '\n'.join(lines) + '\n' if lines else ''
+
+
+def render_histogram(family, series):
+    buckets, sums, counts = {}, {}, {}
+    for name, labels, value in series:
+        if name == f'{family}_bucket':
+            le = dict(labels)['le']
+            base = tuple(label for label in labels if label[0] != 'le')
+            buckets.setdefault(base, {})[le] = value
+        elif name == f'{family}_sum':
+            sums[tuple(labels)] = value
+        elif name == f'{family}_count':
+            counts[tuple(labels)] = value
+
+    lines = []
+    for labels in sorted(counts):
+        observed = buckets.get(labels, {})
+        cumulative = 0.0
+        for bound in DURATION_BUCKETS:
+            cumulative += observed.get(str(bound), 0.0)
+            lines.append(f'{family}_bucket{format_labels(labels + (("le", str(bound)),))} {format_value(cumulative)}')
+        lines.append(f'{family}_bucket{format_labels(labels + (("le", "+Inf"),))} {format_value(counts[labels])}')
+        lines.append(f'{family}_sum{format_labels(labels)} {format_value(sums.get(labels, 0.0))}')
+        lines.append(f'{family}_count{format_labels(labels)} {format_value(counts[labels])}')
+    return lines
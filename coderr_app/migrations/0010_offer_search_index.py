@@ -0,0 +1,38 @@
+from django.db import migrations
+
+
+FTS_TABLE = 'coderr_app_offer_fts'
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+        "title, description, details, "
+        "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+    )
+    schema_editor.execute(
+        f"INSERT INTO {FTS_TABLE} (rowid, title, description, details) "
+        "SELECT o.id, o.title, o.description, "
+        "(SELECT group_concat(coalesce(d.title, '') || ' ' || coalesce(d.features, ''), ' ') "
+        "FROM coderr_app_offerdetails d WHERE d.offer_id = o.id) "
+        "FROM coderr_app_offer o"
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coderr_app', '0009_offer_detail_count_offer_min_delivery_time_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.1.5 on 2026-10-18 02:19
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def populate_platform_stats(apps, schema_editor):
+    PlatformStats = apps.get_model('coderr_app', 'PlatformStats')
+    Review = apps.get_model('coderr_app', 'Review')
+    Offer = apps.get_model('coderr_app', 'Offer')
+    UserProfile = apps.get_model('user_auth_app', 'UserProfile')
+    reviews = Review.objects.aggregate(review_count=Count('id'), rating_sum=Sum('rating'))
+    PlatformStats.objects.create(
+        pk=1,
+        review_count=reviews['review_count'],
+        rating_sum=reviews['rating_sum'] or 0,
+        business_profile_count=UserProfile.objects.filter(type='business').count(),
+        offer_count=Offer.objects.count(),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coderr_app', '0010_offer_search_index'),
+        ('user_auth_app', '0005_alter_userprofile_description_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlatformStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('review_count', models.IntegerField(default=0)),
+                ('rating_sum', models.FloatField(default=0)),
+                ('business_profile_count', models.IntegerField(default=0)),
+                ('offer_count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(populate_platform_stats, migrations.RunPython.noop),
+    ]
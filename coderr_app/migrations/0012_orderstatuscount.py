@@ -0,0 +1,37 @@
+# Generated by Django 5.1.5 on 2026-10-18 02:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def populate_order_status_counts(apps, schema_editor):
+    Order = apps.get_model('coderr_app', 'Order')
+    OrderStatusCount = apps.get_model('coderr_app', 'OrderStatusCount')
+    rows = Order.objects.order_by().values('business_user_id', 'status').annotate(count=Count('id'))
+    OrderStatusCount.objects.bulk_create([OrderStatusCount(**row) for row in rows])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coderr_app', '0011_platformstats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderStatusCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(max_length=20)),
+                ('count', models.IntegerField(default=0)),
+                ('business_user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='order_status_counts', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('business_user', 'status'), name='unique_order_status_count')],
+            },
+        ),
+        migrations.RunPython(populate_order_status_counts, migrations.RunPython.noop),
+    ]
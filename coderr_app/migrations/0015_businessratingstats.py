@@ -0,0 +1,45 @@
+# Generated by Django 5.1.5 on 2026-10-18 02:55
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def populate_business_rating_stats(apps, schema_editor):
+    Review = apps.get_model('coderr_app', 'Review')
+    BusinessRatingStats = apps.get_model('coderr_app', 'BusinessRatingStats')
+    buckets = {
+        'rating_1': Count('id', filter=Q(rating__lt=1.5)),
+        'rating_2': Count('id', filter=Q(rating__gte=1.5, rating__lt=2.5)),
+        'rating_3': Count('id', filter=Q(rating__gte=2.5, rating__lt=3.5)),
+        'rating_4': Count('id', filter=Q(rating__gte=3.5, rating__lt=4.5)),
+        'rating_5': Count('id', filter=Q(rating__gte=4.5)),
+    }
+    rows = Review.objects.order_by().values('business_user_id').annotate(review_count=Count('id'), rating_sum=Sum('rating'), **buckets)
+    BusinessRatingStats.objects.bulk_create([BusinessRatingStats(**row) for row in rows])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('coderr_app', '0014_mediablob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BusinessRatingStats',
+            fields=[
+                ('business_user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rating_stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('review_count', models.IntegerField(default=0)),
+                ('rating_sum', models.FloatField(default=0)),
+                ('rating_1', models.IntegerField(default=0)),
+                ('rating_2', models.IntegerField(default=0)),
+                ('rating_3', models.IntegerField(default=0)),
+                ('rating_4', models.IntegerField(default=0)),
+                ('rating_5', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(populate_business_rating_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.5 on 2026-10-18 04:03
+
+import time
+
+from django.db import migrations, models
+
+
+def create_version(apps, schema_editor):
+    CatalogueVersion = apps.get_model('coderr_app', 'CatalogueVersion')
+    CatalogueVersion.objects.get_or_create(pk=1, defaults={'version': time.time_ns()})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coderr_app', '0015_businessratingstats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogueVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.BigIntegerField()),
+            ],
+        ),
+        migrations.RunPython(create_version, migrations.RunPython.noop),
+    ]
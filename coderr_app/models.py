@@ -1,19 +1,54 @@
-from django.db import models
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, F, Min, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import User
 
+from .storage import AtomicFileSaveMixin
+
+
+class OfferQuerySet(models.QuerySet):
+
+    def refresh_summary(self):
+        """Recompute min_price, min_delivery_time and detail_count from OfferDetails in one UPDATE."""
+        details = OfferDetails.objects.filter(offer=OuterRef('pk')).order_by().values('offer')
+        return self.update(
+            min_price=Subquery(details.annotate(value=Min('price')).values('value')),
+            min_delivery_time=Subquery(details.annotate(value=Min('delivery_time_in_days')).values('value')),
+            detail_count=Coalesce(Subquery(details.annotate(value=Count('id')).values('value')), Value(0)),
+        )
 
 
+class Offer(AtomicFileSaveMixin, models.Model):
+    SUMMARY_FIELDS = ['min_price', 'min_delivery_time', 'detail_count']
 
-class Offer(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     title = models.CharField(max_length=255, default="Untitled Offer")  
     image = models.FileField(upload_to='uploads/', null=True, blank=True)    
     description = models.TextField(max_length=255, default="No description provided")  
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    min_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, db_index=True)
+    min_delivery_time = models.IntegerField(null=True, blank=True, db_index=True)
+    detail_count = models.IntegerField(default=0, db_index=True)
+
+    objects = OfferQuerySet.as_manager()
 
     class Meta:
         ordering = ["-updated_at"]
+        indexes = [
+            models.Index(fields=['-updated_at', '-id'], name='offer_updated_idx'),
+            models.Index(fields=['user', '-updated_at'], name='offer_user_updated_idx'),
+        ]
+
+    def refresh_summary(self):
+        """Update the stored detail summary and reload it onto this instance."""
+        if Offer.objects.filter(pk=self.pk).refresh_summary():
+            self.refresh_from_db(fields=self.SUMMARY_FIELDS)
 
 
 class OfferDetails(models.Model):
@@ -25,8 +60,15 @@ class OfferDetails(models.Model):
     features = models.JSONField(default=list)
     offer_type = models.CharField(max_length=50, null=True, blank=True, default="basic")  
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['offer', 'offer_type'], name='offerdetails_offer_type_idx'),
+        ]
+
 
 class Order(models.Model):
+    STATUSES = ['in_progress', 'completed', 'cancelled']
+
     customer_user = models.ForeignKey(User, related_name='orders_as_customer', on_delete=models.CASCADE)
     business_user = models.ForeignKey(User, related_name='orders_as_business', on_delete=models.CASCADE)
     offer_detail = models.ForeignKey('OfferDetails', on_delete=models.CASCADE)
@@ -41,6 +83,13 @@ class Order(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['business_user', 'status'], name='order_business_status_idx'),
+            models.Index(fields=['customer_user', '-created_at'], name='order_customer_created_idx'),
+            models.Index(fields=['business_user', '-created_at'], name='order_business_created_idx'),
+        ]
+
 
 class Review(models.Model):
     business_user = models.ForeignKey(User, related_name='reviews_received', on_delete=models.CASCADE)
@@ -50,5 +99,264 @@ class Review(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now_add=True)
 
-    
-    
\ No newline at end of file
+    class Meta:
+        indexes = [
+            models.Index(fields=['business_user', 'reviewer'], name='review_business_reviewer_idx'),
+            models.Index(fields=['-updated_at'], name='review_updated_idx'),
+            models.Index(fields=['rating'], name='review_rating_idx'),
+        ]
+
+
+class PlatformStats(models.Model):
+    """Single row of running totals behind the base-info endpoint."""
+    SINGLETON_ID = 1
+    CACHE_KEY = 'coderr_app:platform_stats'
+
+    review_count = models.IntegerField(default=0)
+    rating_sum = models.FloatField(default=0)
+    business_profile_count = models.IntegerField(default=0)
+    offer_count = models.IntegerField(default=0)
+
+    @property
+    def average_rating(self):
+        return self.rating_sum / self.review_count if self.review_count else None
+
+    @classmethod
+    def compute(cls):
+        """Count everything from scratch."""
+        from user_auth_app.models import UserProfile
+
+        reviews = Review.objects.aggregate(review_count=Count('id'), rating_sum=Sum('rating'))
+        return {
+            'review_count': reviews['review_count'],
+            'rating_sum': reviews['rating_sum'] or 0,
+            'business_profile_count': UserProfile.objects.filter(type='business').count(),
+            'offer_count': Offer.objects.count(),
+        }
+
+    @classmethod
+    def load(cls):
+        stats = cls.objects.filter(pk=cls.SINGLETON_ID).first()
+        if stats is None:
+            stats, _ = cls.objects.get_or_create(pk=cls.SINGLETON_ID, defaults=cls.compute())
+        return stats
+
+    @classmethod
+    def cached(cls):
+        """Return the stats from the cache, reading the row by primary key on a miss."""
+        stats = cache.get(cls.CACHE_KEY)
+        if stats is None:
+            stats = cls.load()
+            cache.set(cls.CACHE_KEY, stats, settings.PLATFORM_STATS_CACHE_TIMEOUT)
+        return stats
+
+    @classmethod
+    async def aload(cls):
+        stats = await cls.objects.filter(pk=cls.SINGLETON_ID).afirst()
+        if stats is None:
+            stats = await sync_to_async(cls.load)()
+        return stats
+
+    @classmethod
+    async def acached(cls):
+        """Async counterpart of cached()."""
+        stats = await cache.aget(cls.CACHE_KEY)
+        if stats is None:
+            stats = await cls.aload()
+            await cache.aset(cls.CACHE_KEY, stats, settings.PLATFORM_STATS_CACHE_TIMEOUT)
+        return stats
+
+    @classmethod
+    def apply(cls, **deltas):
+        """Atomically add the given deltas to the running totals."""
+        updated = cls.objects.filter(pk=cls.SINGLETON_ID).update(
+            **{field: F(field) + delta for field, delta in deltas.items()}
+        )
+        if not updated:
+            cls.load()
+        cls.invalidate()
+
+    @classmethod
+    def invalidate(cls):
+        cache.delete(cls.CACHE_KEY)
+        transaction.on_commit(lambda: cache.delete(cls.CACHE_KEY))
+
+
+class CatalogueVersion(models.Model):
+    """
+    Version of the public offer catalogue; part of every offer list cache key.
+    A database row, so a bump on one worker process is seen by all of them.
+    """
+    SINGLETON_ID = 1
+
+    version = models.BigIntegerField()
+
+    @classmethod
+    def current(cls):
+        version = cls.objects.filter(pk=cls.SINGLETON_ID).values_list('version', flat=True).first()
+        if version is None:
+            version = cls.create().version
+        return version
+
+    @classmethod
+    async def acurrent(cls):
+        version = await cls.objects.filter(pk=cls.SINGLETON_ID).values_list('version', flat=True).afirst()
+        if version is None:
+            version = (await sync_to_async(cls.create)()).version
+        return version
+
+    @classmethod
+    def create(cls):
+        # a time-based start never re-addresses cache entries written before the row existed
+        return cls.objects.get_or_create(pk=cls.SINGLETON_ID, defaults={'version': time.time_ns()})[0]
+
+    @classmethod
+    def bump(cls):
+        if not cls.objects.filter(pk=cls.SINGLETON_ID).update(version=F('version') + 1):
+            cls.create()
+
+
+class OrderStatusCount(models.Model):
+    """Number of orders per business user and status, maintained on every order write."""
+    business_user = models.ForeignKey(User, related_name='order_status_counts', on_delete=models.CASCADE)
+    status = models.CharField(max_length=20)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['business_user', 'status'], name='unique_order_status_count'),
+        ]
+
+    @classmethod
+    def apply(cls, business_user_id, status, delta):
+        counters = cls.objects.filter(business_user_id=business_user_id, status=status)
+        if counters.update(count=F('count') + delta):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(business_user_id=business_user_id, status=status, count=delta)
+        except IntegrityError:
+            counters.update(count=F('count') + delta)
+
+    @classmethod
+    def for_business_users(cls, business_user_ids):
+        """Return ``{business_user_id: {status: count}}`` with every status filled in."""
+        rows = cls.objects.filter(business_user_id__in=business_user_ids).values_list('business_user_id', 'status', 'count')
+        return cls.group_counts(business_user_ids, rows)
+
+    @classmethod
+    async def afor_business_users(cls, business_user_ids):
+        rows = cls.objects.filter(business_user_id__in=business_user_ids).values_list('business_user_id', 'status', 'count')
+        return cls.group_counts(business_user_ids, [row async for row in rows])
+
+    @staticmethod
+    def group_counts(business_user_ids, rows):
+        counts = {user_id: dict.fromkeys(Order.STATUSES, 0) for user_id in business_user_ids}
+        for user_id, status, count in rows:
+            counts[user_id][status] = count
+        return counts
+
+
+def rating_bucket(rating):
+    """Histogram bucket 1–5 of a rating: the nearest whole star, halves rounded up."""
+    for bucket in range(1, 5):
+        if rating < bucket + 0.5:
+            return bucket
+    return 5
+
+
+class BusinessRatingStats(models.Model):
+    """Review count, rating sum and 1–5 star histogram per business user, maintained on every review write."""
+    BUCKETS = range(1, 6)
+
+    business_user = models.OneToOneField(User, primary_key=True, related_name='rating_stats', on_delete=models.CASCADE)
+    review_count = models.IntegerField(default=0)
+    rating_sum = models.FloatField(default=0)
+    rating_1 = models.IntegerField(default=0)
+    rating_2 = models.IntegerField(default=0)
+    rating_3 = models.IntegerField(default=0)
+    rating_4 = models.IntegerField(default=0)
+    rating_5 = models.IntegerField(default=0)
+
+    @property
+    def average_rating(self):
+        return self.rating_sum / self.review_count if self.review_count else None
+
+    def summary(self):
+        average = self.average_rating
+        return {
+            "review_count": self.review_count,
+            "average_rating": round(average, 1) if average is not None else None,
+            "histogram": {str(bucket): getattr(self, f'rating_{bucket}') for bucket in self.BUCKETS},
+        }
+
+    @classmethod
+    def for_user(cls, user):
+        """The user's stats as loaded with ``select_related('rating_stats')``, or empty ones."""
+        try:
+            return user.rating_stats
+        except cls.DoesNotExist:
+            return cls(business_user_id=user.pk)
+
+    @staticmethod
+    def deltas(rating, sign=1):
+        return {'review_count': sign, 'rating_sum': sign * rating, f'rating_{rating_bucket(rating)}': sign}
+
+    @staticmethod
+    def bucket_filter(bucket):
+        """The rating range that rating_bucket() maps to ``bucket``."""
+        lookup = {}
+        if bucket > 1:
+            lookup['rating__gte'] = bucket - 0.5
+        if bucket < 5:
+            lookup['rating__lt'] = bucket + 0.5
+        return models.Q(**lookup)
+
+    @classmethod
+    def compute(cls, business_user_ids=None):
+        """Count everything from the reviews: ``{business_user_id: {field: value}}``."""
+        buckets = {f'rating_{bucket}': Count('id', filter=cls.bucket_filter(bucket)) for bucket in cls.BUCKETS}
+        reviews = Review.objects.order_by()
+        if business_user_ids is not None:
+            reviews = reviews.filter(business_user_id__in=business_user_ids)
+        rows = reviews.values('business_user_id').annotate(review_count=Count('id'), rating_sum=Sum('rating'), **buckets)
+        return {row.pop('business_user_id'): row for row in rows}
+
+    @classmethod
+    def apply(cls, business_user_id, **deltas):
+        """Atomically add the given deltas to the user's totals, creating the row on first use."""
+        stats = cls.objects.filter(business_user_id=business_user_id)
+        changes = {field: F(field) + delta for field, delta in deltas.items()}
+        if stats.update(**changes):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(business_user_id=business_user_id, **deltas)
+        except IntegrityError:
+            stats.update(**changes)
+
+
+class MediaBlob(models.Model):
+    """A content-addressed media file and the number of rows referencing it (see coderr_app.storage)."""
+    name = models.CharField(max_length=255, unique=True)
+    size = models.BigIntegerField()
+    ref_count = models.IntegerField(default=0)
+
+    @classmethod
+    def acquire(cls, name, size):
+        blobs = cls.objects.filter(name=name)
+        if blobs.update(ref_count=F('ref_count') + 1):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(name=name, size=size, ref_count=1)
+        except IntegrityError:
+            blobs.update(ref_count=F('ref_count') + 1)
+
+    @classmethod
+    def release(cls, name):
+        """Drop one reference. Returns True if it was the last one and the row is gone."""
+        blobs = cls.objects.filter(name=name)
+        blobs.update(ref_count=F('ref_count') - 1)
+        deleted, _ = blobs.filter(ref_count__lte=0).delete()
+        return deleted > 0
@@ -0,0 +1,92 @@
+"""
+Full-text search over offers backed by an SQLite FTS5 table.
+
+The index holds one row per offer (``rowid`` = offer id) with the offer
+title, the description and the concatenated detail titles and features.
+On other database backends ``is_available()`` is False and callers fall
+back to plain ``LIKE`` search.
+"""
+import re
+
+from django.db import connection
+
+from .models import Offer, OfferDetails
+
+FTS_TABLE = 'coderr_app_offer_fts'
+COLUMN_WEIGHTS = (10.0, 4.0, 1.0)
+CHUNK_SIZE = 500
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def is_available():
+    return connection.vendor == 'sqlite'
+
+
+def _select_documents(where):
+    offer_table = Offer._meta.db_table
+    details_table = OfferDetails._meta.db_table
+    return (
+        f"SELECT o.id, o.title, o.description, "
+        f"(SELECT group_concat(coalesce(d.title, '') || ' ' || coalesce(d.features, ''), ' ') "
+        f"FROM {details_table} d WHERE d.offer_id = o.id) "
+        f"FROM {offer_table} o {where}"
+    )
+
+
+def index_offers(offer_ids):
+    """(Re)index the given offers; ids of deleted offers are simply dropped."""
+    if not is_available():
+        return
+    offer_ids = list(offer_ids)
+    with connection.cursor() as cursor:
+        for start in range(0, len(offer_ids), CHUNK_SIZE):
+            chunk = offer_ids[start:start + CHUNK_SIZE]
+            placeholders = ', '.join(['%s'] * len(chunk))
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})", chunk)
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, title, description, details) "
+                + _select_documents(f"WHERE o.id IN ({placeholders})"),
+                chunk
+            )
+
+
+def remove_offers(offer_ids):
+    if not is_available():
+        return
+    offer_ids = list(offer_ids)
+    with connection.cursor() as cursor:
+        for start in range(0, len(offer_ids), CHUNK_SIZE):
+            chunk = offer_ids[start:start + CHUNK_SIZE]
+            placeholders = ', '.join(['%s'] * len(chunk))
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})", chunk)
+
+
+def rebuild_index():
+    """Drop every indexed document and index all offers again. Returns the number of offers indexed."""
+    if not is_available():
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        cursor.execute(f"INSERT INTO {FTS_TABLE} (rowid, title, description, details) " + _select_documents(""))
+        cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+        cursor.execute(f"SELECT count(*) FROM {FTS_TABLE}")
+        return cursor.fetchone()[0]
+
+
+def build_match_query(terms):
+    """Turn user input into an FTS5 query: every word must match as a prefix."""
+    tokens = [token for term in terms for token in TOKEN_RE.findall(term)]
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def filter_offers(queryset, match_query):
+    """Restrict an Offer queryset to FTS matches and annotate it with ``search_rank`` (lower is better)."""
+    offer_table = Offer._meta.db_table
+    weights = ', '.join(str(weight) for weight in COLUMN_WEIGHTS)
+    return queryset.extra(
+        select={'search_rank': f"bm25({FTS_TABLE}, {weights})"},
+        tables=[FTS_TABLE],
+        where=[f"{FTS_TABLE}.rowid = {offer_table}.id", f"{FTS_TABLE} MATCH %s"],
+        params=[match_query],
+    )
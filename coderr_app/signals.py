@@ -0,0 +1,156 @@
+from collections import Counter
+
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
+from django.dispatch import receiver
+
+from user_auth_app.models import UserProfile
+
+from . import metrics, search, storage
+from .cache import bump_catalogue_version
+from .models import BusinessRatingStats, Offer, OfferDetails, Order, OrderStatusCount, PlatformStats, Review
+
+
+@receiver(post_save, sender=OfferDetails)
+@receiver(post_delete, sender=OfferDetails)
+def refresh_offer_summary(sender, instance, **kwargs):
+    """Keep the denormalized detail summary on the parent offer in sync."""
+    if OfferDetails.offer.is_cached(instance):
+        instance.offer.refresh_summary()
+    else:
+        Offer.objects.filter(pk=instance.offer_id).refresh_summary()
+
+
+@receiver(post_save, sender=Offer)
+def index_offer(sender, instance, **kwargs):
+    search.index_offers([instance.pk])
+
+
+@receiver(post_save, sender=Offer)
+@receiver(post_delete, sender=Offer)
+@receiver(post_save, sender=OfferDetails)
+@receiver(post_delete, sender=OfferDetails)
+def invalidate_offer_list(sender, instance, **kwargs):
+    bump_catalogue_version()
+
+
+@receiver(post_save, sender=OfferDetails)
+@receiver(post_delete, sender=OfferDetails)
+def index_offer_details(sender, instance, **kwargs):
+    search.index_offers([instance.offer_id])
+
+
+@receiver(post_delete, sender=Offer)
+def remove_offer_from_index(sender, instance, **kwargs):
+    search.remove_offers([instance.pk])
+
+
+@receiver(pre_save, sender=Review)
+def remember_previous_rating(sender, instance, **kwargs):
+    instance._previous_rating = instance._previous_business_user_id = None
+    if instance.pk:
+        previous = Review.objects.filter(pk=instance.pk).values_list('rating', 'business_user_id').first()
+        if previous:
+            instance._previous_rating, instance._previous_business_user_id = previous
+
+
+@receiver(post_save, sender=Review)
+def count_review(sender, instance, created, **kwargs):
+    if created:
+        metrics.inc_on_commit(metrics.REVIEWS_CREATED)
+        PlatformStats.apply(review_count=1, rating_sum=instance.rating)
+        BusinessRatingStats.apply(instance.business_user_id, **BusinessRatingStats.deltas(instance.rating))
+        return
+    previous_rating, previous_user_id = instance._previous_rating, instance._previous_business_user_id
+    if previous_rating is None or (previous_rating, previous_user_id) == (instance.rating, instance.business_user_id):
+        return
+    PlatformStats.apply(rating_sum=instance.rating - previous_rating)
+    if previous_user_id != instance.business_user_id:
+        BusinessRatingStats.apply(previous_user_id, **BusinessRatingStats.deltas(previous_rating, -1))
+        BusinessRatingStats.apply(instance.business_user_id, **BusinessRatingStats.deltas(instance.rating))
+        return
+    deltas = Counter(BusinessRatingStats.deltas(instance.rating))
+    deltas.update(BusinessRatingStats.deltas(previous_rating, -1))
+    BusinessRatingStats.apply(instance.business_user_id, **{field: delta for field, delta in deltas.items() if delta})
+
+
+@receiver(post_delete, sender=Review)
+def uncount_review(sender, instance, **kwargs):
+    PlatformStats.apply(review_count=-1, rating_sum=-instance.rating)
+    BusinessRatingStats.apply(instance.business_user_id, **BusinessRatingStats.deltas(instance.rating, -1))
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def invalidate_offer_list_ratings(sender, instance, **kwargs):
+    """Offer list pages may embed the business user's rating stats (``?include_rating=true``)."""
+    bump_catalogue_version()
+
+
+@receiver(post_save, sender=Offer)
+def count_offer(sender, instance, created, **kwargs):
+    if created:
+        metrics.inc_on_commit(metrics.OFFERS_CREATED)
+        PlatformStats.apply(offer_count=1)
+
+
+@receiver(post_delete, sender=Offer)
+def uncount_offer(sender, instance, **kwargs):
+    PlatformStats.apply(offer_count=-1)
+
+
+@receiver(pre_save, sender=UserProfile)
+def remember_previous_type(sender, instance, **kwargs):
+    instance._previous_type = None
+    if instance.pk:
+        instance._previous_type = UserProfile.objects.filter(pk=instance.pk).values_list('type', flat=True).first()
+
+
+@receiver(post_save, sender=UserProfile)
+def count_business_profile(sender, instance, created, **kwargs):
+    was_business = not created and instance._previous_type == 'business'
+    is_business = instance.type == 'business'
+    if was_business != is_business:
+        PlatformStats.apply(business_profile_count=1 if is_business else -1)
+
+
+@receiver(post_delete, sender=UserProfile)
+def uncount_business_profile(sender, instance, **kwargs):
+    if instance.type == 'business':
+        PlatformStats.apply(business_profile_count=-1)
+
+
+@receiver(pre_save, sender=Order)
+def remember_previous_status(sender, instance, **kwargs):
+    instance._previous_status = None
+    if instance.pk and not instance._state.adding:
+        instance._previous_status = Order.objects.filter(pk=instance.pk).values_list('status', flat=True).first()
+
+
+@receiver(post_save, sender=Order)
+def count_order(sender, instance, created, **kwargs):
+    if created:
+        metrics.inc_on_commit(metrics.ORDERS_CREATED)
+        OrderStatusCount.apply(instance.business_user_id, instance.status, 1)
+    elif instance._previous_status is not None and instance._previous_status != instance.status:
+        OrderStatusCount.apply(instance.business_user_id, instance._previous_status, -1)
+        OrderStatusCount.apply(instance.business_user_id, instance.status, 1)
+
+
+@receiver(post_delete, sender=Order)
+def uncount_order(sender, instance, **kwargs):
+    OrderStatusCount.apply(instance.business_user_id, instance.status, -1)
+
+
+@receiver(post_init, sender=Offer)
+def remember_offer_image(sender, instance, **kwargs):
+    storage.remember_files(instance, ['image'])
+
+
+@receiver(post_save, sender=Offer)
+def release_replaced_offer_image(sender, instance, **kwargs):
+    storage.release_replaced_files(instance, ['image'])
+
+
+@receiver(post_delete, sender=Offer)
+def release_offer_image(sender, instance, **kwargs):
+    storage.release_files(instance, ['image'])
@@ -0,0 +1,159 @@
+"""
+Content-addressed media storage.
+
+Every upload is streamed to a temporary file in chunks while it is hashed
+and then stored once as ``blobs/<aa>/<sha256><ext>``. Identical uploads
+share that file; ``MediaBlob`` counts the rows referencing it, and the file
+is removed when the last reference is released.
+
+Rows keep references through their file fields. The ``remember_files`` /
+``release_replaced_files`` / ``release_files`` helpers are hooked up to
+post_init, post_save and post_delete of the models with file fields. The
+reference is acquired while the file field is saved (pre_save), so these
+models save through ``AtomicFileSaveMixin``: a row write that fails takes
+the reference with it.
+"""
+import hashlib
+import os
+import re
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+
+BLOB_DIR = 'blobs'
+EXTENSION_RE = re.compile(r'^\.[a-z0-9]{1,10}$')
+
+_UNKNOWN = object()
+
+
+def is_blob_name(name):
+    return bool(name) and name.startswith(f'{BLOB_DIR}/')
+
+
+def blob_name(digest, original_name=''):
+    extension = os.path.splitext(original_name)[1].lower()
+    if not EXTENSION_RE.match(extension):
+        extension = ''
+    return f'{BLOB_DIR}/{digest[:2]}/{digest}{extension}'
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    FileSystemStorage that stores each distinct content once under its
+    SHA-256 and reference-counts it. ``delete()`` releases one reference and
+    only removes the file once nothing refers to it any more.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # the final name depends on the content and is chosen in _save
+        return name
+
+    def _save(self, name, content):
+        from .models import MediaBlob
+
+        digest, size, temp_path = self._write_temp(content)
+        name = blob_name(digest, name)
+        path = self.path(name)
+        if os.path.exists(path):
+            os.remove(temp_path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(temp_path, path)
+            if self.file_permissions_mode is not None:
+                os.chmod(path, self.file_permissions_mode)
+        MediaBlob.acquire(name, size)
+        return name
+
+    def store(self, content, original_name=''):
+        """Store ``content`` without going through a file field; returns the blob name."""
+        return self._save(original_name, content)
+
+    def _write_temp(self, content):
+        """Stream ``content`` in chunks into a temp file next to the blobs while hashing it."""
+        temp_dir = self.path(f'{BLOB_DIR}/tmp')
+        os.makedirs(temp_dir, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        handle, temp_path = tempfile.mkstemp(dir=temp_dir)
+        try:
+            with os.fdopen(handle, 'wb') as temp_file:
+                for chunk in content.chunks():
+                    if isinstance(chunk, str):
+                        chunk = chunk.encode('utf-8')
+                    digest.update(chunk)
+                    temp_file.write(chunk)
+                    size += len(chunk)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        return digest.hexdigest(), size, temp_path
+
+    def delete(self, name):
+        from .models import MediaBlob
+
+        if not is_blob_name(name):
+            return super().delete(name)
+        if MediaBlob.release(name):
+            transaction.on_commit(lambda: self.remove_unreferenced(name))
+
+    def remove_unreferenced(self, name):
+        """Remove the file unless a reference to it was acquired again in the meantime."""
+        from .models import MediaBlob
+
+        if not MediaBlob.objects.filter(name=name).exists():
+            super().delete(name)
+
+
+class AtomicFileSaveMixin:
+    """
+    Model mixin: the row and the blob references its file fields acquire are
+    written in one transaction. If the save fails, new blob files that
+    nothing refers to any more are removed.
+    """
+
+    def save(self, *args, **kwargs):
+        try:
+            with transaction.atomic(using=kwargs.get('using'), savepoint=False):
+                super().save(*args, **kwargs)
+        except BaseException:
+            self._discard_unsaved_files(kwargs.get('using'))
+            raise
+
+    def _discard_unsaved_files(self, using):
+        for field_name, previous in getattr(self, '_stored_files', {}).items():
+            name = _stored_name(self, field_name)
+            storage = self._meta.get_field(field_name).storage
+            if name != previous and is_blob_name(name) and isinstance(storage, ContentAddressedStorage):
+                transaction.on_commit(lambda storage=storage, name=name: storage.remove_unreferenced(name), using=using)
+
+
+def _stored_name(instance, field_name):
+    # read the raw attribute so deferred fields are never loaded here
+    value = instance.__dict__.get(field_name, _UNKNOWN)
+    return getattr(value, 'name', value)
+
+
+def _release(instance, field_name, name):
+    storage = instance._meta.get_field(field_name).storage
+    if name is not _UNKNOWN and is_blob_name(name) and isinstance(storage, ContentAddressedStorage):
+        storage.delete(name)
+
+
+def remember_files(instance, field_names):
+    instance._stored_files = {name: _stored_name(instance, name) for name in field_names}
+
+
+def release_replaced_files(instance, field_names):
+    """Release the files a save has replaced or cleared."""
+    stored = getattr(instance, '_stored_files', {})
+    for field_name in field_names:
+        previous = stored.get(field_name, _UNKNOWN)
+        if previous != _stored_name(instance, field_name):
+            _release(instance, field_name, previous)
+    remember_files(instance, field_names)
+
+
+def release_files(instance, field_names):
+    for field_name in field_names:
+        _release(instance, field_name, _stored_name(instance, field_name))
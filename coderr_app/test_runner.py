@@ -0,0 +1,21 @@
+import os
+import shutil
+import tempfile
+
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class CoderrTestRunner(DiscoverRunner):
+    """Runs the tests against a metrics file of their own, never the one of a server on this checkout."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.metrics_directory = tempfile.mkdtemp(prefix='coderr-test-metrics-')
+        self.metrics_file = override_settings(METRICS_FILE=os.path.join(self.metrics_directory, 'metrics.mmap'))
+        self.metrics_file.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.metrics_file.disable()
+        shutil.rmtree(self.metrics_directory, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
@@ -1,3 +1,1847 @@
-from django.test import TestCase
+import asyncio
+import csv
+import hashlib
+import json
+import multiprocessing
+import os
+import re
+import shutil
+import struct
+import tempfile
+import threading
+import time
+import tracemalloc
+from io import StringIO
+from unittest.mock import patch
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import IntegrityError, OperationalError, connection, connections, transaction
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.http import http_date
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from coderr_app import metrics
+from coderr_app.api.pagination import KeysetPagination
+from coderr_app.api.views import BaseInfoViewset, CompletedOrderCountView, OfferDetailsViewSet, OfferViewset, OrderCountView
+from coderr_app.cache import BoundedLRUCache, get_offer_list_cache
+from coderr_app.models import BusinessRatingStats, CatalogueVersion, MediaBlob, Offer, OfferDetails, Order, OrderStatusCount, PlatformStats, Review
+from coderr_app.storage import blob_name
+from user_auth_app.api.authentication import identity_cache
+from user_auth_app.models import UserProfile
+
+
+class CoderrTestCase(TestCase):
+    """Clears the process-local caches, which the per-test rollback does not reset."""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        get_offer_list_cache().clear()
+        identity_cache.clear()
+
+
+def create_business_user(username):
+    user = User.objects.create_user(username=username, password='secret123')
+    UserProfile.objects.create(user=user, type='business', name=username, email=f"{username}@example.com")
+    return user
+
+
+def create_customer_user(username):
+    user = User.objects.create_user(username=username, password='secret123')
+    UserProfile.objects.create(user=user, type='customer', name=username, email=f"{username}@example.com")
+    return user
+
+
+def create_offer(user, title="Offer"):
+    offer = Offer.objects.create(user=user, title=title, description="Description")
+    for price, days, offer_type in [(100, 7, 'basic'), (200, 5, 'standard'), (300, 3, 'premium')]:
+        OfferDetails.objects.create(
+            offer=offer, title=offer_type, revisions=1, delivery_time_in_days=days,
+            price=price, features=['feature'], offer_type=offer_type
+        )
+    return offer
+
+
+class OfferListQueryCountTests(CoderrTestCase):
+    """The offer list and retrieve endpoints must not issue per-row queries."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.business_users = [create_business_user(f"business{i}") for i in range(5)]
+        cls.offers = [create_offer(cls.business_users[i % 5], f"Offer {i}") for i in range(100)]
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+
+    def assert_list_queries(self, page_size):
+        # catalogue version, COUNT for pagination, the page itself with the user join, the details prefetch
+        with self.assertNumQueries(4):
+            response = self.client.get('/api/offers/', {'page_size': page_size})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), page_size)
+        return response
+
+    def test_list_page_size_1(self):
+        self.assert_list_queries(1)
+
+    def test_list_page_size_6(self):
+        self.assert_list_queries(6)
+
+    def test_list_page_size_100(self):
+        self.assert_list_queries(100)
+
+    def test_list_uses_annotated_values(self):
+        response = self.assert_list_queries(6)
+        result = response.data['results'][0]
+        self.assertEqual(result['min_price'], 100.0)
+        self.assertEqual(result['min_delivery_time'], 3)
+        self.assertEqual(len(result['details']), 3)
+        self.assertIn('username', result['user_details'])
+
+    def test_retrieve(self):
+        offer = self.offers[0]
+        self.client.force_authenticate(user=self.business_users[0])
+        with self.assertNumQueries(2):
+            response = self.client.get(f'/api/offers/{offer.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['min_price'], 100.0)
+        self.assertEqual(response.data['min_delivery_time'], 3)
+        self.assertNotIn('user_details', response.data)
+
+
+class KeysetPaginationTests(CoderrTestCase):
+    """Cursor mode walks the whole collection without OFFSET or COUNT."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.business_user = create_business_user('business')
+        cls.customer_user = create_customer_user('customer')
+        cls.offers = [create_offer(cls.business_user, f"Offer {i}") for i in range(25)]
+        for offer in cls.offers[:10]:
+            detail = offer.offer_details.first()
+            Order.objects.create(
+                customer_user=cls.customer_user, business_user=cls.business_user, offer_detail=detail,
+                title=offer.title, revisions=detail.revisions, delivery_time_in_days=detail.delivery_time_in_days,
+                price=detail.price, features=detail.features, offer_type=detail.offer_type
+            )
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+
+    def walk(self, url, params):
+        pages = []
+        response = self.client.get(url, params)
+        while True:
+            self.assertEqual(response.status_code, 200)
+            pages.append(response.data)
+            if not response.data['next']:
+                return pages
+            response = self.client.get(response.data['next'])
+
+    def test_offer_cursor_pages_cover_all_rows_in_order(self):
+        pages = self.walk('/api/offers/', {'pagination': 'cursor', 'page_size': 10})
+        ids = [item['id'] for page in pages for item in page['results']]
+        expected = list(Offer.objects.order_by('-updated_at', '-id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+        self.assertEqual(len(pages), 3)
+        self.assertIsNone(pages[0]['previous'])
+        self.assertNotIn('count', pages[0])
+
+    def test_offer_cursor_page_has_no_count_query(self):
+        # catalogue version, page with the user join and the details prefetch
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/offers/', {'pagination': 'cursor'})
+        self.assertEqual(len(response.data['results']), 6)
+
+    def test_offer_previous_cursor_returns_previous_page(self):
+        first = self.client.get('/api/offers/', {'pagination': 'cursor', 'page_size': 5}).data
+        second = self.client.get(first['next']).data
+        back = self.client.get(second['previous']).data
+        self.assertEqual([o['id'] for o in back['results']], [o['id'] for o in first['results']])
+
+    def test_offer_estimated_total(self):
+        response = self.client.get('/api/offers/', {'pagination': 'cursor', 'estimate_total': 'true'})
+        self.assertEqual(response.data['estimated_total'], 25)
+        self.assertFalse(response.data['estimated_total_capped'])
+        response = self.client.get('/api/offers/', {'pagination': 'cursor', 'estimate_total': 'true', 'search': 'Offer 1'})
+        self.assertEqual(response.data['estimated_total'], Offer.objects.filter(title__startswith='Offer 1').count())
+
+    def test_estimated_total_counts_only_the_users_rows_up_to_the_cap(self):
+        other_customer = create_customer_user('other')
+        self.client.force_authenticate(user=other_customer)
+        response = self.client.get('/api/orders/', {'pagination': 'cursor', 'estimate_total': 'true'})
+        self.assertEqual(response.data['estimated_total'], 0)
+
+        self.client.force_authenticate(user=self.customer_user)
+        with patch.object(KeysetPagination, 'estimate_cap', 4):
+            response = self.client.get('/api/orders/', {'pagination': 'cursor', 'estimate_total': 'true'})
+        self.assertEqual(response.data['estimated_total'], 4)
+        self.assertTrue(response.data['estimated_total_capped'])
+
+    def test_cursor_mode_rejects_ordering(self):
+        response = self.client.get('/api/offers/', {'pagination': 'cursor', 'ordering': 'min_price'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('ordering', response.data)
+
+    def test_offer_page_number_mode_is_default(self):
+        response = self.client.get('/api/offers/')
+        self.assertEqual(response.data['count'], 25)
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/offers/', {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_orders_cursor_mode_is_opt_in(self):
+        self.client.force_authenticate(user=self.customer_user)
+        response = self.client.get('/api/orders/')
+        self.assertEqual(len(response.data), 10)
+        pages = self.walk('/api/orders/', {'pagination': 'cursor', 'page_size': 4})
+        ids = [item['id'] for page in pages for item in page['results']]
+        self.assertEqual(ids, list(Order.objects.order_by('-created_at', '-id').values_list('id', flat=True)))
+
+    def test_order_status_change_does_not_move_order_across_cursor(self):
+        self.client.force_authenticate(user=self.customer_user)
+        expected = list(Order.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        first = self.client.get('/api/orders/', {'pagination': 'cursor', 'page_size': 4}).data
+        # an order on a later page is updated and becomes the most recently updated one
+        Order.objects.get(pk=expected[-1]).save()
+        ids = [item['id'] for item in first['results']]
+        next_url = first['next']
+        while next_url:
+            page = self.client.get(next_url).data
+            ids += [item['id'] for item in page['results']]
+            next_url = page['next']
+        self.assertEqual(ids, expected)
+
+
+class OfferSummaryTests(CoderrTestCase):
+    """The stored min_price/min_delivery_time/detail_count follow every OfferDetails write."""
+
+    def setUp(self):
+        super().setUp()
+        self.business_user = create_business_user('business')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.business_user)
+
+    def test_summary_after_api_create(self):
+        response = self.client.post('/api/offers/', {
+            'title': 'Website', 'description': 'Landing page',
+            'details': [
+                {'title': 'Basic', 'revisions': 1, 'delivery_time_in_days': 9, 'price': '150.00', 'features': [], 'offer_type': 'basic'},
+                {'title': 'Standard', 'revisions': 2, 'delivery_time_in_days': 6, 'price': '250.00', 'features': [], 'offer_type': 'standard'},
+                {'title': 'Premium', 'revisions': 3, 'delivery_time_in_days': 4, 'price': '400.00', 'features': [], 'offer_type': 'premium'},
+            ]
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['min_price'], 150.0)
+        self.assertEqual(response.data['min_delivery_time'], 4)
+        offer = Offer.objects.get(pk=response.data['id'])
+        self.assertEqual(offer.detail_count, 3)
+
+    def test_summary_after_api_update_and_delete(self):
+        offer = create_offer(self.business_user)
+        response = self.client.patch(f'/api/offers/{offer.pk}/', {
+            'details': [{'offer_type': 'basic', 'price': '50.00', 'delivery_time_in_days': 1}]
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['min_price'], 50.0)
+        self.assertEqual(response.data['min_delivery_time'], 1)
+
+        offer.offer_details.filter(offer_type='basic').delete()
+        offer.refresh_from_db()
+        self.assertEqual((offer.min_price, offer.min_delivery_time, offer.detail_count), (200, 3, 2))
+
+    def test_filters_use_summary_without_duplicates(self):
+        fast = create_offer(self.business_user, 'Fast')
+        slow = create_offer(self.business_user, 'Slow')
+        slow.offer_details.update(delivery_time_in_days=30)
+        Offer.objects.filter(pk=slow.pk).refresh_summary()
+        response = self.client.get('/api/offers/', {'max_delivery_time': 7})
+        self.assertEqual([o['id'] for o in response.data['results']], [fast.pk])
+        response = self.client.get('/api/offers/', {'offer_details__delivery_time_in_days__gte': 1})
+        self.assertEqual(response.data['count'], 2)
+        response = self.client.get('/api/offers/', {'ordering': 'min_delivery_time'})
+        self.assertEqual([o['id'] for o in response.data['results']], [fast.pk, slow.pk])
+
+    def test_rebuild_command(self):
+        offer = create_offer(self.business_user)
+        Offer.objects.filter(pk=offer.pk).update(min_price=None, min_delivery_time=None, detail_count=0)
+        call_command('rebuild_offer_summary', stdout=StringIO())
+        offer.refresh_from_db()
+        self.assertEqual((offer.min_price, offer.min_delivery_time, offer.detail_count), (100, 3, 3))
+
+
+class OfferSearchTests(CoderrTestCase):
+    """?search= is answered from the FTS5 index, which follows offer and detail writes."""
+
+    def setUp(self):
+        super().setUp()
+        self.business_user = create_business_user('business')
+        self.client = APIClient()
+        self.logo = Offer.objects.create(user=self.business_user, title="Logo Design", description="Vector logo for your brand")
+        self.website = Offer.objects.create(user=self.business_user, title="Website", description="Landing page with a logo")
+        self.app = Offer.objects.create(user=self.business_user, title="Mobile App", description="Android and iOS")
+        OfferDetails.objects.create(offer=self.app, title="Basic", features=["Push notifications"], offer_type='basic')
+
+    def search(self, term, **params):
+        response = self.client.get('/api/offers/', {'search': term, **params})
+        self.assertEqual(response.status_code, 200)
+        return [offer['id'] for offer in response.data['results']]
+
+    def test_prefix_search(self):
+        self.assertEqual(set(self.search('log')), {self.logo.pk, self.website.pk})
+
+    def test_all_words_must_match(self):
+        self.assertEqual(self.search('logo brand'), [self.logo.pk])
+
+    def test_detail_features_are_indexed(self):
+        self.assertEqual(self.search('push'), [self.app.pk])
+
+    def test_relevance_ordering(self):
+        self.assertEqual(self.search('logo', ordering='relevance'), [self.logo.pk, self.website.pk])
+
+    def test_index_follows_updates_and_deletes(self):
+        self.website.title = "Webshop"
+        self.website.save()
+        self.assertEqual(self.search('webshop'), [self.website.pk])
+        self.app.offer_details.all().delete()
+        self.assertEqual(self.search('push'), [])
+        self.logo.delete()
+        self.assertEqual(self.search('brand'), [])
+
+    def test_punctuation_only_search_is_ignored(self):
+        self.assertEqual(len(self.search('"*')), 3)
+
+
+class PlatformStatsTests(CoderrTestCase):
+    """base-info is served from the running totals instead of four aggregates."""
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.business_user = create_business_user('business')
+        self.customer_user = create_customer_user('customer')
+        self.offer = create_offer(self.business_user)
+        self.review = Review.objects.create(business_user=self.business_user, reviewer=self.customer_user, rating=4, description="Good")
+        Review.objects.create(business_user=self.business_user, reviewer=create_customer_user('other'), rating=5, description="Great")
+
+    def base_info(self):
+        response = self.client.get('/api/base-info/')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_counts(self):
+        self.assertEqual(self.base_info(), {
+            'review_count': 2, 'average_rating': 4.5, 'business_profile_count': 1, 'offer_count': 1
+        })
+
+    def test_cold_read_is_one_query_and_warm_read_is_none(self):
+        with self.assertNumQueries(1):
+            self.base_info()
+        with self.assertNumQueries(0):
+            self.base_info()
+
+    def test_updates_and_deletes_are_tracked(self):
+        self.base_info()
+        self.review.rating = 1
+        self.review.save()
+        self.assertEqual(self.base_info()['average_rating'], 3.0)
+        self.review.delete()
+        self.offer.delete()
+        profile = self.business_user.profile
+        profile.type = 'customer'
+        profile.save()
+        self.assertEqual(self.base_info(), {
+            'review_count': 1, 'average_rating': 5.0, 'business_profile_count': 0, 'offer_count': 0
+        })
+
+    def test_reconcile_reports_and_fixes_drift(self):
+        PlatformStats.objects.update(offer_count=10)
+        out = StringIO()
+        call_command('reconcile_platform_stats', stdout=out)
+        self.assertIn('offer_count: stored 10, actual 1', out.getvalue())
+        self.assertEqual(PlatformStats.objects.get().offer_count, 1)
+        out = StringIO()
+        call_command('reconcile_platform_stats', stdout=out)
+        self.assertIn('No drift', out.getvalue())
+
+
+class BusinessRatingStatsTests(CoderrTestCase):
+    """Per-business review count, rating sum and histogram follow every review write."""
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.business_user = create_business_user('business')
+        self.customer_user = create_customer_user('customer')
+        with self.captureOnCommitCallbacks(execute=True):
+            create_offer(self.business_user)
+        self.client.force_authenticate(self.customer_user)
+
+    def stats(self, user=None):
+        user = User.objects.get(pk=(user or self.business_user).pk)
+        return BusinessRatingStats.for_user(user).summary()
+
+    def test_create_partial_update_and_delete_are_tracked(self):
+        response = self.client.post('/api/reviews/', {'business_user': self.business_user.pk, 'rating': 4, 'description': "Good"})
+        self.assertEqual(response.status_code, 201)
+        Review.objects.create(business_user=self.business_user, reviewer=create_customer_user('other'), rating=5, description="Great")
+        self.assertEqual(self.stats(), {
+            'review_count': 2, 'average_rating': 4.5, 'histogram': {'1': 0, '2': 0, '3': 0, '4': 1, '5': 1},
+        })
+
+        response = self.client.patch(f"/api/reviews/{response.data['id']}/", {'rating': 1.5}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.stats(), {
+            'review_count': 2, 'average_rating': 3.2, 'histogram': {'1': 0, '2': 1, '3': 0, '4': 0, '5': 1},
+        })
+
+        response = self.client.delete(f"/api/reviews/{response.data['id']}/")
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.stats(), {
+            'review_count': 1, 'average_rating': 5.0, 'histogram': {'1': 0, '2': 0, '3': 0, '4': 0, '5': 1},
+        })
+
+    def test_moving_a_review_to_another_business_user(self):
+        other_business = create_business_user('other_business')
+        review = Review.objects.create(business_user=self.business_user, reviewer=self.customer_user, rating=3, description="Ok")
+        review.business_user = other_business
+        review.save()
+        self.assertEqual(self.stats()['review_count'], 0)
+        self.assertEqual(self.stats(other_business)['histogram']['3'], 1)
+
+    def test_business_profile_list_includes_stats_without_extra_queries(self):
+        Review.objects.create(business_user=self.business_user, reviewer=self.customer_user, rating=2, description="Meh")
+        for i in range(3):
+            create_business_user(f'business_{i}')
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/profiles/business/')
+        by_user = {profile['user']['pk']: profile['rating_stats'] for profile in response.data['results']}
+        self.assertEqual(by_user[self.business_user.pk]['average_rating'], 2.0)
+        self.assertEqual(len(by_user), 4)
+        self.assertTrue(all(stats['review_count'] == 0 for pk, stats in by_user.items() if pk != self.business_user.pk))
+
+    def test_offer_list_user_details_on_request(self):
+        response = self.client.get('/api/offers/')
+        self.assertNotIn('rating_stats', response.data['results'][0]['user_details'])
+        with self.captureOnCommitCallbacks(execute=True):
+            Review.objects.create(business_user=self.business_user, reviewer=self.customer_user, rating=5, description="Great")
+        response = self.client.get('/api/offers/', {'include_rating': 'true'})
+        self.assertEqual(response.data['results'][0]['user_details']['rating_stats']['review_count'], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Review.objects.filter(business_user=self.business_user).get().delete()
+        response = self.client.get('/api/offers/', {'include_rating': 'true'})
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['results'][0]['user_details']['rating_stats']['review_count'], 0)
+
+    def test_reconcile_reports_and_fixes_drift(self):
+        Review.objects.create(business_user=self.business_user, reviewer=self.customer_user, rating=4.4, description="Good")
+        BusinessRatingStats.objects.update(rating_4=0, rating_5=1)
+        out = StringIO()
+        call_command('reconcile_business_rating_stats', stdout=out)
+        self.assertIn(f'business user {self.business_user.pk} rating_5: stored 1, actual 0', out.getvalue())
+        self.assertEqual(self.stats()['histogram']['4'], 1)
+        out = StringIO()
+        call_command('reconcile_business_rating_stats', stdout=out)
+        self.assertIn('No drift', out.getvalue())
+
+
+class OrderStatusCountTests(CoderrTestCase):
+    """Order counts are read from per-business counters kept up to date on every order write."""
+
+    def setUp(self):
+        super().setUp()
+        self.business_user = create_business_user('business')
+        self.customer_user = create_customer_user('customer')
+        self.offer = create_offer(self.business_user)
+        self.client = APIClient()
+
+    def place_orders(self):
+        self.client.force_authenticate(user=self.customer_user)
+        ids = []
+        for detail in self.offer.offer_details.all():
+            response = self.client.post('/api/orders/', {'offer_detail_id': detail.pk}, format='json')
+            self.assertEqual(response.status_code, 201)
+            ids.append(response.data['id'])
+        return ids
+
+    def counts(self, *user_ids):
+        response = self.client.get('/api/order-counts/', {'business_user_ids': ','.join(map(str, user_ids))})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_counters_follow_create_status_change_and_delete(self):
+        first, second, third = self.place_orders()
+        self.client.force_authenticate(user=self.business_user)
+        self.client.patch(f'/api/orders/{first}/', {'status': 'completed'}, format='json')
+        self.client.patch(f'/api/orders/{second}/', {'status': 'cancelled'}, format='json')
+        Order.objects.get(pk=third).delete()
+
+        self.assertEqual(self.counts(self.business_user.pk)[str(self.business_user.pk)], {
+            'in_progress': 0, 'completed': 1, 'cancelled': 1
+        })
+
+    def test_single_count_urls(self):
+        self.place_orders()
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/api/order-count/{self.business_user.pk}/')
+        self.assertEqual(response.data, {'order_count': 3})
+        response = self.client.get(f'/api/completed-order-count/{self.business_user.pk}/')
+        self.assertEqual(response.data, {'completed_order_count': 0})
+        response = self.client.get('/api/order-count/9999/')
+        self.assertEqual(response.status_code, 404)
+
+    def test_batch_counts_fill_in_missing_users(self):
+        self.place_orders()
+        other = create_business_user('other')
+        data = self.counts(self.business_user.pk, other.pk)
+        self.assertEqual(data[str(self.business_user.pk)]['in_progress'], 3)
+        self.assertEqual(data[str(other.pk)], {'in_progress': 0, 'completed': 0, 'cancelled': 0})
+
+    def test_batch_limit(self):
+        self.client.force_authenticate(user=self.customer_user)
+        response = self.client.get('/api/order-counts/', {'business_user_ids': ','.join(str(i) for i in range(501))})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get('/api/order-counts/', {'business_user_ids': 'a,b'})
+        self.assertEqual(response.status_code, 400)
+
+
+FULL_SCAN_RE = re.compile(r'^SCAN (?P<table>\S+)(?P<rest>.*)$')
+SKIPPED_STATEMENTS = ('SAVEPOINT', 'RELEASE', 'ROLLBACK', 'BEGIN', 'COMMIT')
+
+
+def explain_full_scans(sql):
+    """Return the plan lines of ``sql`` that read a whole table without an index."""
+    rows = connection.connection.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall()
+    scans = []
+    for row in rows:
+        detail = row[-1]
+        match = FULL_SCAN_RE.match(detail)
+        if not match or match.group('table') == 'CONSTANT':
+            continue
+        rest = match.group('rest')
+        if 'USING' in rest or 'VIRTUAL TABLE' in rest:
+            continue
+        scans.append(detail)
+    return scans
+
+
+class QueryPlanTests(CoderrTestCase):
+    """Every SQL statement of the hot endpoints must be answered through an index."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.business_user = create_business_user('business')
+        cls.other_business = create_business_user('other_business')
+        cls.customer_user = create_customer_user('customer')
+        cls.offers = [create_offer(cls.business_user if i % 2 else cls.other_business, f"Offer {i}") for i in range(20)]
+        cls.detail = cls.offers[1].offer_details.get(offer_type='basic')
+        cls.order = Order.objects.create(
+            id=cls.detail.pk, customer_user=cls.customer_user, business_user=cls.detail.offer.user, offer_detail=cls.detail,
+            title="Order", revisions=1, delivery_time_in_days=7, price=100, features=[], offer_type='basic'
+        )
+        cls.review = Review.objects.create(business_user=cls.business_user, reviewer=cls.customer_user, rating=4, description="Good")
+        cls.tokens = {user.pk: Token.objects.create(user=user).key for user in (cls.business_user, cls.customer_user)}
+
+    def request(self, method, url, user=None, data=None):
+        client = APIClient()
+        if user is not None:
+            client.credentials(HTTP_AUTHORIZATION=f"Token {self.tokens[user.pk]}")
+        with CaptureQueriesContext(connection) as captured:
+            response = getattr(client, method)(url, data, format='json' if method != 'get' else None)
+        self.assertLess(response.status_code, 400, f"{method.upper()} {url}: {response.status_code} {response.data}")
+        return captured.captured_queries
+
+    def assert_no_full_scans(self, method, url, user=None, data=None):
+        for query in self.request(method, url, user, data):
+            sql = query['sql']
+            if sql.upper().startswith(SKIPPED_STATEMENTS):
+                continue
+            scans = explain_full_scans(sql)
+            self.assertFalse(scans, f"{method.upper()} {url} scans a full table: {scans}\n{sql}")
+
+    def test_offer_endpoints(self):
+        scenarios = [
+            ('get', '/api/offers/', None, None),
+            ('get', '/api/offers/?pagination=cursor', None, None),
+            ('get', f'/api/offers/?creator_id={self.business_user.pk}', None, None),
+            ('get', '/api/offers/?min_price=50&max_delivery_time=7', None, None),
+            ('get', '/api/offers/?search=offer&ordering=relevance', None, None),
+            ('get', f'/api/offers/{self.offers[0].pk}/', self.customer_user, None),
+            ('get', f'/api/offerdetails/{self.detail.pk}/', self.customer_user, None),
+            ('patch', f'/api/offers/{self.offers[1].pk}/', self.business_user,
+             {'title': 'Updated', 'details': [{'offer_type': 'basic', 'price': '90.00'}]}),
+        ]
+        for method, url, user, data in scenarios:
+            with self.subTest(method=method, url=url):
+                self.assert_no_full_scans(method, url, user, data)
+
+    def test_order_endpoints(self):
+        detail = self.offers[1].offer_details.get(offer_type='premium')
+        scenarios = [
+            ('get', '/api/orders/', self.customer_user, None),
+            ('get', '/api/orders/?pagination=cursor', self.business_user, None),
+            ('post', '/api/orders/', self.customer_user, {'offer_detail_id': detail.pk}),
+            ('patch', f'/api/orders/{self.order.pk}/', self.business_user, {'status': 'completed'}),
+            ('get', f'/api/order-count/{self.business_user.pk}/', self.customer_user, None),
+            ('get', f'/api/completed-order-count/{self.business_user.pk}/', self.customer_user, None),
+            ('get', f'/api/order-counts/?business_user_ids={self.business_user.pk},{self.other_business.pk}', self.customer_user, None),
+            ('get', '/api/base-info/', None, None),
+        ]
+        for method, url, user, data in scenarios:
+            with self.subTest(method=method, url=url):
+                self.assert_no_full_scans(method, url, user, data)
+
+    def test_review_and_profile_endpoints(self):
+        scenarios = [
+            ('get', f'/api/reviews/?business_user_id={self.business_user.pk}', self.customer_user, None),
+            ('get', f'/api/reviews/?reviewer_id={self.customer_user.pk}&ordering=-updated_at', self.customer_user, None),
+            ('post', '/api/reviews/', self.customer_user, {'business_user': self.other_business.pk, 'rating': 5, 'description': 'Top'}),
+            ('patch', f'/api/reviews/{self.review.pk}/', self.customer_user, {'rating': 3}),
+            ('get', '/api/profiles/business/', self.customer_user, None),
+            ('get', '/api/profiles/customer/', self.customer_user, None),
+            ('get', '/api/profiles/business/?pagination=cursor&location=ber', self.customer_user, None),
+            ('get', '/api/profiles/customer/?name=cust', self.customer_user, None),
+            ('get', f'/api/profile/{self.business_user.pk}/', self.customer_user, None),
+            ('post', '/api/login/', None, {'username': 'customer', 'password': 'secret123'}),
+        ]
+        for method, url, user, data in scenarios:
+            with self.subTest(method=method, url=url):
+                self.assert_no_full_scans(method, url, user, data)
+
+
+def offer_payload(title, price=100):
+    return {
+        'title': title, 'description': 'Description',
+        'details': [
+            {'title': offer_type, 'revisions': 1, 'delivery_time_in_days': days, 'price': price + extra, 'features': ['f'], 'offer_type': offer_type}
+            for offer_type, days, extra in [('basic', 7, 0), ('standard', 5, 50), ('premium', 3, 100)]
+        ]
+    }
+
+
+class BulkOfferCreateTests(CoderrTestCase):
+    """Offers are created in one batch per transaction, singly and through the bulk endpoint."""
+
+    def setUp(self):
+        super().setUp()
+        self.business_user = create_business_user('business')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.business_user)
+
+    def test_single_create_inserts_details_in_one_statement(self):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.post('/api/offers/', offer_payload('Single'), format='json')
+        self.assertEqual(response.status_code, 201)
+        detail_inserts = [q for q in captured.captured_queries if q['sql'].startswith('INSERT INTO "coderr_app_offerdetails"')]
+        self.assertEqual(len(detail_inserts), 1)
+        self.assertEqual(response.data['min_price'], 100.0)
+        self.assertEqual(len(response.data['details']), 3)
+
+    def test_single_create_keeps_validation_messages(self):
+        payload = offer_payload('Missing')
+        payload['details'] = payload['details'][:2]
+        response = self.client.post('/api/offers/', payload, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('premium', str(response.data['details']))
+
+    def test_bulk_create_in_chunks(self):
+        payload = [offer_payload(f"Bulk {i}", price=10 * i + 10) for i in range(7)]
+        response = self.client.post('/api/offers/bulk/?chunk_size=3', payload, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([item['index'] for item in response.data['created']], list(range(7)))
+        offers = Offer.objects.filter(title__startswith='Bulk')
+        self.assertEqual(offers.count(), 7)
+        self.assertEqual(OfferDetails.objects.filter(offer__in=offers).count(), 21)
+        offer = Offer.objects.get(pk=response.data['created'][2]['id'])
+        self.assertEqual((offer.min_price, offer.min_delivery_time, offer.detail_count), (30, 3, 3))
+        self.assertEqual(self.client.get('/api/base-info/').data['offer_count'], 7)
+        self.assertEqual(self.client.get('/api/offers/', {'search': 'bulk'}).data['count'], 7)
+
+    def test_bulk_create_reports_item_errors(self):
+        broken = offer_payload('Broken')
+        broken['details'][0]['price'] = 'not a number'
+        response = self.client.post('/api/offers/bulk/', [offer_payload('Good'), broken], format='json')
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(len(response.data['created']), 1)
+        self.assertEqual(response.data['errors'][0]['index'], 1)
+        self.assertFalse(Offer.objects.filter(title='Broken').exists())
+
+    def test_bulk_create_requires_business_user(self):
+        self.client.force_authenticate(user=create_customer_user('customer'))
+        response = self.client.post('/api/offers/bulk/', [offer_payload('Nope')], format='json')
+        self.assertEqual(response.status_code, 403)
+
+
+class OfferUpdateQueryCountTests(CoderrTestCase):
+    """PATCH /api/offers/<id>/ reads once, writes in batches and answers from memory."""
+
+    def setUp(self):
+        super().setUp()
+        self.business_user = create_business_user('business')
+        self.offer = create_offer(self.business_user)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.business_user)
+
+    def test_update_with_details(self):
+        payload = {
+            'title': 'Updated',
+            'details': [
+                {'offer_type': 'basic', 'price': '80.00', 'delivery_time_in_days': 2},
+                {'offer_type': 'premium', 'revisions': 5},
+            ]
+        }
+        # offer+user, details, savepoint, batched detail UPDATE, summary UPDATE and
+        # reload, offer UPDATE, search index DELETE + INSERT, release
+        with self.assertNumQueries(10):
+            response = self.client.patch(f'/api/offers/{self.offer.pk}/', payload, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['title'], 'Updated')
+        self.assertEqual(response.data['min_price'], 80.0)
+        self.assertEqual(response.data['min_delivery_time'], 2)
+        self.assertEqual(len(response.data['details']), 3)
+
+        self.offer.refresh_from_db()
+        self.assertEqual((self.offer.title, self.offer.min_price, self.offer.min_delivery_time), ('Updated', 80, 2))
+        premium = self.offer.offer_details.get(offer_type='premium')
+        self.assertEqual((premium.revisions, premium.price), (5, 300))
+
+    def test_update_without_details(self):
+        with self.assertNumQueries(7):
+            response = self.client.patch(f'/api/offers/{self.offer.pk}/', {'title': 'Renamed'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['min_price'], 100.0)
+
+    def test_update_writes_only_the_changed_columns(self):
+        with CaptureQueriesContext(connection) as captured:
+            self.client.patch(f'/api/offers/{self.offer.pk}/', {'title': 'Renamed'}, format='json')
+        update = next(query['sql'] for query in captured.captured_queries if query['sql'].startswith('UPDATE "coderr_app_offer"'))
+        self.assertIn('"title"', update)
+        self.assertNotIn('"description"', update)
+        self.assertNotIn('"image"', update)
+
+    def test_unknown_offer_type_changes_nothing(self):
+        payload = {'title': 'Nope', 'details': [{'offer_type': 'basic', 'price': '1.00'}, {'offer_type': 'gold', 'price': '5.00'}]}
+        response = self.client.patch(f'/api/offers/{self.offer.pk}/', payload, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.offer.refresh_from_db()
+        self.assertEqual((self.offer.title, self.offer.min_price), ('Offer', 100))
+
+    def test_only_owner_may_update(self):
+        self.client.force_authenticate(user=create_business_user('other'))
+        response = self.client.patch(f'/api/offers/{self.offer.pk}/', {'title': 'Stolen'}, format='json')
+        self.assertEqual(response.status_code, 403)
+
+
+class OfferListCacheTests(CoderrTestCase):
+    """The public offer list is served from a versioned response cache."""
+
+    def setUp(self):
+        super().setUp()
+        self.business_user = create_business_user('business')
+        # committed, so the tests see only the bumps of their own writes
+        with self.captureOnCommitCallbacks(execute=True):
+            self.offers = [create_offer(self.business_user, f"Offer {i}") for i in range(3)]
+        self.client = APIClient()
+
+    def test_second_request_is_a_hit_reading_only_the_version(self):
+        first = self.client.get('/api/offers/')
+        self.assertEqual(first['X-Cache'], 'MISS')
+        with self.assertNumQueries(1):
+            second = self.client.get('/api/offers/')
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(get_offer_list_cache().stats()['hits'], 1)
+
+    def test_key_is_normalized(self):
+        self.client.get('/api/offers/', {'ordering': 'min_price', 'search': ''})
+        response = self.client.get('/api/offers/?page=1&page_size=6&ordering=min_price')
+        self.assertEqual(response['X-Cache'], 'HIT')
+        response = self.client.get('/api/offers/', {'ordering': 'min_price', 'page_size': 2})
+        self.assertEqual(response['X-Cache'], 'MISS')
+
+    def test_offer_and_detail_writes_invalidate(self):
+        self.client.get('/api/offers/')
+        detail = self.offers[0].offer_details.get(offer_type='basic')
+        detail.price = 10
+        with self.captureOnCommitCallbacks(execute=True):
+            detail.save()
+        response = self.client.get('/api/offers/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertIn(10.0, [offer['min_price'] for offer in response.data['results']])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.offers[1].delete()
+        response = self.client.get('/api/offers/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['count'], 2)
+
+    def test_version_is_bumped_once_after_commit(self):
+        version = CatalogueVersion.current()
+        with self.captureOnCommitCallbacks() as callbacks:
+            for offer in self.offers:
+                offer.title = 'Renamed'
+                offer.save()
+            self.assertEqual(CatalogueVersion.current(), version)
+        self.assertEqual(len(callbacks), 1)
+        callbacks[0]()
+        self.assertEqual(CatalogueVersion.current(), version + 1)
+
+    def test_user_name_change_from_any_path_invalidates(self):
+        self.client.get('/api/offers/')
+        self.business_user.last_name = 'Gollner'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.business_user.save()
+        response = self.client.get('/api/offers/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['results'][0]['user_details']['last_name'], 'Gollner')
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.business_user.save(update_fields=['last_login'])
+        self.assertEqual(callbacks, [])
+
+    def test_profile_name_change_invalidates(self):
+        self.client.get('/api/offers/')
+        self.client.force_authenticate(user=self.business_user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f'/api/profile/{self.business_user.pk}/', {'first_name': 'Anja'}, format='json')
+        response = self.client.get('/api/offers/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['results'][0]['user_details']['first_name'], 'Anja')
+
+
+class ConditionalGetTests(CoderrTestCase):
+    """Offer and offer detail retrieves carry validators and answer matching requests with a 304."""
+
+    def setUp(self):
+        super().setUp()
+        self.business = create_business_user('business')
+        self.offer = create_offer(self.business)
+        self.detail = self.offer.offer_details.get(offer_type='basic')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.business)
+
+    def test_offer_etag_and_not_modified(self):
+        response = self.client.get(f'/api/offers/{self.offer.id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['ETag'].startswith('"'))
+        self.assertNotIn('Last-Modified', response)
+        # only the offer row with its user; the details are never loaded
+        with self.assertNumQueries(1):
+            not_modified = self.client.get(f'/api/offers/{self.offer.id}/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified['ETag'], response['ETag'])
+        self.assertEqual(not_modified.content, b'')
+
+    def test_offer_detail_patch_is_not_hidden_by_if_modified_since(self):
+        self.client.get(f'/api/offers/{self.offer.id}/')
+        self.client.patch(f'/api/offerdetails/{self.detail.id}/', {'price': 50}, format='json')
+        response = self.client.get(f'/api/offers/{self.offer.id}/', HTTP_IF_MODIFIED_SINCE=http_date())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['min_price'], 50.0)
+
+    def test_offer_etag_changes_with_details(self):
+        etag = self.client.get(f'/api/offers/{self.offer.id}/')['ETag']
+        self.detail.price = 50
+        self.detail.save()
+        response = self.client.get(f'/api/offers/{self.offer.id}/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.data['min_price'], 50.0)
+
+    def test_offer_detail_etag_and_not_modified(self):
+        response = self.client.get(f'/api/offerdetails/{self.detail.id}/')
+        self.assertEqual(response.status_code, 200)
+        with self.assertNumQueries(1):
+            not_modified = self.client.get(f'/api/offerdetails/{self.detail.id}/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+
+        self.detail.title = 'Changed'
+        self.detail.save()
+        changed = self.client.get(f'/api/offerdetails/{self.detail.id}/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(changed.data['title'], 'Changed')
+
+    def test_offer_detail_change_is_not_hidden_by_if_modified_since(self):
+        response = self.client.get(f'/api/offerdetails/{self.detail.id}/')
+        self.assertNotIn('Last-Modified', response)
+        self.client.patch(f'/api/offerdetails/{self.detail.id}/', {'price': 75}, format='json')
+        changed = self.client.get(f'/api/offerdetails/{self.detail.id}/', HTTP_IF_MODIFIED_SINCE=http_date())
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(changed.data['price'], '75.00')
+
+    def test_missing_offer_is_still_404(self):
+        response = self.client.get('/api/offers/999999/', HTTP_IF_NONE_MATCH='"abc"')
+        self.assertEqual(response.status_code, 404)
+
+
+class OrderExportTests(CoderrTestCase):
+    """GET /api/orders/export/ streams the user's orders as CSV or NDJSON."""
+
+    def setUp(self):
+        super().setUp()
+        self.business = create_business_user('business')
+        self.customer = create_customer_user('customer')
+        self.other = create_customer_user('other')
+        self.detail = create_offer(self.business).offer_details.get(offer_type='basic')
+        self.create_order(self.customer)
+        self.create_order(self.customer, status='completed')
+        self.create_order(self.other)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.customer)
+
+    def create_order(self, customer, status='in_progress'):
+        return Order.objects.create(
+            customer_user=customer, business_user=self.business, offer_detail=self.detail, title='Offer',
+            revisions=1, delivery_time_in_days=7, price=100, features=['feature'], offer_type='basic', status=status
+        )
+
+    def seed_orders(self, count):
+        Order.objects.bulk_create([
+            Order(
+                customer_user=self.customer, business_user=self.business, offer_detail=self.detail, title=f"Order {i}",
+                revisions=1, delivery_time_in_days=5, price=100, features=['feature'], offer_type='basic',
+            )
+            for i in range(count)
+        ], batch_size=1000)
+
+    def export(self, client=None, **params):
+        response = (client or self.client).get('/api/orders/export/', params)
+        return response, b''.join(response.streaming_content).decode('utf-8') if response.streaming else None
+
+    def test_csv_export(self):
+        response, content = self.export()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn('attachment; filename="orders.csv"', response['Content-Disposition'])
+        rows = list(csv.reader(StringIO(content)))
+        self.assertEqual(rows[0][:3], ['id', 'customer_user_id', 'business_user_id'])
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[1][6], '100.00')
+        self.assertEqual(json.loads(rows[1][7]), ['feature'])
+
+    def test_ndjson_matches_order_list(self):
+        _, content = self.export(output='ndjson')
+        exported = [json.loads(line) for line in content.splitlines()]
+        listed = json.loads(self.client.get('/api/orders/').content)
+        self.assertEqual(exported, sorted(listed, key=lambda order: order['id']))
+
+    def test_status_and_date_filters(self):
+        _, content = self.export(output='ndjson', status='completed')
+        self.assertEqual([json.loads(line)['status'] for line in content.splitlines()], ['completed'])
+        _, content = self.export(output='ndjson', status='in_progress,cancelled')
+        self.assertEqual(len(content.splitlines()), 1)
+
+        today = timezone.localdate().isoformat()
+        _, content = self.export(output='ndjson', created_after=today, created_before=today)
+        self.assertEqual(len(content.splitlines()), 2)
+        _, content = self.export(output='ndjson', created_before='2000-01-01')
+        self.assertEqual(content, '')
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.export(status='shipped')[0].status_code, 400)
+        self.assertEqual(self.export(created_after='yesterday')[0].status_code, 400)
+        self.assertEqual(self.export(output='xml')[0].status_code, 400)
+
+    def test_business_user_exports_received_orders(self):
+        business_client = APIClient()
+        business_client.force_authenticate(user=self.business)
+        _, content = self.export(business_client, output='ndjson')
+        self.assertEqual(len(content.splitlines()), 3)
+        self.assertEqual(self.export(APIClient())[0].status_code, 401)
+
+    def export_peak(self, count):
+        Order.objects.all().delete()
+        self.seed_orders(count)
+        tracemalloc.start()
+        response = self.client.get('/api/orders/export/', {'output': 'ndjson'})
+        lines = sum(part.count(b'\n') for part in response.streaming_content)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.assertEqual(lines, count)
+        return peak
+
+    @override_settings(ORDER_EXPORT_CHUNK_SIZE=2)
+    async def test_asgi_export_streams_from_async_iterator(self):
+        await sync_to_async(self.seed_orders)(5)
+        token = await Token.objects.acreate(user=self.customer)
+        response = await self.async_client.get(
+            '/api/orders/export/', {'output': 'ndjson'}, headers={'Authorization': f'Token {token.key}'}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_async)
+        parts = [part async for part in response.streaming_content]
+        self.assertEqual(len(parts), 4)
+        self.assertEqual(sum(part.count(b'\n') for part in parts), 7)
+
+    @override_settings(ORDER_EXPORT_CHUNK_SIZE=500)
+    def test_memory_does_not_grow_with_order_count(self):
+        # scaled-down version of `manage.py bench_order_export --orders 1000000`
+        small = self.export_peak(2_000)
+        large = self.export_peak(20_000)
+        self.assertLess(large, small * 1.5)
+
+
+class ContentAddressedStorageTests(CoderrTestCase):
+    """Uploads are stored once per content and removed with their last reference."""
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.media_root = media_root
+        self.business = create_business_user('business')
+
+    def create_offer(self, content, filename='logo.png'):
+        return Offer.objects.create(user=self.business, title='Offer', image=SimpleUploadedFile(filename, content))
+
+    def blob_files(self):
+        return [
+            os.path.join(directory, name)
+            for directory, _, names in os.walk(os.path.join(self.media_root, 'blobs'))
+            for name in names
+            if not directory.endswith('tmp')
+        ]
+
+    def test_identical_uploads_share_one_file(self):
+        first = self.create_offer(b'logo')
+        second = self.create_offer(b'logo', 'other-name.PNG')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertTrue(first.image.name.startswith('blobs/'))
+        self.assertTrue(first.image.name.endswith('.png'))
+        self.assertEqual(len(self.blob_files()), 1)
+        self.assertEqual(MediaBlob.objects.get(name=first.image.name).ref_count, 2)
+        self.assertNotEqual(self.create_offer(b'other').image.name, first.image.name)
+
+    def test_last_reference_removes_file(self):
+        first = self.create_offer(b'logo')
+        second = self.create_offer(b'logo')
+        path = first.image.path
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(os.path.exists(path))
+        with self.captureOnCommitCallbacks(execute=True):
+            Offer.objects.filter(pk=second.pk).delete()
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(MediaBlob.objects.exists())
+
+    def test_replacing_and_clearing_release_the_old_file(self):
+        profile = UserProfile.objects.get(user=self.business)
+        client = APIClient()
+        client.force_authenticate(user=self.business)
+        with self.captureOnCommitCallbacks(execute=True):
+            client.patch(f'/api/profile/{self.business.id}/', {'file': SimpleUploadedFile('a.pdf', b'first')}, format='multipart')
+        profile.refresh_from_db()
+        old_path = profile.file.path
+        with self.captureOnCommitCallbacks(execute=True):
+            client.patch(f'/api/profile/{self.business.id}/', {'file': SimpleUploadedFile('b.pdf', b'second')}, format='multipart')
+        self.assertFalse(os.path.exists(old_path))
+
+        profile = UserProfile.objects.get(user=self.business)
+        path = profile.file.path
+        profile.file = None
+        with self.captureOnCommitCallbacks(execute=True):
+            profile.save()
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(MediaBlob.objects.count(), 0)
+
+    def test_migrate_command_deduplicates_legacy_files(self):
+        os.makedirs(os.path.join(self.media_root, 'uploads'))
+        for name, content in [('a.png', b'same' * 100), ('b.png', b'same' * 100), ('c.png', b'unique')]:
+            with open(os.path.join(self.media_root, 'uploads', name), 'wb') as legacy_file:
+                legacy_file.write(content)
+        offers = [Offer.objects.create(user=self.business, title='Offer') for _ in range(3)]
+        for offer, name in zip(offers, ['a.png', 'b.png', 'c.png']):
+            Offer.objects.filter(pk=offer.pk).update(image=f'uploads/{name}')
+
+        out = StringIO()
+        call_command('migrate_media_storage', '--dry-run', stdout=out)
+        self.assertIn('Bytes saved: 400', out.getvalue())
+        self.assertTrue(Offer.objects.filter(image__startswith='uploads/').exists())
+
+        out = StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('migrate_media_storage', stdout=out)
+        self.assertIn('3 files (806 bytes) -> 2 blobs (406 bytes)', out.getvalue())
+        self.assertIn('Bytes saved: 400', out.getvalue())
+        names = list(Offer.objects.order_by('id').values_list('image', flat=True))
+        self.assertEqual(names[0], names[1])
+        self.assertEqual(MediaBlob.objects.get(name=names[0]).ref_count, 2)
+        self.assertEqual(os.listdir(os.path.join(self.media_root, 'uploads')), [])
+        self.assertEqual(len(self.blob_files()), 2)
+
+
+class FailedFileSaveTests(TransactionTestCase):
+    """A save that fails in autocommit mode keeps no blob reference and no unreferenced file."""
+
+    def setUp(self):
+        self.media_root = media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.business = create_business_user('business')
+        self.name = blob_name(hashlib.sha256(b'logo').hexdigest(), 'logo.png')
+
+    def create_offer(self, **fields):
+        return Offer.objects.create(user=self.business, title='Offer', image=SimpleUploadedFile('logo.png', b'logo'), **fields)
+
+    def test_new_blob_is_dropped(self):
+        with self.assertRaises(IntegrityError):
+            self.create_offer(description=None)
+        self.assertFalse(MediaBlob.objects.filter(name=self.name).exists())
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, self.name)))
+
+    def test_shared_blob_keeps_its_references(self):
+        kept = self.create_offer()
+        with self.assertRaises(IntegrityError):
+            self.create_offer(description=None)
+        self.assertEqual(MediaBlob.objects.get(name=self.name).ref_count, 1)
+        self.assertTrue(os.path.exists(kept.image.path))
+
+class MediaServingTests(CoderrTestCase):
+    """The media view answers Range and conditional requests and marks blobs as immutable."""
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        os.makedirs(os.path.join(media_root, 'uploads'))
+        with open(os.path.join(media_root, 'uploads', 'file.txt'), 'wb') as media_file:
+            media_file.write(b'0123456789')
+
+    def get(self, path='/media/uploads/file.txt', **headers):
+        response = self.client.get(path, **headers)
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        response.close()
+        return response, body
+
+    def test_full_download(self):
+        response, body = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body, b'0123456789')
+        self.assertEqual(response['Content-Type'], 'text/plain')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=0, must-revalidate')
+        self.assertIn('ETag', response)
+        self.assertIn('Last-Modified', response)
+
+    def test_single_ranges(self):
+        for header, expected, content_range in [
+            ('bytes=2-5', b'2345', 'bytes 2-5/10'),
+            ('bytes=7-', b'789', 'bytes 7-9/10'),
+            ('bytes=-3', b'789', 'bytes 7-9/10'),
+            ('bytes=8-100', b'89', 'bytes 8-9/10'),
+        ]:
+            response, body = self.get(HTTP_RANGE=header)
+            self.assertEqual(response.status_code, 206)
+            self.assertEqual(body, expected)
+            self.assertEqual(response['Content-Range'], content_range)
+            self.assertEqual(int(response['Content-Length']), len(expected))
+
+    def test_multiple_ranges(self):
+        response, body = self.get(HTTP_RANGE='bytes=0-1,8-9')
+        self.assertEqual(response.status_code, 206)
+        self.assertTrue(response['Content-Type'].startswith('multipart/byteranges; boundary='))
+        self.assertEqual(int(response['Content-Length']), len(body))
+        self.assertIn(b'Content-Range: bytes 0-1/10\r\n\r\n01\r\n', body)
+        self.assertIn(b'Content-Range: bytes 8-9/10\r\n\r\n89\r\n', body)
+
+    def test_unsatisfiable_and_ignored_ranges(self):
+        response, _ = self.get(HTTP_RANGE='bytes=20-30')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */10')
+        self.assertEqual(self.get(HTTP_RANGE='lines=1-2')[0].status_code, 200)
+        self.assertEqual(self.get(HTTP_RANGE='bytes=2-5', HTTP_IF_RANGE='"stale"')[0].status_code, 200)
+
+    def test_conditional_requests(self):
+        response, _ = self.get()
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=response['ETag'])[0].status_code, 304)
+        self.assertEqual(self.get(HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])[0].status_code, 304)
+        ranged, body = self.get(HTTP_RANGE='bytes=0-0', HTTP_IF_RANGE=response['ETag'])
+        self.assertEqual((ranged.status_code, body), (206, b'0'))
+
+    def test_blobs_are_immutable(self):
+        name = default_storage.store(ContentFile(b'logo'), 'logo.png')
+        response, body = self.get(f'/media/{name}')
+        self.assertEqual(body, b'logo')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertEqual(response['ETag'], f'"{hashlib.sha256(b"logo").hexdigest()}"')
+        self.assertEqual(response['Content-Type'], 'image/png')
+
+    def test_head_and_missing_files(self):
+        response = self.client.head('/media/uploads/file.txt')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Length'], '10')
+        self.assertEqual(response.content, b'')
+        self.assertEqual(self.get('/media/uploads/missing.txt')[0].status_code, 404)
+        self.assertEqual(self.get('/media/uploads/')[0].status_code, 404)
+        self.assertEqual(self.get('/media/..%2Fmanage.py')[0].status_code, 404)
+        self.assertEqual(self.client.post('/media/uploads/file.txt').status_code, 405)
+
+    def test_range_is_not_exposed_to_sendfile(self):
+        response = self.client.get('/media/uploads/file.txt', HTTP_RANGE='bytes=2-5')
+        self.assertFalse(hasattr(response.file_to_stream, 'fileno'))
+        self.assertEqual(b''.join(response.streaming_content), b'2345')
+        response.close()
+
+    async def test_asgi_streams_blocks_from_async_iterators(self):
+        content = bytes(range(256)) * 1024
+        with open(os.path.join(self.media_root, 'uploads', 'large.bin'), 'wb') as media_file:
+            media_file.write(content)
+        for headers, status, expected in [
+            ({}, 200, content),
+            ({'Range': 'bytes=1000-200000'}, 206, content[1000:200001]),
+        ]:
+            response = await self.async_client.get('/media/uploads/large.bin', headers=headers)
+            self.assertEqual(response.status_code, status)
+            self.assertTrue(response.is_async)
+            chunks = [chunk async for chunk in response.streaming_content]
+            self.assertGreater(len(chunks), 1)
+            self.assertEqual(b''.join(chunks), expected)
+            self.assertEqual(int(response['Content-Length']), len(expected))
+
+        response = await self.async_client.get('/media/uploads/file.txt', headers={'Range': 'bytes=0-1,8-9'})
+        self.assertTrue(response.is_async)
+        body = b''.join([chunk async for chunk in response.streaming_content])
+        self.assertIn(b'Content-Range: bytes 8-9/10\r\n\r\n89\r\n', body)
+        self.assertEqual(int(response['Content-Length']), len(body))
+
+    @override_settings(MEDIA_SENDFILE_BACKEND='x-accel-redirect')
+    def test_accel_redirect(self):
+        response, body = self.get()
+        self.assertEqual(response['X-Accel-Redirect'], '/internal-media/uploads/file.txt')
+        self.assertEqual(body, b'')
+        self.assertEqual(response['Content-Type'], 'text/plain')
+
+
+class AsyncReadPathTests(CoderrTestCase):
+    """The read endpoints are native coroutines and give the same answers through the async client."""
+
+    def setUp(self):
+        super().setUp()
+        self.business = create_business_user('business')
+        self.offer = create_offer(self.business)
+        self.token = Token.objects.create(user=self.business)
+        self.headers = {'Authorization': f'Token {self.token.key}'}
+
+    def test_handlers_are_coroutines(self):
+        for handler in [OfferViewset.list, OfferViewset.retrieve, OfferDetailsViewSet.retrieve, BaseInfoViewset.get,
+                        OrderCountView.get, CompletedOrderCountView.get]:
+            self.assertTrue(asyncio.iscoroutinefunction(handler), handler)
+        self.assertTrue(asyncio.iscoroutinefunction(OrderCountView.as_view()))
+
+    async def test_async_client_matches_sync_client(self):
+        detail = await self.offer.offer_details.afirst()
+        sync_client = APIClient()
+        sync_client.credentials(HTTP_AUTHORIZATION=self.headers['Authorization'])
+        for path in ['/api/offers/', f'/api/offers/{self.offer.pk}/', f'/api/offerdetails/{detail.pk}/', '/api/base-info/',
+                     f'/api/order-count/{self.business.pk}/', f'/api/completed-order-count/{self.business.pk}/',
+                     f'/api/order-counts/?business_user_ids={self.business.pk}']:
+            response = await self.async_client.get(path, headers=self.headers)
+            self.assertEqual(response.status_code, 200, path)
+            expected = await sync_to_async(sync_client.get)(path)
+            self.assertEqual(json.loads(response.content), json.loads(expected.content), path)
+
+    async def test_errors_and_writes_through_async_dispatch(self):
+        self.assertEqual((await self.async_client.get(f'/api/offers/{self.offer.pk}/')).status_code, 401)
+        self.assertEqual((await self.async_client.get('/api/order-count/999999/', headers=self.headers)).status_code, 404)
+        bad_token = {'Authorization': 'Token invalid'}
+        self.assertEqual((await self.async_client.get('/api/base-info/', headers=bad_token)).status_code, 401)
+        response = await self.async_client.patch(
+            f'/api/offers/{self.offer.pk}/', {'title': 'Renamed'}, content_type='application/json', headers=self.headers
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((await Offer.objects.aget(pk=self.offer.pk)).title, 'Renamed')
+
+    async def test_cursor_pagination(self):
+        response = await self.async_client.get('/api/offers/', {'pagination': 'cursor', 'page_size': 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(json.loads(response.content)['results']), 1)
+
+
+class SparseFieldsetTests(CoderrTestCase):
+    """?fields= / ?omit= trim the response and the SQL behind it."""
+
+    def setUp(self):
+        super().setUp()
+        self.business = create_business_user('business')
+        self.customer = create_customer_user('customer')
+        self.offers = [create_offer(self.business, f"Offer {i}") for i in range(3)]
+        detail = self.offers[0].offer_details.first()
+        self.order = Order.objects.create(
+            id=detail.pk, customer_user=self.customer, business_user=self.business, offer_detail=detail,
+            title="Order", revisions=1, delivery_time_in_days=7, price=100, features=['long feature'], offer_type='basic'
+        )
+        Review.objects.create(business_user=self.business, reviewer=self.customer, rating=4, description="Good")
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+
+    def get(self, url, params):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return response, [query['sql'] for query in captured.captured_queries]
+
+    def test_offer_list_reads_only_the_selected_columns(self):
+        response, queries = self.get('/api/offers/', {'fields': 'id,title,min_price'})
+        self.assertEqual(list(response.data['results'][0]), ['id', 'title', 'min_price'])
+        self.assertEqual(len(queries), 3)
+        self.assertNotIn('"description"', queries[-1])
+        self.assertNotIn('auth_user', queries[-1])
+
+        response, queries = self.get('/api/offers/', {'fields': 'id,user_details', 'pagination': 'cursor'})
+        self.assertEqual(response.data['results'][0]['user_details']['username'], 'business')
+        self.assertEqual(len(queries), 2)
+        self.assertIn('"auth_user"."username"', queries[-1])
+        self.assertNotIn('"auth_user"."password"', queries[-1])
+
+    def test_omit_skips_the_details_prefetch(self):
+        full, full_queries = self.get('/api/offers/', {})
+        response, queries = self.get('/api/offers/', {'omit': 'details,description'})
+        self.assertEqual(len(queries), len(full_queries) - 1)
+        self.assertNotIn('details', response.data['results'][0])
+        self.assertEqual(response.data['results'][0]['user_details'], full.data['results'][0]['user_details'])
+
+    def test_offer_retrieve(self):
+        response, queries = self.get(f'/api/offers/{self.offers[0].pk}/', {'fields': 'id,title'})
+        self.assertEqual(response.data, {'id': self.offers[0].pk, 'title': 'Offer 0'})
+        self.assertEqual(len(queries), 1)
+
+    def test_orders_reviews_and_profiles(self):
+        response, queries = self.get('/api/orders/', {'fields': 'id,status'})
+        self.assertEqual(response.data, [{'id': self.order.pk, 'status': 'in_progress'}])
+        self.assertNotIn('"features"', queries[0])
+
+        response, queries = self.get('/api/reviews/', {'omit': 'description'})
+        self.assertNotIn('description', response.data[0])
+        self.assertNotIn('"description"', queries[0])
+
+        response, queries = self.get('/api/profiles/business/', {'fields': 'user,rating_stats'})
+        self.assertEqual(response.data['results'][0]['rating_stats']['review_count'], 1)
+        self.assertNotIn('"tel"', queries[-1])
+        response, queries = self.get('/api/profiles/customer/', {'fields': 'uploaded_at'})
+        self.assertEqual(list(response.data['results'][0]), ['uploaded_at'])
+        self.assertNotIn('auth_user', queries[-1])
+
+    def test_unknown_fields_and_writes(self):
+        response = self.client.get('/api/offers/', {'fields': 'id,password'})
+        self.assertEqual(response.status_code, 400)
+        self.client.force_authenticate(self.business)
+        response = self.client.patch(f'/api/offers/{self.offers[0].pk}/?fields=id', {'title': 'Renamed'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('details', response.data)
+
+
+class CompiledListSerializerTests(CoderrTestCase):
+    """The compiled list mode renders exactly the bytes the DRF serializers do."""
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.business = create_business_user('business')
+        self.customer = create_customer_user('customer')
+        self.offers = [create_offer(self.business, f"Offer {i}") for i in range(4)]
+        self.offers[1].image = ContentFile(b'image', name='offer.png')
+        self.offers[1].save()
+        Offer.objects.create(user=self.business, title="No details yet")
+        for detail in OfferDetails.objects.filter(offer__in=self.offers[:2]):
+            Order.objects.create(
+                id=detail.pk, customer_user=self.customer, business_user=self.business, offer_detail=detail,
+                title="Order", revisions=2, delivery_time_in_days=5, price='149.90', features=['Logo', 'Ümlaut'], offer_type='basic'
+            )
+        Review.objects.create(business_user=self.business, reviewer=self.customer, rating=4.5, description="Gut")
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+
+    def assert_same_bytes(self, url, params=None):
+        responses = []
+        for compiled in (False, True):
+            get_offer_list_cache().clear()
+            with self.settings(COMPILED_LIST_SERIALIZERS=compiled):
+                response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            responses.append(response.content)
+        self.assertEqual(responses[0], responses[1])
+        return json.loads(responses[1])
+
+    def test_offer_list(self):
+        for params in [{}, {'page_size': 2, 'page': 2}, {'pagination': 'cursor', 'page_size': 2}, {'include_rating': 'true'},
+                       {'fields': 'id,details,user_details'}, {'search': 'offer', 'ordering': 'min_price'},
+                       {'creator_id': self.business.pk, 'ordering': '-min_delivery_time'}]:
+            with self.subTest(params=params):
+                data = self.assert_same_bytes('/api/offers/', params)
+        self.assertTrue(any(offer['image'] for offer in data['results']))
+
+    def test_orders_and_reviews(self):
+        data = self.assert_same_bytes('/api/orders/')
+        self.assertEqual(data[0]['price'], '149.90')
+        self.assert_same_bytes('/api/orders/', {'pagination': 'cursor', 'page_size': 2})
+        self.assert_same_bytes('/api/orders/', {'fields': 'id,features,created_at'})
+        self.assert_same_bytes('/api/reviews/')
+        self.assert_same_bytes('/api/reviews/', {'pagination': 'cursor', 'omit': 'description'})
+
+    def test_compiled_list_needs_fewer_queries_per_page(self):
+        self.client.get('/api/offers/')
+        get_offer_list_cache().clear()
+        with self.assertNumQueries(4):
+            self.client.get('/api/offers/', {'page_size': 100})
+
+
+def catalog_record(username, offers=1, **extra):
+    return {
+        'username': username, 'email': f"{username}@example.com", 'first_name': username.title(), 'location': 'Berlin',
+        'offers': [offer_payload(f"{username} offer {i}") for i in range(offers)], **extra,
+    }
+
+
+class CatalogImportTests(CoderrTestCase):
+    """import_catalog and POST /api/catalog-import/ validate, batch and resume."""
+
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def write(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8', newline='') as file:
+            file.write(content)
+        return path
+
+    def write_jsonl(self, name, records):
+        return self.write(name, ''.join(json.dumps(record) + '\n' for record in records))
+
+    def test_imports_valid_records_and_rejects_the_rest(self):
+        create_business_user('taken')
+        broken = catalog_record('broken')
+        broken['offers'][0]['details'] = broken['offers'][0]['details'][:2]
+        path = self.write_jsonl('catalog.jsonl', [
+            catalog_record('alpha', offers=2), catalog_record('taken'), broken,
+            catalog_record('beta', password='secret123'), catalog_record('alpha'),
+        ])
+        errors_path = os.path.join(self.directory, 'errors.jsonl')
+        with self.assertNumQueries(13):
+            call_command('import_catalog', path, '--batch-size=10', f'--errors={errors_path}', stdout=StringIO())
+
+        self.assertEqual(sorted(Offer.objects.values_list('title', flat=True)), ['alpha offer 0', 'alpha offer 1', 'beta offer 0'])
+        alpha = User.objects.get(username='alpha')
+        self.assertEqual((alpha.first_name, alpha.profile.type, alpha.profile.location), ('Alpha', 'business', 'Berlin'))
+        self.assertFalse(alpha.has_usable_password())
+        self.assertTrue(User.objects.get(username='beta').check_password('secret123'))
+        offer = Offer.objects.get(title='beta offer 0')
+        self.assertEqual((offer.min_price, offer.detail_count), (100, 3))
+        self.assertEqual(self.client.get('/api/offers/', {'search': 'beta'}).data['count'], 1)
+        self.assertEqual(self.client.get('/api/base-info/').data['offer_count'], 3)
+        self.assertEqual(self.client.get('/api/base-info/').data['business_profile_count'], 3)
+
+        with open(errors_path, encoding='utf-8') as file:
+            errors = [json.loads(line) for line in file]
+        self.assertEqual([(error['position'], error['username']) for error in errors], [(2, 'taken'), (3, 'broken'), (5, 'alpha')])
+        self.assertIn('username', errors[0]['errors'])
+
+    def test_resumes_from_the_checkpoint(self):
+        path = self.write_jsonl('catalog.jsonl', [catalog_record(f'user{i}') for i in range(5)])
+        call_command('import_catalog', path, '--batch-size=2', stdout=StringIO())
+        with open(f'{path}.checkpoint', encoding='utf-8') as file:
+            self.assertEqual(json.load(file)['position'], 5)
+
+        with open(path, 'a', encoding='utf-8') as file:
+            file.write(json.dumps(catalog_record('late')) + '\n')
+        out = StringIO()
+        call_command('import_catalog', path, stdout=out)
+        self.assertIn("Resuming after record 5", out.getvalue())
+        self.assertEqual(User.objects.filter(username__startswith='user').count(), 5)
+        self.assertTrue(User.objects.filter(username='late').exists())
+
+    def test_csv_rows_of_one_username_form_one_business(self):
+        header = ['username', 'email', 'location', 'offer_title', 'offer_description'] + [
+            f'{offer_type}_{field}' for offer_type in ('basic', 'standard', 'premium')
+            for field in ('title', 'revisions', 'delivery_time_in_days', 'price', 'features')
+        ]
+        buffer = StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(header)
+        details = ['Basic', 1, 7, '50.00', '["Logo"]', 'Standard', 2, 5, '80.00', 'Logo|Flyer', 'Premium', 3, 3, '120.00', '']
+        writer.writerow(['csvshop', 'csvshop@example.com', 'Köln', 'Logo', 'Ein Logo', *details])
+        writer.writerow(['csvshop', 'csvshop@example.com', 'Köln', 'Flyer', 'Ein Flyer', *details])
+        writer.writerow(['profileonly', 'profileonly@example.com', 'Bonn', '', ''] + [''] * 15)
+        call_command('import_catalog', self.write('catalog.csv', buffer.getvalue()), stdout=StringIO())
+
+        shop = User.objects.get(username='csvshop')
+        self.assertEqual(shop.profile.location, 'Köln')
+        self.assertEqual(Offer.objects.filter(user=shop).count(), 2)
+        standard = OfferDetails.objects.filter(offer__user=shop, offer_type='standard').first()
+        self.assertEqual(standard.features, ['Logo', 'Flyer'])
+        self.assertFalse(Offer.objects.filter(user__username='profileonly').exists())
+
+    def test_endpoint_streams_progress_for_staff_only(self):
+        content = ''.join(json.dumps(catalog_record(f'web{i}')) + '\n' for i in range(3))
+        self.client.force_login(create_business_user('business'))
+        upload = SimpleUploadedFile('catalog.jsonl', content.encode())
+        self.assertEqual(self.client.post('/api/catalog-import/', {'file': upload}).status_code, 403)
+
+        staff = User.objects.create_user('staff', password='secret123', is_staff=True)
+        self.client.force_login(staff)
+        upload = SimpleUploadedFile('catalog.jsonl', content.encode())
+        response = self.client.post('/api/catalog-import/', {'file': upload, 'batch_size': 2, 'resume_from': 1})
+        self.assertEqual(response.status_code, 200)
+        lines = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([line.get('position') for line in lines], [3, None])
+        self.assertEqual(lines[-1], {'done': True, 'users': 2, 'offers': 2, 'rejected': 0})
+        self.assertFalse(User.objects.filter(username='web0').exists())
+
+    async def test_asgi_endpoint_sends_each_batch_before_the_next(self):
+        staff = await sync_to_async(User.objects.create_user)('staff', password='secret123', is_staff=True)
+        token = await Token.objects.acreate(user=staff)
+        content = ''.join(json.dumps(catalog_record(f'asgi{i}')) + '\n' for i in range(5))
+        upload = SimpleUploadedFile('catalog.jsonl', content.encode())
+        response = await self.async_client.post(
+            '/api/catalog-import/', {'file': upload, 'batch_size': 2}, headers={'Authorization': f'Token {token.key}'}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_async)
+        parts = aiter(response.streaming_content)
+        self.assertEqual(json.loads(await anext(parts))['position'], 2)
+        self.assertEqual(await User.objects.filter(username__startswith='asgi').acount(), 2)
+        lines = [json.loads(part) async for part in parts]
+        self.assertEqual(lines[-1], {'done': True, 'users': 5, 'offers': 5, 'rejected': 0})
+
+
+@override_settings(SERVER_TIMING_SAMPLE_RATE=1.0, SERVER_TIMING_HEADER=True)
+class ServerTimingTests(CoderrTestCase):
+    """Sampled requests carry a Server-Timing breakdown; slow ones are logged with view name and SQL."""
+
+    def setUp(self):
+        super().setUp()
+        self.business = create_business_user("timingbiz")
+        self.offer = create_offer(self.business)
+        self.client = APIClient()
+
+    def server_timing(self, response):
+        return {
+            entry.split(';')[0].strip(): entry
+            for entry in response['Server-Timing'].split(',')
+        }
+
+    def test_header_breaks_down_sampled_request(self):
+        with CaptureQueriesContext(connection) as queries, self.assertLogs('coderr_app.timing', 'INFO') as logs:
+            response = self.client.get('/api/offers/')
+        self.assertEqual(response.status_code, 200)
+        entries = self.server_timing(response)
+        self.assertEqual(set(entries), {'total', 'db', 'auth', 'serialize', 'render'})
+        self.assertIn(f'desc="queries: {len(queries)}"', entries['db'])
+
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['view'], 'OfferViewset.list')
+        self.assertEqual(record['queries'], len(queries))
+        self.assertNotIn('sql', record)
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=0)
+    def test_unsampled_request_is_neither_timed_nor_logged(self):
+        with self.assertNoLogs('coderr_app.timing', 'INFO'):
+            response = self.client.get(f'/api/offers/{self.offer.pk}/')
+        self.assertEqual(response.status_code, 401)
+        self.assertNotIn('Server-Timing', response)
+
+    @override_settings(SERVER_TIMING_SLOW_MS=0)
+    def test_slow_request_logs_view_and_sql(self):
+        self.client.force_authenticate(self.business)
+        with self.assertLogs('coderr_app.timing', 'WARNING') as logs:
+            self.client.get(f'/api/offers/{self.offer.pk}/')
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['view'], 'OfferViewset.retrieve')
+        self.assertTrue(any('coderr_app_offer' in statement['sql'] for statement in record['sql']))
+
+    @override_settings(SERVER_TIMING_SLOW_MS=0)
+    def test_slow_request_log_leaves_out_query_parameters(self):
+        token = Token.objects.create(user=self.business)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        with self.assertLogs('coderr_app.timing', 'WARNING') as logs:
+            self.client.get(f'/api/offers/{self.offer.pk}/')
+        self.assertEqual(logs.records[0].levelname, 'WARNING')
+        self.assertNotIn(token.key, logs.output[0])
+        self.assertNotIn('timingbiz@example.com', logs.output[0])
+
+    @override_settings(SERVER_TIMING_HEADER=False)
+    def test_header_can_be_kept_private(self):
+        with self.assertLogs('coderr_app.timing', 'INFO'):
+            response = self.client.get('/api/offers/')
+        self.assertNotIn('Server-Timing', response)
+
+    @override_settings(SERVER_TIMING_SLOW_MS=0, SERVER_TIMING_SAMPLE_RATE=0)
+    def test_slow_unsampled_request_is_logged_with_its_sql(self):
+        cache.clear()
+        with self.assertLogs('coderr_app.timing', 'WARNING') as logs:
+            self.client.get('/api/base-info/')
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['view'], 'BaseInfoViewset.get')
+        self.assertFalse(record['sampled'])
+        self.assertNotIn('serialize_ms', record)
+        self.assertTrue(record['sql'])
+        self.assertIn('SELECT', record['sql'][0]['sql'])
+
+    @override_settings(SERVER_TIMING_SLOW_MS=0, SERVER_TIMING_SAMPLE_RATE=0)
+    def test_slow_request_log_keeps_a_bounded_statement_list(self):
+        get_offer_list_cache().clear()
+        with patch('coderr_app.timing.MAX_STATEMENTS', 1), self.assertLogs('coderr_app.timing', 'WARNING') as logs:
+            self.client.get('/api/offers/', {'page_size': 1})
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(len(record['sql']), 1)
+        self.assertGreater(record['sql_omitted'], 0)
+
+
+def increment_in_child(name):
+    metrics.inc(name, 2, kind='child')
+
+
+class MetricsTests(CoderrTestCase):
+    """Request and domain metrics are summed over all processes and served on /metrics."""
+
+    def setUp(self):
+        super().setUp()
+        self.directory = directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        metrics_file = override_settings(METRICS_FILE=os.path.join(directory, 'metrics.mmap'), METRICS_TOKEN=None)
+        metrics_file.enable()
+        self.addCleanup(metrics_file.disable)
+        self.client = APIClient()
+
+    def scrape(self):
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        return dict(line.rsplit(' ', 1) for line in response.content.decode().splitlines() if not line.startswith('#'))
+
+    def test_requests_are_counted_per_view_with_latency_histogram(self):
+        for _ in range(2):
+            self.client.get('/api/base-info/')
+        self.client.get('/api/reviews/')
+        samples = self.scrape()
+
+        self.assertEqual(samples['coderr_http_requests_total{view="BaseInfoViewset.get",method="GET",status="200"}'], '2')
+        self.assertEqual(samples['coderr_http_requests_total{view="ReviewViewSet.list",method="GET",status="401"}'], '1')
+        self.assertEqual(samples['coderr_http_request_duration_seconds_bucket{view="BaseInfoViewset.get",le="+Inf"}'], '2')
+        self.assertEqual(samples['coderr_http_request_duration_seconds_count{view="BaseInfoViewset.get"}'], '2')
+        # the second request is answered from the local stats cache
+        self.assertEqual(samples['coderr_db_queries_total{view="BaseInfoViewset.get"}'], '1')
+        buckets = [int(value) for key, value in samples.items() if key.startswith('coderr_http_request_duration_seconds_bucket{view="BaseInfoViewset.get"')]
+        self.assertEqual(buckets, sorted(buckets))
+
+    def test_domain_counters_count_committed_creations(self):
+        business = create_business_user("metricsbiz")
+        customer = create_customer_user("metricscust")
+        offer = create_offer(business)
+        self.client.force_authenticate(customer)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/orders/', {'offer_detail_id': offer.offer_details.first().pk}, format='json')
+        self.assertEqual(response.status_code, 201)
+        samples = self.scrape()
+        self.assertEqual(samples['coderr_orders_created_total'], '1')
+        # created outside captureOnCommitCallbacks: the test transaction never commits
+        self.assertNotIn('coderr_offers_created_total', samples)
+
+    def test_processes_are_aggregated(self):
+        metrics.inc(metrics.OFFERS_CREATED, 3, kind='child')
+        process = multiprocessing.get_context('fork').Process(target=increment_in_child, args=(metrics.OFFERS_CREATED,))
+        process.start()
+        process.join()
+        self.assertEqual(process.exitcode, 0)
+        self.assertEqual(self.scrape()['coderr_offers_created_total{kind="child"}'], '5')
+
+    def test_without_token_only_local_clients_are_served(self):
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='203.0.113.5').status_code, 403)
+        self.assertEqual(self.client.get('/metrics', HTTP_X_FORWARDED_FOR='203.0.113.5').status_code, 403)
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='::1').status_code, 200)
+
+    def test_file_of_live_processes_is_not_laid_out_again(self):
+        path = os.path.join(self.directory, 'shared.mmap')
+        registry = metrics.MetricsRegistry(path, 2)
+        # a block owned by another running process (our parent)
+        struct.pack_into('q', registry.file.map, registry.file.block_offset(1), os.getppid())
+        size = os.path.getsize(path)
+        with override_settings(METRICS_FILE=path, METRICS_MAX_PROCESSES=4):
+            with self.assertLogs('coderr_app.metrics', 'ERROR'):
+                self.assertIsNone(metrics.get_registry())
+            self.assertEqual(self.client.get('/api/base-info/').status_code, 200)
+        self.assertEqual(os.path.getsize(path), size)
+
+        struct.pack_into('q', registry.file.map, registry.file.block_offset(1), os.getpid())
+        self.assertEqual(metrics.MetricsFile(path, 4).processes, 4)
+
+    def test_token_is_required_when_configured(self):
+        with override_settings(METRICS_TOKEN='scrape-secret'):
+            self.assertEqual(self.client.get('/metrics').status_code, 401)
+            response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer scrape-secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+
+
+class BenchCommandTests(CoderrTestCase):
+    """The bench dataset is consistent and every scenario answers with its expected status."""
+
+    BENCH_SIZES = {'business': 3, 'customers': 4, 'offers_per_business': 2, 'orders': 6, 'reviews': 4}
+
+    def test_seeded_counters_match_the_rows(self):
+        from coderr_app.benchmark import seed_dataset
+
+        dataset = seed_dataset(**self.BENCH_SIZES, seed=7)
+        self.assertEqual(dataset.summary()['offer_details'], 18)
+        self.assertEqual(
+            OrderStatusCount.for_business_users(dataset.business_ids),
+            {user_id: {status: Order.objects.filter(business_user_id=user_id, status=status).count() for status in Order.STATUSES}
+             for user_id in dataset.business_ids}
+        )
+        stored = {stats.business_user_id: stats.review_count for stats in BusinessRatingStats.objects.all()}
+        self.assertEqual(stored, {user_id: values['review_count'] for user_id, values in BusinessRatingStats.compute().items()})
+        stats = PlatformStats.load()
+        self.assertEqual({field: getattr(stats, field) for field in PlatformStats.compute()}, PlatformStats.compute())
+        self.assertEqual(Offer.objects.filter(min_price__isnull=True).count(), 0)
+
+    def test_runs_every_scenario_and_compares_with_a_baseline(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        results_path = os.path.join(directory, 'results.json')
+        options = {key.replace('_', '-'): value for key, value in self.BENCH_SIZES.items()}
+        call_command(
+            'bench', *(f'--{key}={value}' for key, value in options.items()),
+            '--repeat=1', '--warmup=0', f'--output={results_path}', stdout=StringIO()
+        )
+        with open(results_path, encoding='utf-8') as file:
+            results = json.load(file)
+        self.assertGreaterEqual(len(results['scenarios']), 30)
+        self.assertEqual({name: result['errors'] for name, result in results['scenarios'].items() if result['errors']}, {})
+        self.assertFalse(User.objects.filter(username__startswith='bench_').exists())
+
+        baseline = json.loads(json.dumps(results))
+        baseline['scenarios']['orders.list']['queries'] -= 1
+        baseline_path = os.path.join(directory, 'baseline.json')
+        with open(baseline_path, 'w', encoding='utf-8') as file:
+            json.dump(baseline, file)
+        out = StringIO()
+        call_command('bench', f'--compare={baseline_path}', f'--current={results_path}', stdout=out)
+        self.assertRegex(out.getvalue(), r'orders\.list\s.*REGRESSION')
+        with self.assertRaises(CommandError):
+            call_command('bench', f'--compare={baseline_path}', f'--current={results_path}', '--fail-on-regression', stdout=StringIO())
+
+
+class LoadTestCommandTests(TransactionTestCase):
+    """The load test runs its journeys through the ASGI app on committed data and removes it again."""
+
+    def test_short_run_reports_steps_and_cleans_up(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        results_path = os.path.join(directory, 'load.json')
+        call_command(
+            'loadtest', '--duration=1', '--concurrency=2', '--mix=browse=2,order=1,complete=1,review=1',
+            '--business=2', '--customers=3', '--offers-per-business=2', '--orders=4', '--reviews=2',
+            f'--output={results_path}', stdout=StringIO()
+        )
+        with open(results_path, encoding='utf-8') as file:
+            results = json.load(file)
+        self.assertGreater(results['requests'], 0)
+        self.assertIn('browse.offer_list', results['steps'])
+        self.assertEqual(sum(row['requests'] for row in results['timeline']), results['requests'])
+        self.assertFalse(User.objects.filter(username__startswith='loadtest_').exists())
+        self.assertEqual(Offer.objects.count(), 0)
+
+    def test_rejects_unknown_journeys(self):
+        with self.assertRaises(CommandError):
+            call_command('loadtest', '--mix=browse=1,checkout=1', stdout=StringIO())
+
+
+class ConcurrentWriteTests(SimpleTestCase):
+    """
+    Atomic blocks that read before they write (ReviewViewSet.perform_create)
+    run concurrently on a file database with the project's OPTIONS without
+    "database is locked".
+    """
+
+    def test_read_then_write_transactions_wait_for_each_other(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        settings_dict = {**connections['default'].settings_dict, 'NAME': os.path.join(directory, 'concurrency.sqlite3')}
+        setup = DatabaseWrapper(settings_dict, alias='concurrency')
+        with setup.cursor() as cursor:
+            cursor.execute('CREATE TABLE review (reviewer integer)')
+        setup.close()
+        barrier = threading.Barrier(4)
+        errors = []
+
+        def review(reviewer):
+            connections['concurrency'] = DatabaseWrapper(settings_dict, alias='concurrency')
+            try:
+                barrier.wait()
+                with transaction.atomic(using='concurrency'), connections['concurrency'].cursor() as cursor:
+                    cursor.execute('SELECT COUNT(*) FROM review WHERE reviewer = %s', [reviewer])
+                    time.sleep(0.05)
+                    cursor.execute('INSERT INTO review (reviewer) VALUES (%s)', [reviewer])
+            except OperationalError as error:
+                errors.append(str(error))
+            finally:
+                connections['concurrency'].close()
+                del connections['concurrency']
+
+        threads = [threading.Thread(target=review, args=(reviewer,)) for reviewer in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+
+class BoundedLRUCacheTests(CoderrTestCase):
+
+    def make_cache(self, **options):
+        backend = BoundedLRUCache(f"test-{self._testMethodName}", {'OPTIONS': options})
+        backend.clear()
+        return backend
+
+    def test_evicts_least_recently_used_entry(self):
+        backend = self.make_cache(MAX_ENTRIES=2)
+        backend.set('a', 1)
+        backend.set('b', 2)
+        backend.get('a')
+        backend.set('c', 3)
+        self.assertEqual((backend.get('a'), backend.get('b'), backend.get('c')), (1, None, 3))
+
+    def test_bounded_by_size(self):
+        backend = self.make_cache(MAX_SIZE=300)
+        for key in 'abcde':
+            backend.set(key, b'x' * 100)
+        stats = backend.stats()
+        self.assertLessEqual(stats['size'], 300)
+        self.assertLess(stats['entries'], 5)
+        self.assertIsNotNone(backend.get('e'))
+
+    def test_counts_hits_and_misses(self):
+        backend = self.make_cache()
+        backend.set('a', 1)
+        backend.get('a')
+        backend.get('missing')
+        self.assertEqual(backend.stats()['hits'], 1)
+        self.assertEqual(backend.stats()['misses'], 1)
@@ -0,0 +1,235 @@
+"""
+Per-request performance instrumentation.
+
+``ServerTimingMiddleware`` measures a sample of the requests
+(``SERVER_TIMING_SAMPLE_RATE``): query count and database time, time spent
+in serializers (``.data``, ``is_valid()``, compiled list serializers),
+authentication and rendering. The breakdown is sent as a ``Server-Timing``
+header and logged as one JSON line per request on the ``coderr_app.timing``
+logger (INFO). Requests slower than ``SERVER_TIMING_SLOW_MS`` are logged as
+WARNING with the view/action name and the text and duration of their SQL
+statements (the first ``MAX_STATEMENTS``), sampled or not. Parameters are
+never kept: they carry token keys, password hashes and e-mail addresses.
+
+The measurements hang off a context variable, so they follow the request
+into the threads that ``sync_to_async`` runs ORM calls in; unsampled
+requests only pay for a clock read, a ``ContextVar.get()`` per hook and two
+clock reads and a list append per query. Every request, sampled or not, is
+recorded in the metrics registry (``coderr_app/metrics.py``).
+Phase times are exclusive: database time spent while serializing counts as
+database time, not serializer time.
+"""
+import contextvars
+import json
+import logging
+import random
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+PHASES = ('auth', 'serialize', 'render')
+# statements kept per request for the slow request log; the SQL text is not copied
+MAX_STATEMENTS = 200
+
+current_timer = contextvars.ContextVar('request_timer', default=None)
+
+
+class RequestTimer:
+    """The measurements of one request; mutated in place from every thread the request uses."""
+
+    def __init__(self, sampled):
+        self.started = time.perf_counter()
+        self.sampled = sampled
+        self.view = None
+        self.queries = 0
+        self.db_time = 0.0
+        self.phases = defaultdict(float)
+        self.statements = []
+        self.open_span = None
+        self.render_started = None
+
+    @contextmanager
+    def span(self, phase):
+        # nested spans (a serializer validating inside authentication, say) count for the outer one
+        if self.open_span is not None:
+            yield
+            return
+        self.open_span = phase
+        started, db_time = time.perf_counter(), self.db_time
+        try:
+            yield
+        finally:
+            self.open_span = None
+            self.phases[phase] += time.perf_counter() - started - (self.db_time - db_time)
+
+    def start_render(self, response):
+        self.render_started = time.perf_counter()
+        response.add_post_render_callback(self.end_render)
+        return response
+
+    def end_render(self, response):
+        self.phases['render'] += time.perf_counter() - self.render_started
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def server_timing(self, total):
+        entries = [f'total;dur={total * 1000:.1f}', f'db;dur={self.db_time * 1000:.1f};desc="queries: {self.queries}"']
+        entries += [f'{phase};dur={self.phases[phase] * 1000:.1f}' for phase in PHASES if phase in self.phases]
+        return ', '.join(entries)
+
+    def record(self, request, response, total):
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'view': self.view,
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 2),
+            'sampled': self.sampled,
+        }
+        if self.sampled:
+            record['queries'] = self.queries
+            record['db_ms'] = round(self.db_time * 1000, 2)
+            record.update({f'{phase}_ms': round(self.phases[phase] * 1000, 2) for phase in PHASES})
+        return record
+
+
+def span(phase):
+    """Count the block's time (minus database time) as ``phase`` of the current request, if it is sampled."""
+    timer = current_timer.get()
+    if timer is None or not timer.sampled:
+        return nullcontext()
+    return timer.span(phase)
+
+
+def timed(phase, function):
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        with span(phase):
+            return function(*args, **kwargs)
+    return wrapper
+
+
+def record_query(execute, sql, params, many, context):
+    timer = current_timer.get()
+    if timer is None:
+        return execute(sql, params, many, context)
+    # every request's query count feeds the metrics, and any request may turn out to be slow
+    timer.queries += 1
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - started
+        timer.db_time += duration
+        if len(timer.statements) < MAX_STATEMENTS:
+            timer.statements.append((sql, many, duration))
+
+
+def watch_connection(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def install():
+    """Hook the database connections and DRF's serializer and authentication entry points."""
+    from rest_framework import serializers
+    from rest_framework.request import Request
+
+    if getattr(install, 'done', False):
+        return
+    install.done = True
+    connection_created.connect(watch_connection)
+    for cls in (serializers.Serializer, serializers.ListSerializer):
+        cls.data = property(timed('serialize', cls.data.fget))
+    for cls in (serializers.BaseSerializer, serializers.ListSerializer):
+        if 'is_valid' in cls.__dict__:
+            cls.is_valid = timed('serialize', cls.is_valid)
+    Request._authenticate = timed('auth', Request._authenticate)
+
+
+def view_name(view_func, method):
+    """``OfferViewset.list`` for viewsets, ``LoginView.post`` for API views, the dotted path for functions."""
+    cls = getattr(view_func, 'cls', None) or getattr(view_func, 'view_class', None)
+    if cls is None:
+        return f'{view_func.__module__}.{view_func.__qualname__}'
+    actions = getattr(view_func, 'actions', None) or {}
+    return f'{cls.__name__}.{actions.get(method, method)}'
+
+
+def format_statements(statements):
+    return [
+        {'sql': sql, 'many': many, 'ms': round(duration * 1000, 2)} if many else {'sql': sql, 'ms': round(duration * 1000, 2)}
+        for sql, many, duration in statements
+    ]
+
+
+class ServerTimingMiddleware:
+    """Times each request; see the module docstring. Place it first in ``MIDDLEWARE``."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timer = self.start(request)
+        token = current_timer.set(timer)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_timer.reset(token)
+        return self.finish(request, timer, response)
+
+    async def __acall__(self, request):
+        timer = self.start(request)
+        token = current_timer.set(timer)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_timer.reset(token)
+        return self.finish(request, timer, response)
+
+    def start(self, request):
+        timer = RequestTimer(sampled=random.random() < settings.SERVER_TIMING_SAMPLE_RATE)
+        request.timer = timer
+        return timer
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.timer.view = view_name(view_func, request.method.lower())
+
+    def process_template_response(self, request, response):
+        # called right before a DRF Response is rendered; the callback fires right after
+        if request.timer.sampled:
+            request.timer.start_render(response)
+        return response
+
+    def finish(self, request, timer, response):
+        total = timer.elapsed()
+        metrics.observe_request(timer.view, request.method, response.status_code, total, timer.queries)
+        if timer.sampled and settings.SERVER_TIMING_HEADER:
+            response['Server-Timing'] = timer.server_timing(total)
+        slow = total * 1000 >= settings.SERVER_TIMING_SLOW_MS
+        if slow or (timer.sampled and logger.isEnabledFor(logging.INFO)):
+            record = timer.record(request, response, total)
+            if slow:
+                record['sql'] = format_statements(timer.statements)
+                if timer.queries > len(timer.statements):
+                    record['sql_omitted'] = timer.queries - len(timer.statements)
+                logger.warning(json.dumps(record, default=str))
+            else:
+                logger.info(json.dumps(record, default=str))
+        return response
@@ -1,3 +1,253 @@
-from django.shortcuts import render
+"""
+Media serving for ``MEDIA_ROOT`` and the Prometheus ``/metrics`` endpoint.
 
-# Create your views here.
+``serve_media`` replaces ``django.conf.urls.static.static()``: it answers
+conditional and Range requests (several ranges as ``multipart/byteranges``),
+marks content-addressed blobs as immutable and can hand the transfer off to
+a front proxy (``MEDIA_SENDFILE_BACKEND``). Under WSGI whole files go out as
+a ``FileResponse``, which servers with ``wsgi.file_wrapper`` can sendfile;
+under ASGI every body is an async iterator reading one block at a time in a
+worker thread, since Django would read a sync file into memory first.
+"""
+import ipaddress
+import mimetypes
+import os
+import re
+import secrets
+import stat
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.crypto import constant_time_compare
+from django.utils.http import parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+from . import metrics as metrics_registry
+from .api.async_views import iterate_in_thread, serving_async
+from .api.conditional import not_modified_response, set_validators
+from .storage import BLOB_DIR
+
+BLOB_RE = re.compile(rf'^{BLOB_DIR}/[0-9a-f]{{2}}/(?P<digest>[0-9a-f]{{64}})(\.[a-z0-9]{{1,10}})?$')
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE_CONTROL = 'public, max-age=0, must-revalidate'
+MAX_RANGES = 16
+BLOCK_SIZE = 64 * 1024
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+PROXY_HEADERS = ('HTTP_FORWARDED', 'HTTP_X_FORWARDED_FOR', 'HTTP_X_REAL_IP')
+
+
+class RangeFile:
+    """
+    Read-only view of ``length`` bytes of an open file from ``start`` on.
+    Deliberately without ``fileno()``: sendfile would send the whole file.
+    """
+
+    def __init__(self, file, start, length):
+        self.file = file
+        self.remaining = length
+        file.seek(start)
+
+    def read(self, size=-1):
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def parse_ranges(header, size):
+    """
+    Parse a ``Range`` header into inclusive ``(start, end)`` pairs. Returns
+    None if the header is malformed or should be ignored, and an empty list
+    if none of the ranges can be satisfied.
+    """
+    unit, _, spec = header.partition('=')
+    if unit.strip().lower() != 'bytes' or size == 0:
+        return None
+    parts = spec.split(',')
+    if len(parts) > MAX_RANGES:
+        return None
+    ranges = []
+    for part in parts:
+        first, separator, last = part.strip().partition('-')
+        if not separator:
+            return None
+        try:
+            if first == '':
+                length = int(last)
+                if length <= 0:
+                    continue
+                ranges.append((max(size - length, 0), size - 1))
+                continue
+            start = int(first)
+            end = int(last) if last else size - 1
+        except ValueError:
+            return None
+        if start < 0 or end < start:
+            return None
+        if start < size:
+            ranges.append((start, min(end, size - 1)))
+    return ranges
+
+
+def if_range_matches(request, etag, last_modified):
+    """A Range header only applies if If-Range (when sent) still names the current representation."""
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if if_range.startswith('"'):
+        return if_range == etag
+    timestamp = parse_http_date_safe(if_range)
+    return timestamp is not None and timestamp == int(last_modified.timestamp())
+
+
+def validators(path, stat_result):
+    """Blobs are named after their SHA-256; every other file gets a size/mtime ETag."""
+    last_modified = datetime.fromtimestamp(int(stat_result.st_mtime), tz=timezone.utc)
+    blob = BLOB_RE.match(path)
+    if blob:
+        return f'"{blob.group("digest")}"', last_modified, IMMUTABLE_CACHE_CONTROL
+    return f'"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"', last_modified, REVALIDATE_CACHE_CONTROL
+
+
+def sendfile_response(path, content_type):
+    """Let the front proxy send the file (X-Accel-Redirect for nginx, X-Sendfile for Apache/lighttpd)."""
+    response = HttpResponse(content_type=content_type)
+    if settings.MEDIA_SENDFILE_BACKEND == 'x-accel-redirect':
+        response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_REDIRECT_PREFIX + path
+    else:
+        response['X-Sendfile'] = safe_join(settings.MEDIA_ROOT, path)
+    return response
+
+
+def file_blocks(full_path, start, length):
+    with open(full_path, 'rb') as file:
+        part = RangeFile(file, start, length)
+        while chunk := part.read(BLOCK_SIZE):
+            yield chunk
+
+
+def file_body(request, full_path, start, length, size):
+    """Response content for ``length`` bytes of the file from ``start`` on; see the module docstring."""
+    if serving_async(request):
+        return iterate_in_thread(file_blocks(full_path, start, length), thread_sensitive=False)
+    file = open(full_path, 'rb')
+    if start == 0 and length == size:
+        return file
+    return RangeFile(file, start, length)
+
+
+def multipart_ranges(full_path, ranges, size, content_type, boundary):
+    headers = [
+        f'\r\n--{boundary}\r\nContent-Type: {content_type}\r\nContent-Range: bytes {start}-{end}/{size}\r\n\r\n'.encode('ascii')
+        for start, end in ranges
+    ]
+    closing = f'\r\n--{boundary}--\r\n'.encode('ascii')
+    length = sum(len(header) for header in headers) + sum(end - start + 1 for start, end in ranges) + len(closing)
+
+    def parts():
+        with open(full_path, 'rb') as file:
+            for header, (start, end) in zip(headers, ranges):
+                yield header
+                part = RangeFile(file, start, end - start + 1)
+                while chunk := part.read(BLOCK_SIZE):
+                    yield chunk
+        yield closing
+
+    return parts(), length
+
+
+@require_safe
+def serve_media(request, path):
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404
+    if path.startswith(f'{BLOB_DIR}/tmp/'):
+        raise Http404
+    try:
+        stat_result = os.stat(full_path)
+    except OSError:
+        raise Http404
+    if not stat.S_ISREG(stat_result.st_mode):
+        raise Http404
+
+    etag, last_modified, cache_control = validators(path, stat_result)
+    not_modified = not_modified_response(request, etag, last_modified)
+    if not_modified is not None:
+        not_modified['Cache-Control'] = cache_control
+        return not_modified
+
+    content_type, encoding = mimetypes.guess_type(full_path)
+    content_type = content_type or 'application/octet-stream'
+    size = stat_result.st_size
+
+    if settings.MEDIA_SENDFILE_BACKEND:
+        response = sendfile_response(path, content_type)
+    elif request.method == 'HEAD':
+        response = HttpResponse(content_type=content_type)
+        response['Content-Length'] = size
+    else:
+        ranges = None
+        if 'HTTP_RANGE' in request.META and if_range_matches(request, etag, last_modified):
+            ranges = parse_ranges(request.META['HTTP_RANGE'], size)
+        if ranges == []:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+        elif ranges and len(ranges) == 1:
+            start, end = ranges[0]
+            body = file_body(request, full_path, start, end - start + 1, size)
+            response = FileResponse(body, status=206, content_type=content_type)
+            response['Content-Length'] = end - start + 1
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        elif ranges:
+            boundary = secrets.token_hex(16)
+            body, length = multipart_ranges(full_path, ranges, size, content_type, boundary)
+            if serving_async(request):
+                body = iterate_in_thread(body, thread_sensitive=False)
+            response = StreamingHttpResponse(body, status=206, content_type=f'multipart/byteranges; boundary={boundary}')
+            response['Content-Length'] = length
+        else:
+            response = FileResponse(file_body(request, full_path, 0, size, size), content_type=content_type)
+            response['Content-Length'] = size
+
+    if encoding and response.status_code == 200:
+        response['Content-Encoding'] = encoding
+    response['Accept-Ranges'] = 'bytes'
+    response['Cache-Control'] = cache_control
+    response['X-Content-Type-Options'] = 'nosniff'
+    return set_validators(response, etag, last_modified)
+
+
+def is_local_request(request):
+    """Sent from this host and not relayed by a proxy (which would connect from this host for anyone)."""
+    if any(header in request.META for header in PROXY_HEADERS):
+        return False
+    try:
+        return ipaddress.ip_address(request.META.get('REMOTE_ADDR', '')).is_loopback
+    except ValueError:
+        return False
+
+
+@require_safe
+def metrics(request):
+    """
+    All workers' metrics in the Prometheus text format. With ``METRICS_TOKEN``
+    set only for that bearer token, without it only for local clients.
+    """
+    token = settings.METRICS_TOKEN
+    if token and not constant_time_compare(request.META.get('HTTP_AUTHORIZATION', ''), f'Bearer {token}'):
+        response = HttpResponse(status=401)
+        response['WWW-Authenticate'] = 'Bearer'
+        return response
+    if not token and not is_local_request(request):
+        return HttpResponse(status=403)
+    response = HttpResponse(metrics_registry.render(), content_type=PROMETHEUS_CONTENT_TYPE)
+    response['Cache-Control'] = 'no-store'
+    return response
@@ -11,7 +11,9 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
 from pathlib import Path
+import hashlib
 import os
+import tempfile
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -19,6 +21,15 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
+# Uploads are stored once per distinct content and reference-counted,
+# see coderr_app/storage.py.
+STORAGES = {
+    "default": {"BACKEND": "coderr_app.storage.ContentAddressedStorage"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+}
+# Uploads above this size are spooled to a temporary file instead of memory.
+FILE_UPLOAD_MAX_MEMORY_SIZE = 256 * 1024
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.1/howto/deployment/checklist/
@@ -50,6 +61,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'coderr_app.timing.ServerTimingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -106,10 +118,37 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # atomic blocks take the write lock up front, so read-then-write blocks
+            # wait for each other instead of failing with "database is locked"
+            'transaction_mode': 'IMMEDIATE',
+        },
     }
 }
 
 
+# Cache
+# The offer list responses live in their own size-bounded LRU; entries are
+# addressed by the offer catalogue version, the CatalogueVersion database row
+# that writes bump after commit (coderr_app/cache.py), so every worker sees a
+# change. The default cache is per process and coordinates nothing.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'offer_list': {
+        'BACKEND': 'coderr_app.cache.BoundedLRUCache',
+        'LOCATION': 'offer-list',
+        'TIMEOUT': 30,
+        'OPTIONS': {
+            'MAX_ENTRIES': 5000,
+            'MAX_SIZE': 64 * 1024 * 1024,
+        },
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -154,10 +193,63 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',  
+        'user_auth_app.api.authentication.CachedTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ),
 }
 
 
 
+# Seconds the base-info stats may be served from the local cache before the
+# row is read again. Writes in this process invalidate the entry immediately.
+PLATFORM_STATS_CACHE_TIMEOUT = 5
+
+# Bounded in-process cache of token -> user -> profile used by
+# CachedTokenAuthentication. Entries expire after IDENTITY_CACHE_TTL seconds.
+IDENTITY_CACHE_SIZE = 1024
+IDENTITY_CACHE_TTL = 60
+
+# POST /api/offers/bulk/: maximum offers per request and default number of
+# offers committed per transaction (override with ?chunk_size=).
+OFFER_BULK_MAX_ITEMS = 1000
+OFFER_BULK_CHUNK_SIZE = 100
+
+# GET /api/orders/export/: rows fetched from the database and encoded per chunk.
+ORDER_EXPORT_CHUNK_SIZE = 2000
+
+# Hand media downloads off to the front proxy instead of sending them from
+# Python: None, 'x-accel-redirect' (nginx, using the internal location
+# MEDIA_ACCEL_REDIRECT_PREFIX) or 'x-sendfile' (Apache/lighttpd).
+MEDIA_SENDFILE_BACKEND = None
+MEDIA_ACCEL_REDIRECT_PREFIX = '/internal-media/'
+
+# Serve the offer, order and review lists through the compiled serializers
+# (values() rows straight to dicts, same JSON); see coderr_app/api/compiled.py.
+COMPILED_LIST_SERIALIZERS = True
+
+# manage.py import_catalog / POST /api/catalog-import/: businesses (with their
+# offers) validated and inserted per transaction.
+CATALOG_IMPORT_BATCH_SIZE = 500
+
+# Per-request instrumentation (coderr_app/timing.py): share of requests that
+# are measured (query count, DB/serializer/auth/render time), whether the
+# Server-Timing header is sent to clients (it reveals query counts; enable it
+# for development only), and the duration in ms from which a request is logged
+# as slow with its view name and SQL.
+SERVER_TIMING_SAMPLE_RATE = 0.01
+SERVER_TIMING_HEADER = False
+SERVER_TIMING_SLOW_MS = 500
+
+# Prometheus metrics served on /metrics (coderr_app/metrics.py): the file the
+# worker processes of one checkout share (None turns metrics off), how many
+# processes it has room for, and the bearer token scrapers must send (None:
+# only clients on this host that do not come through a proxy are served; set
+# a token when the scraper runs elsewhere).
+METRICS_FILE = os.path.join(
+    tempfile.gettempdir(), f"coderr-metrics-{hashlib.sha256(str(BASE_DIR).encode()).hexdigest()[:12]}.mmap"
+)
+METRICS_MAX_PROCESSES = 32
+METRICS_TOKEN = None
+
+# Gives every test run its own METRICS_FILE.
+TEST_RUNNER = 'coderr_app.test_runner.CoderrTestRunner'
@@ -0,0 +1,137 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from rest_framework.authentication import TokenAuthentication, get_authorization_header
+from rest_framework.exceptions import AuthenticationFailed
+
+
+class IdentityCache:
+    """
+    Bounded in-process LRU of token key -> token (with user and profile already attached).
+
+    Entries expire after ``ttl`` seconds so that changes made by other worker
+    processes are picked up; changes made in this process invalidate the
+    affected user right away.
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._keys_by_user = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, token = entry
+            if expires_at < time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return token
+
+    def set(self, key, token):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, token)
+            self._keys_by_user.setdefault(token.user_id, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            for key in list(self._keys_by_user.get(user_id, ())):
+                self._remove(key)
+
+    def invalidate_key(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_user.clear()
+
+    def _remove(self, key):
+        _, token = self._entries.pop(key)
+        keys = self._keys_by_user.get(token.user_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_user[token.user_id]
+
+
+identity_cache = IdentityCache(settings.IDENTITY_CACHE_SIZE, settings.IDENTITY_CACHE_TTL)
+
+
+def copy_user(user):
+    """Hand every request its own user instance so cached objects are never shared or mutated."""
+    user_copy = copy.copy(user)
+    profile = getattr(user, 'profile', None)
+    if profile is not None:
+        user_copy.profile = copy.copy(profile)
+    return user_copy
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Token authentication that loads token, user and profile with one join
+    and serves repeated requests from ``identity_cache`` without any query.
+    ``aauthenticate()`` is the same for async views, using the async ORM.
+    """
+
+    def authenticate(self, request):
+        key = self.get_key(request)
+        if key is None:
+            return None
+        return self.authenticate_credentials(key)
+
+    async def aauthenticate(self, request):
+        key = self.get_key(request)
+        if key is None:
+            return None
+        token = identity_cache.get(key)
+        if token is None:
+            token = self.check_token(await self.get_token_queryset(key).afirst())
+            identity_cache.set(key, token)
+        return (copy_user(token.user), token)
+
+    def authenticate_credentials(self, key):
+        token = identity_cache.get(key)
+        if token is None:
+            token = self.check_token(self.get_token_queryset(key).first())
+            identity_cache.set(key, token)
+        return (copy_user(token.user), token)
+
+    def get_key(self, request):
+        """Parse the ``Authorization: Token <key>`` header like TokenAuthentication.authenticate()."""
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) == 1:
+            raise AuthenticationFailed(_('Invalid token header. No credentials provided.'))
+        elif len(auth) > 2:
+            raise AuthenticationFailed(_('Invalid token header. Token string should not contain spaces.'))
+        try:
+            return auth[1].decode()
+        except UnicodeError:
+            raise AuthenticationFailed(_('Invalid token header. Token string should not contain invalid characters.'))
+
+    def get_token_queryset(self, key):
+        return self.get_model().objects.select_related('user', 'user__profile').filter(key=key)
+
+    def check_token(self, token):
+        if token is None:
+            raise AuthenticationFailed(_('Invalid token.'))
+        if not token.user.is_active:
+            raise AuthenticationFailed(_('User inactive or deleted.'))
+        return token
@@ -0,0 +1,37 @@
+import django_filters
+from django.db.models import CharField, Value
+from django.db.models.functions import Concat, Lower
+
+from user_auth_app.models import UserProfile
+
+# sorts after every other character, so ``[prefix, prefix + PREFIX_END)`` holds all strings starting with prefix
+PREFIX_END = '\U0010ffff'
+
+
+class PrefixFilter(django_filters.CharFilter):
+    """
+    Case-insensitive prefix match, written as a range on ``LOWER(column)`` so
+    that an index on ``Lower(field_name)`` can answer it (``LIKE`` cannot use
+    a plain index on SQLite).
+    """
+
+    def filter(self, qs, value):
+        value = (value or '').strip()
+        if not value:
+            return qs
+        alias = f'{self.field_name}_lower'
+        prefix = Lower(Value(value, output_field=CharField()))
+        return qs.alias(**{alias: Lower(self.field_name)}).filter(**{
+            f'{alias}__gte': prefix,
+            f'{alias}__lt': Concat(prefix, Value(PREFIX_END), output_field=CharField()),
+        })
+
+
+class ProfileFilter(django_filters.FilterSet):
+    """``?location=`` and ``?name=`` match the beginning of the value, ignoring case."""
+    location = PrefixFilter(field_name='location')
+    name = PrefixFilter(field_name='name')
+
+    class Meta:
+        model = UserProfile
+        fields = ['location', 'name']
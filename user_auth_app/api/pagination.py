@@ -0,0 +1,7 @@
+from coderr_app.api.pagination import CustomPageNumberPagination, KeysetPagination
+
+
+class ProfilePagination(KeysetPagination):
+    """Page numbers by default, keyset pages on request; profiles are listed in creation order."""
+    ordering = ('id',)
+    fallback_class = CustomPageNumberPagination
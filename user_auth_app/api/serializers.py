@@ -1,4 +1,6 @@
 from rest_framework import serializers
+from coderr_app.api.sparse import SparseFieldsetMixin
+from coderr_app.models import BusinessRatingStats
 from user_auth_app.models import UserProfile
 from django.contrib.auth.models import User
 from django.contrib.auth import authenticate
@@ -8,7 +10,7 @@ from django.conf import settings
 
 
 
-class UserProfileSerializer(serializers.ModelSerializer):
+class UserProfileSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     username = serializers.CharField(source="user.username", read_only=True)
     first_name = serializers.CharField(source="user.first_name", required=False, allow_blank=True)
     last_name = serializers.CharField(source="user.last_name", required=False, allow_blank=True)
@@ -16,7 +18,7 @@ class UserProfileSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = UserProfile
-        fields = '__all__'
+        exclude = ['updated_at']
 
     def update(self, instance, validated_data):
         user_data = validated_data.pop("user", {}) 
@@ -94,13 +96,19 @@ class LoginSerializer(serializers.Serializer):
         }
     
 
-class BusinessUserListSerializer(serializers.ModelSerializer):
+class BusinessUserListSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     user = serializers.SerializerMethodField()
     file = serializers.SerializerMethodField()
+    rating_stats = serializers.SerializerMethodField()
 
     class Meta:
         model = UserProfile
-        fields = ['user', 'file', 'location', 'tel', 'description', 'working_hours', 'type']
+        fields = ['user', 'file', 'location', 'tel', 'description', 'working_hours', 'type', 'rating_stats']
+        sparse_sources = {
+            'user': ['user__username', 'user__first_name', 'user__last_name'],
+            'file': ['file'],
+            'rating_stats': ['user__rating_stats'],
+        }
 
     def get_user(self, obj):
         """Returns nested user details as required in the response."""
@@ -116,9 +124,13 @@ class BusinessUserListSerializer(serializers.ModelSerializer):
         if obj.file:
             return f"{settings.MEDIA_URL}{obj.file}"  
         return None  
+
+    def get_rating_stats(self, obj):
+        """Review count, average and 1–5 histogram; expects ``user__rating_stats`` to be selected."""
+        return BusinessRatingStats.for_user(obj.user).summary()
     
     
-class CustomerUserListSerializer(serializers.ModelSerializer):
+class CustomerUserListSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     user = serializers.SerializerMethodField()
     file = serializers.SerializerMethodField()
     uploaded_at = serializers.SerializerMethodField()
@@ -126,6 +138,11 @@ class CustomerUserListSerializer(serializers.ModelSerializer):
     class Meta:
         model = UserProfile
         fields = ['user', 'file', 'location', 'tel', 'description', 'uploaded_at', 'type']
+        sparse_sources = {
+            'user': ['user__username', 'user__first_name', 'user__last_name'],
+            'file': ['file'],
+            'uploaded_at': ['created_at'],
+        }
 
     def get_user(self, obj):
         """Returns nested user details."""
@@ -8,6 +8,12 @@ from rest_framework.response import Response
 from django.contrib.auth.models import User
 from rest_framework import status
 from rest_framework.exceptions import PermissionDenied, NotFound
+from coderr_app.api.conditional import make_etag, not_modified_response, set_validators
+from coderr_app.api.sparse import SparseQuerysetMixin
+from coderr_app.models import BusinessRatingStats
+from django_filters.rest_framework import DjangoFilterBackend
+from .filters import ProfileFilter
+from .pagination import ProfilePagination
 
 
 
@@ -22,11 +28,23 @@ class UserProfileDetailView(generics.RetrieveUpdateAPIView):
         """
         user_id = self.kwargs["pk"]  
         try:
-            obj = UserProfile.objects.get(user__id=user_id)  
+            obj = UserProfile.objects.select_related('user').get(user__id=user_id)  
             return obj
         except UserProfile.DoesNotExist:
             raise NotFound(f"UserProfile with user_id={user_id} not found.")
 
+    def retrieve(self, request, *args, **kwargs):
+        """ Answer If-None-Match / If-Modified-Since with a 304 before the profile is serialized """
+        obj = self.get_object()
+        user = obj.user
+        # user fields are part of the response but do not touch the profile's updated_at
+        etag = make_etag('userprofile', obj.pk, obj.updated_at.isoformat(), user.username, user.first_name, user.last_name)
+        not_modified = not_modified_response(request, etag, obj.updated_at)
+        if not_modified is not None:
+            return not_modified
+        serializer = self.get_serializer(obj)
+        return set_validators(Response(serializer.data), etag, obj.updated_at)
+
     def update(self, request, *args, **kwargs):
         """ Users can only edit their own profile """
         obj = self.get_object()
@@ -36,20 +54,37 @@ class UserProfileDetailView(generics.RetrieveUpdateAPIView):
 
 
 
-class BusinessUserListView(generics.ListAPIView):
+# columns behind the nested "user" object of the profile lists
+LIST_USER_FIELDS = ['user__username', 'user__first_name', 'user__last_name']
+
+
+class BusinessUserListView(SparseQuerysetMixin, generics.ListAPIView):
     serializer_class = BusinessUserListSerializer
     permission_classes = [IsAuthenticated]  
+    pagination_class = ProfilePagination
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = ProfileFilter
 
     def get_queryset(self):
-        return UserProfile.objects.filter(type='business')
+        """One query per page: user and rating stats are joined and only the serialized columns are read."""
+        return UserProfile.objects.filter(type='business').select_related('user', 'user__rating_stats').only(
+            *LIST_USER_FIELDS, 'user__rating_stats__review_count', 'user__rating_stats__rating_sum',
+            *(f'user__rating_stats__rating_{bucket}' for bucket in BusinessRatingStats.BUCKETS),
+            'file', 'location', 'tel', 'description', 'working_hours', 'type',
+        ).order_by('id')
 
 
-class CustomerUserListView(generics.ListAPIView):
+class CustomerUserListView(SparseQuerysetMixin, generics.ListAPIView):
     serializer_class = CustomerUserListSerializer
     permission_classes = [IsAuthenticated]  
+    pagination_class = ProfilePagination
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = ProfileFilter
 
     def get_queryset(self):
-        return UserProfile.objects.filter(type='customer')
+        return UserProfile.objects.filter(type='customer').select_related('user').only(
+            *LIST_USER_FIELDS, 'file', 'location', 'tel', 'description', 'created_at', 'type',
+        ).order_by('id')
 
 
 
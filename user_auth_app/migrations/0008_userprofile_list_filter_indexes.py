@@ -0,0 +1,24 @@
+# Generated by Django 5.1.5 on 2026-10-18 02:59
+
+import django.db.models.functions.text
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user_auth_app', '0007_userprofile_updated_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='userprofile',
+            index=models.Index(models.F('type'), django.db.models.functions.text.Lower('location'), name='userprofile_type_location_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userprofile',
+            index=models.Index(models.F('type'), django.db.models.functions.text.Lower('name'), name='userprofile_type_name_idx'),
+        ),
+    ]
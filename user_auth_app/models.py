@@ -1,9 +1,13 @@
 from django.contrib.auth.models import User
 from django.db import models
+from django.db.models import F
+from django.db.models.functions import Lower
 from django.utils import timezone
 
+from coderr_app.storage import AtomicFileSaveMixin
 
-class UserProfile(models.Model):
+
+class UserProfile(AtomicFileSaveMixin, models.Model):
     USER_TYPES = [
         ('business', 'Business'),
         ('customer', 'Customer'),
@@ -20,6 +24,15 @@ class UserProfile(models.Model):
 
     email = models.EmailField(unique=True, null=True, blank=True)  
     created_at = models.DateTimeField( default=timezone.now)  
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['type'], name='userprofile_type_idx'),
+            # ?location= / ?name= prefix filters on the profile lists
+            models.Index(F('type'), Lower('location'), name='userprofile_type_location_idx'),
+            models.Index(F('type'), Lower('name'), name='userprofile_type_name_idx'),
+        ]
 
     def __str__(self):
         return self.user.username
\ No newline at end of file
@@ -0,0 +1,50 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from coderr_app import storage
+from coderr_app.cache import bump_catalogue_version
+
+from .api.authentication import identity_cache
+from .models import UserProfile
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_identity(sender, instance, **kwargs):
+    identity_cache.invalidate_user(instance.pk)
+
+
+OFFER_LIST_USER_FIELDS = {'username', 'first_name', 'last_name'}
+
+
+@receiver(post_save, sender=User)
+def invalidate_offer_list_user_details(sender, instance, created, update_fields, **kwargs):
+    """The offer list shows the owner's names in user_details; a new user has no offers yet."""
+    if created or (update_fields is not None and not OFFER_LIST_USER_FIELDS & set(update_fields)):
+        return
+    bump_catalogue_version()
+
+
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+@receiver(post_save, sender=Token)
+@receiver(post_delete, sender=Token)
+def invalidate_related_identity(sender, instance, **kwargs):
+    identity_cache.invalidate_user(instance.user_id)
+
+
+@receiver(post_init, sender=UserProfile)
+def remember_profile_file(sender, instance, **kwargs):
+    storage.remember_files(instance, ['file'])
+
+
+@receiver(post_save, sender=UserProfile)
+def release_replaced_profile_file(sender, instance, **kwargs):
+    storage.release_replaced_files(instance, ['file'])
+
+
+@receiver(post_delete, sender=UserProfile)
+def release_profile_file(sender, instance, **kwargs):
+    storage.release_files(instance, ['file'])
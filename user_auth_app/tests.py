@@ -1,3 +1,165 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.test import TestCase
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from user_auth_app.api.authentication import CachedTokenAuthentication, identity_cache
+from user_auth_app.models import UserProfile
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    """Token, user and profile are resolved with one join and then served from the identity cache."""
+
+    def setUp(self):
+        identity_cache.clear()
+        cache.clear()
+        self.user = User.objects.create_user(username='customer', password='secret123')
+        self.profile = UserProfile.objects.create(user=self.user, type='customer', name='customer', email='customer@example.com')
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+
+    def test_cold_request_resolves_identity_in_one_query(self):
+        self.client.get('/api/base-info/')
+        identity_cache.clear()
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/base-info/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_warm_request_needs_no_identity_query(self):
+        self.client.get('/api/base-info/')
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/base-info/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_profile_permission_check_uses_cached_profile(self):
+        self.client.get('/api/base-info/')
+        # only the reviews query itself, IsAuthenticated needs no lookup
+        with self.assertNumQueries(1):
+            self.client.get('/api/reviews/')
+
+    def test_profile_change_invalidates_cache(self):
+        self.client.get('/api/base-info/')
+        self.profile.type = 'business'
+        self.profile.save()
+        # identity join plus the stats row, whose cache entry the type change also invalidated
+        with self.assertNumQueries(2):
+            self.client.get('/api/base-info/')
+        response = self.client.post('/api/orders/', {'offer_detail_id': 1}, format='json')
+        self.assertEqual(response.status_code, 403)
+
+    def test_deleted_token_and_inactive_user_are_rejected(self):
+        self.client.get('/api/base-info/')
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/api/reviews/').status_code, 401)
+        self.user.is_active = True
+        self.user.save()
+        self.token.delete()
+        self.assertEqual(self.client.get('/api/reviews/').status_code, 401)
+
+    def test_requests_get_their_own_user_instance(self):
+        authentication = CachedTokenAuthentication()
+        first_user, _ = authentication.authenticate_credentials(self.token.key)
+        second_user, _ = authentication.authenticate_credentials(self.token.key)
+        self.assertIsNot(first_user, second_user)
+        self.assertIsNot(first_user.profile, second_user.profile)
+        self.assertEqual(first_user.profile.type, 'customer')
+
+
+class UserProfileConditionalGetTests(TestCase):
+    """The profile detail answers If-None-Match / If-Modified-Since with a 304."""
+
+    def setUp(self):
+        identity_cache.clear()
+        cache.clear()
+        self.user = User.objects.create_user(username='customer', password='secret123')
+        self.profile = UserProfile.objects.create(user=self.user, type='customer', name='customer', email='customer@example.com')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_not_modified(self):
+        response = self.client.get(f'/api/profile/{self.user.id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('updated_at', response.data)
+        with self.assertNumQueries(1):
+            not_modified = self.client.get(f'/api/profile/{self.user.id}/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+        not_modified = self.client.get(f'/api/profile/{self.user.id}/', HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_profile_and_user_changes_change_etag(self):
+        etag = self.client.get(f'/api/profile/{self.user.id}/')['ETag']
+        self.client.patch(f'/api/profile/{self.user.id}/', {'location': 'Berlin'}, format='json')
+        response = self.client.get(f'/api/profile/{self.user.id}/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['location'], 'Berlin')
+
+        etag = response['ETag']
+        User.objects.filter(pk=self.user.pk).update(first_name='Max')
+        response = self.client.get(f'/api/profile/{self.user.id}/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['first_name'], 'Max')
+
+
+class ProfileListTests(TestCase):
+    """The profile lists are paginated, filterable and cost the same number of queries at any size."""
+
+    def setUp(self):
+        identity_cache.clear()
+        cache.clear()
+        for i in range(12):
+            user = User.objects.create_user(username=f'business_{i}', password='secret123', first_name=f'First {i}')
+            UserProfile.objects.create(
+                user=user, type='business', name=f'Shop {i}' if i % 2 else f'Studio {i}',
+                location='Berlin' if i < 4 else 'München', email=f'business_{i}@example.com'
+            )
+        self.customer = User.objects.create_user(username='customer', password='secret123')
+        UserProfile.objects.create(user=self.customer, type='customer', name='customer', email='customer@example.com')
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+
+    def test_page_numbers_by_default(self):
+        response = self.client.get('/api/profiles/business/', {'page_size': 5})
+        self.assertEqual(response.data['count'], 12)
+        self.assertEqual(len(response.data['results']), 5)
+        self.assertEqual(response.data['results'][0]['user']['first_name'], 'First 0')
+        self.assertEqual(set(response.data['results'][0]), {
+            'user', 'file', 'location', 'tel', 'description', 'working_hours', 'type', 'rating_stats'
+        })
+
+        response = self.client.get('/api/profiles/customer/')
+        self.assertEqual(response.data['count'], 1)
+        self.assertEqual(response.data['results'][0]['user']['username'], 'customer')
+        self.assertIn('uploaded_at', response.data['results'][0])
+
+    def test_keyset_pages(self):
+        usernames = []
+        response = self.client.get('/api/profiles/business/', {'pagination': 'cursor', 'page_size': 5})
+        while True:
+            usernames += [profile['user']['username'] for profile in response.data['results']]
+            if not response.data['next_cursor']:
+                break
+            response = self.client.get('/api/profiles/business/', {'cursor': response.data['next_cursor'], 'page_size': 5})
+        self.assertEqual(usernames, [f'business_{i}' for i in range(12)])
+
+    def test_query_count_does_not_grow_with_the_page(self):
+        self.client.get('/api/profiles/business/')
+        for url in ('/api/profiles/business/', '/api/profiles/customer/'):
+            with self.subTest(url=url), self.assertNumQueries(2):
+                self.client.get(url, {'page_size': 100})
+            with self.subTest(url=url), self.assertNumQueries(1):
+                self.client.get(url, {'page_size': 100, 'pagination': 'cursor'})
+
+    def test_location_and_name_prefix_filters(self):
+        response = self.client.get('/api/profiles/business/', {'location': 'ber', 'page_size': 100})
+        self.assertEqual(response.data['count'], 4)
+        response = self.client.get('/api/profiles/business/', {'location': 'Mün', 'page_size': 100})
+        self.assertEqual(response.data['count'], 8)
+        response = self.client.get('/api/profiles/business/', {'name': 'shop', 'location': 'berlin', 'page_size': 100})
+        self.assertEqual(
+            [profile['user']['username'] for profile in response.data['results']], ['business_1', 'business_3']
+        )
+        response = self.client.get('/api/profiles/customer/', {'location': 'ber'})
+        self.assertEqual(response.data['count'], 0)